@@ -1,6 +1,6 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from llama_index.llms.openai import OpenAI
 
 load_dotenv()
 
@@ -11,6 +11,102 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 INDEX_HOST = os.getenv("INDEX_HOST")
 
-llm = OpenAI(temperature=0.1, model="gpt-3.5-turbo")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+
+# ✅ Local stand-ins for development and load tests (see app/services/fakes.py):
+# OPENAI_BACKEND=fake, DATABASE_BACKEND=sqlite, VECTOR_BACKEND=local, RECEIPT_PARSER_URL=fake
+OPENAI_BACKEND = os.getenv("OPENAI_BACKEND", "openai")  # openai | fake
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "supabase")  # supabase | sqlite
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/fake_backend.db")
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))  # seconds the fake LLM takes per call
+
+@lru_cache(maxsize=None)
+def get_llm():
+    """The LlamaIndex OpenAI LLM, built on first use (importing it takes about a second)."""
+    if OPENAI_BACKEND == "fake":
+        from app.services.fakes import FakeLLM
+        return FakeLLM(model=LLM_MODEL, latency=FAKE_LLM_LATENCY)
+    from llama_index.llms.openai import OpenAI
+    return OpenAI(temperature=0.1, model=LLM_MODEL)
+
+def __getattr__(name):
+    # `from app.config import llm` keeps working, without building the LLM at import time
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ✅ Admission control for OpenAI calls (app/services/llm_gateway.py)
+LLM_GATEWAY_CONCURRENCY = int(os.getenv("LLM_GATEWAY_CONCURRENCY", "8"))  # chat calls in flight
+LLM_GATEWAY_QUEUE = int(os.getenv("LLM_GATEWAY_QUEUE", "32"))  # calls waiting for a slot before new ones get a 503
+LLM_GATEWAY_QUEUE_TIMEOUT = float(os.getenv("LLM_GATEWAY_QUEUE_TIMEOUT", "10"))  # seconds a call may wait for a slot
+LLM_GATEWAY_TIMEOUT = float(os.getenv("LLM_GATEWAY_TIMEOUT", "60"))  # seconds per chat attempt
+LLM_GATEWAY_RETRIES = int(os.getenv("LLM_GATEWAY_RETRIES", "1"))  # extra attempts on timeouts, 429 and 5xx
+LLM_USER_RATE = float(os.getenv("LLM_USER_RATE", "0.1"))  # chat calls per second per user (0 = no quota)
+LLM_USER_BURST = float(os.getenv("LLM_USER_BURST", "3"))
+EMBEDDING_GATEWAY_CONCURRENCY = int(os.getenv("EMBEDDING_GATEWAY_CONCURRENCY", "16"))
+EMBEDDING_GATEWAY_QUEUE = int(os.getenv("EMBEDDING_GATEWAY_QUEUE", "256"))
+EMBEDDING_GATEWAY_TIMEOUT = float(os.getenv("EMBEDDING_GATEWAY_TIMEOUT", "20"))
+
 # ✅ Define embedding model name
-EMBEDDING_MODEL = "text-embedding-ada-002"
\ No newline at end of file
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# ✅ Embedding cache (in-process LRU, plus an optional SQLite file shared across restarts)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400")) or None  # seconds, 0 = never expire
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+
+# ✅ Recipe vector store: "pinecone" (remote) or "local" (in-process NumPy index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_VECTOR_PATH = os.getenv("LOCAL_VECTOR_PATH", "data/recipe_vectors")
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32")  # float32 | float16 | int8
+LOCAL_VECTOR_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "exact")  # exact | ivf | hnsw
+
+# ✅ Recipe details (name, ingredients, instructions, ...) kept out of vector metadata in a local SQLite file
+RECIPE_DETAIL_PATH = os.getenv("RECIPE_DETAIL_PATH", "data/recipe_details.sqlite")
+RECIPE_DETAIL_CACHE_SIZE = int(os.getenv("RECIPE_DETAIL_CACHE_SIZE", "2048"))  # decoded rows kept in memory
+
+# ✅ Keyword recipe search: seconds between checks of the detail store for newly ingested recipes
+RECIPE_SEARCH_REFRESH_INTERVAL = float(os.getenv("RECIPE_SEARCH_REFRESH_INTERVAL", "5"))
+
+# ✅ Input-token budget for the meal planning prompt (counted with tiktoken)
+MEAL_PLAN_PROMPT_TOKEN_BUDGET = int(os.getenv("MEAL_PLAN_PROMPT_TOKEN_BUDGET", "1200"))
+
+# ✅ Meal planner: "local" (deterministic solver, milliseconds) or "llm" (gpt-3.5-turbo picks the recipes)
+MEAL_PLANNER = os.getenv("MEAL_PLANNER", "local")
+MEAL_PLAN_LLM_NOTES = os.getenv("MEAL_PLAN_LLM_NOTES", "false").lower() in ("1", "true", "yes")  # LLM prep tips on local plans
+
+# ✅ Database connection pool (applies to both the sync and async engines)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+# asyncpg prepared-statement cache per connection; set to 0 behind Supabase's transaction pooler (port 6543)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+# ✅ Weight of pantry coverage vs. embedding similarity for ranking=hybrid recipe suggestions
+RECIPE_COVERAGE_WEIGHT = float(os.getenv("RECIPE_COVERAGE_WEIGHT", "0.5"))
+
+# ✅ Recipe and grocery results kept per user until their pantry revision or preferences change
+DERIVED_CACHE_SIZE = int(os.getenv("DERIVED_CACHE_SIZE", "4096"))
+
+# ✅ Background workers recomputing stored pantry embeddings after pantry changes
+PANTRY_EMBEDDING_WORKERS = int(os.getenv("PANTRY_EMBEDDING_WORKERS", "2"))
+
+# ✅ Write-behind buffer for pantry and meal-history writes (flushed in bulk)
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1"))  # seconds between flushes
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "500"))  # buffered rows that trigger an early flush
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))  # flushes a rejected row gets before it is dropped
+
+# ✅ Receipt parsing jobs (RECEIPT_PARSER_URL=fake answers every upload with a canned receipt)
+RECEIPT_PARSER_URL = os.getenv("RECEIPT_PARSER_URL", "https://c8wgwo8w0c8swww08oo088kg.deploy.jensenhshoots.com/parse-receipt/")
+RECEIPT_PARSER_TIMEOUT = float(os.getenv("RECEIPT_PARSER_TIMEOUT", "60"))  # seconds per attempt
+RECEIPT_PARSER_RETRIES = int(os.getenv("RECEIPT_PARSER_RETRIES", "3"))  # extra attempts on timeouts, 429 and 5xx
+RECEIPT_WORKERS = int(os.getenv("RECEIPT_WORKERS", "4"))  # parser calls in flight
+RECEIPT_QUEUE_SIZE = int(os.getenv("RECEIPT_QUEUE_SIZE", "100"))  # waiting jobs before uploads get a 503
+RECEIPT_JOB_TTL = float(os.getenv("RECEIPT_JOB_TTL", "3600"))  # seconds a finished job stays queryable
+
+# ✅ Responses smaller than this many bytes are sent uncompressed
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+
+# ✅ Per-stage latency tracing (histograms at /metrics, Server-Timing header, OpenTelemetry spans if installed)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
@@ -0,0 +1,3 @@
+-- Fingerprint of the pantry rows, preferences row and recipe candidates a stored
+-- meal plan was generated from. /meal_plans serves the stored plan while it matches.
+ALTER TABLE user_meal_history ADD COLUMN IF NOT EXISTS fingerprint TEXT;
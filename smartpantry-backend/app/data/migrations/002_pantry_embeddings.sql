@@ -0,0 +1,10 @@
+-- One stored pantry embedding per user, recomputed in the background when the
+-- pantry changes. pantry_hash is the hash of the pantry text it was embedded from.
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS pantry_embeddings (
+    user_id UUID PRIMARY KEY,
+    pantry_hash TEXT NOT NULL,
+    embedding VECTOR(1536) NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
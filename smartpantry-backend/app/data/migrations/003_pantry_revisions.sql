@@ -0,0 +1,52 @@
+-- Per-user pantry revision for delta sync (GET /pantry/{user_id}?since=<rev>).
+-- Every insert, update or delete of a pantry row bumps the user's revision; rows
+-- carry the revision they were last written at, and deletes leave a tombstone.
+CREATE TABLE IF NOT EXISTS pantry_revisions (
+    user_id UUID PRIMARY KEY,
+    revision BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS pantry_tombstones (
+    user_id UUID NOT NULL,
+    ingredient_name TEXT NOT NULL,
+    revision BIGINT NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, ingredient_name)
+);
+
+ALTER TABLE pantry ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE pantry ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS pantry_user_revision_idx ON pantry (user_id, revision);
+CREATE INDEX IF NOT EXISTS pantry_tombstones_revision_idx ON pantry_tombstones (user_id, revision);
+
+CREATE OR REPLACE FUNCTION bump_pantry_revision() RETURNS TRIGGER AS $$
+DECLARE
+    next_revision BIGINT;
+BEGIN
+    INSERT INTO pantry_revisions (user_id, revision)
+    VALUES (COALESCE(NEW.user_id, OLD.user_id), 1)
+    ON CONFLICT (user_id) DO UPDATE SET revision = pantry_revisions.revision + 1
+    RETURNING revision INTO next_revision;
+
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.ingredient_name <> NEW.ingredient_name) THEN
+        INSERT INTO pantry_tombstones (user_id, ingredient_name, revision)
+        VALUES (OLD.user_id, OLD.ingredient_name, next_revision)
+        ON CONFLICT (user_id, ingredient_name) DO UPDATE
+        SET revision = EXCLUDED.revision, deleted_at = NOW();
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+
+    -- A re-added ingredient is no longer deleted
+    DELETE FROM pantry_tombstones WHERE user_id = NEW.user_id AND ingredient_name = NEW.ingredient_name;
+    NEW.revision := next_revision;
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS pantry_revision ON pantry;
+CREATE TRIGGER pantry_revision
+BEFORE INSERT OR UPDATE OR DELETE ON pantry
+FOR EACH ROW EXECUTE FUNCTION bump_pantry_revision();
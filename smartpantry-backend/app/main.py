@@ -1,10 +1,75 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
+from app.config import GZIP_MINIMUM_SIZE, TRACING_ENABLED
 from app.routers import routes
+from app.services.coverage import get_coverage_index
+from app.services.database import pool_metrics
+from app.services.embedding_cache import embedding_cache
+from app.services.llama_index_service import pantry_embedding_queue, write_behind
+from app.services.llm_gateway import GatewayRejected, embedding_gateway, llm_gateway
+from app.services.receipt_jobs import receipt_job_queue
+from app.services.recipe_details import get_recipe_details
+from app.services.recipe_search import get_recipe_search_index, search_index_refresher
+from app.services.schemas import OrjsonResponse
+from app.services.tracing import ServerTimingMiddleware, prometheus_metrics
+from app.supabase_client import dispose_engines
 
-app = FastAPI()
+# ✅ Clients (Supabase, SQL engines, Pinecone, OpenAI, LLM) are created on first use;
+# startup only builds the ingredient, coverage and search indexes (off the event loop),
+# so no request pays for a catalog scan. Shutdown drains the workers and closes the pools
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.gather(asyncio.to_thread(get_coverage_index), asyncio.to_thread(get_recipe_search_index))
+    search_index_refresher.start()
+    pantry_embedding_queue.start()
+    write_behind.start()
+    receipt_job_queue.start()
+    yield
+    await receipt_job_queue.stop()
+    await write_behind.stop()  # final flush; queues embedding refreshes for the flushed pantries
+    await pantry_embedding_queue.stop()
+    await search_index_refresher.stop()
+    await dispose_engines()
+
+app = FastAPI(lifespan=lifespan, default_response_class=OrjsonResponse)
+
+# ✅ Compress responses above GZIP_MINIMUM_SIZE bytes (SSE streams are left alone)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=5)
+
+# ✅ Per-stage timings of each request in its Server-Timing header
+if TRACING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(routes.router)
 
+# ✅ OpenAI call gateway rejections: 429 over quota, 503 overloaded, 504 timed out
+@app.exception_handler(GatewayRejected)
+async def gateway_rejected(request: Request, exc: GatewayRejected):
+    return OrjsonResponse(
+        {"detail": exc.detail},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
 @app.get("/")
 def health_check():
-    return {"message": "Smart Pantry Buddy API is running"}
\ No newline at end of file
+    return {"message": "Smart Pantry Buddy API is running"}
+
+@app.get("/health/db")
+def database_health():
+    """Connection pool counters, acquisition wait times, write-behind buffer and recipe detail cache counters"""
+    return {**pool_metrics(), "write_behind": write_behind.stats(), "recipe_details": get_recipe_details().stats()}
+
+@app.get("/health/openai")
+def openai_health():
+    """Call gateway counters (running, waiting, coalesced, shed and over-quota calls) and embedding cache hits"""
+    return {"llm": llm_gateway.stats(), "embedding": embedding_gateway.stats(), "embedding_cache": embedding_cache.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Stage latency histograms, OpenAI token counts and embedding cache lookups (Prometheus text format)"""
+    body = prometheus_metrics() + "\n".join(embedding_cache.prometheus_lines()) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -1,4 +1,35 @@
-import openai
-from app.config import OPENAI_API_KEY
+from functools import lru_cache
+from app.config import OPENAI_API_KEY, OPENAI_BACKEND
 
-openai.api_key = OPENAI_API_KEY
+
+# ✅ Clients are created on first use, so importing this module doesn't import the OpenAI SDK
+@lru_cache(maxsize=None)
+def get_openai():
+    """Sync OpenAI client."""
+    if OPENAI_BACKEND == "fake":
+        from app.services.fakes import FakeOpenAI
+        return FakeOpenAI()
+    import openai
+    openai.api_key = OPENAI_API_KEY
+    return openai.OpenAI(api_key=OPENAI_API_KEY)
+
+
+@lru_cache(maxsize=None)
+def get_async_openai():
+    """Async client for the non-blocking service layer."""
+    if OPENAI_BACKEND == "fake":
+        from app.services.fakes import FakeAsyncOpenAI
+        return FakeAsyncOpenAI()
+    import openai
+    return openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+
+def __getattr__(name):
+    # Scripts still import `openai` / `async_openai` from here
+    if name == "openai":
+        get_openai()
+        import openai
+        return openai
+    if name == "async_openai":
+        return get_async_openai()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,39 +1,60 @@
-from pinecone import Pinecone, ServerlessSpec
-from app.config import PINECONE_API_KEY, INDEX_HOST
-from llama_index.vector_stores.pinecone import PineconeVectorStore
-from llama_index.core import StorageContext, VectorStoreIndex
-from app.data.test_recipes import documents
-
-pc = Pinecone(api_key=PINECONE_API_KEY)
+from functools import lru_cache
+from app.config import PINECONE_API_KEY, INDEX_HOST, VECTOR_BACKEND, LOCAL_VECTOR_PATH, LOCAL_VECTOR_DTYPE, LOCAL_VECTOR_INDEX
+from app.services.vector_store import LocalRecipeStore, PineconeRecipeStore
 
 # Define the index name
 index_name = "recipe-index"
 
-# Define index specification using ServerlessSpec
+# Define index specification (cloud and region for ServerlessSpec)
 index_spec = {
     "dimension": 1536,  # Keep dimension at the top level
     "metric": "cosine",
-    "spec": ServerlessSpec(
-        cloud="aws",  # Choose "aws" or "gcp"
-        region="us-east-1"  # Replace with your Pinecone region
-    )
+    "cloud": "aws",  # Choose "aws" or "gcp"
+    "region": "us-east-1",  # Replace with your Pinecone region
 }
 
-# Check if the index already exists
-if index_name not in [index["name"] for index in pc.list_indexes()]:
-    pc.create_index(name=index_name, **index_spec)  # Unpack index_spec dictionary
-    print(f"Created index: {index_name}")
-else:
-    print(f"Index {index_name} already exists.")
 
-pinecone_index = pc.Index("recipe-index")
-vector_store = PineconeVectorStore(pinecone_index=pinecone_index)
-storage_context = StorageContext.from_defaults(vector_store=vector_store)
+# ✅ Nothing here talks to Pinecone at import time: the client and index handle are
+# created on first use, and index creation is the explicit provision_index() step
+@lru_cache(maxsize=None)
+def get_pinecone():
+    from pinecone import Pinecone
+    return Pinecone(api_key=PINECONE_API_KEY)
+
+
+@lru_cache(maxsize=None)
+def get_recipe_store():
+    """The recipe vector store selected by VECTOR_BACKEND."""
+    if VECTOR_BACKEND == "local":
+        # ✅ In-process index loaded from memory-mapped files (no network hop per query)
+        return LocalRecipeStore.open(LOCAL_VECTOR_PATH, dtype=LOCAL_VECTOR_DTYPE, index_type=LOCAL_VECTOR_INDEX)
+    # With INDEX_HOST set, the handle skips the describe_index call that resolves the host
+    index = get_pinecone().Index(name=index_name, host=INDEX_HOST) if INDEX_HOST else get_pinecone().Index(index_name)
+    return PineconeRecipeStore(index)
+
+
+def provision_index() -> bool:
+    """Create the Pinecone index if it doesn't exist yet; True if it was created."""
+    from pinecone import ServerlessSpec
+    pc = get_pinecone()
+
+    # Check if the index already exists
+    if index_name in [index["name"] for index in pc.list_indexes()]:
+        print(f"Index {index_name} already exists.")
+        return False
+
+    pc.create_index(
+        name=index_name,
+        dimension=index_spec["dimension"],
+        metric=index_spec["metric"],
+        spec=ServerlessSpec(cloud=index_spec["cloud"], region=index_spec["region"]),
+    )
+    print(f"Created index: {index_name}")
+    return True
 
-# # Adding dummy recipe data
-# if vector_store._pinecone_index.describe_index_stats().total_vector_count == 0:
-#     print("Index is empty. Adding documents...")
-#     index = VectorStoreIndex.from_documents(documents, storage_context=storage_context)
-# else:
-#     print("Index already contains vectors. Skipping document insertion.")
 
+def __getattr__(name):
+    # `from app.pinecone_client import pinecone_index` keeps working for scripts
+    if name == "pinecone_index":
+        return get_recipe_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
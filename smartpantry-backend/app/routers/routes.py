@@ -1,66 +1,186 @@
-from fastapi import APIRouter, File, Form, HTTPException, Depends, UploadFile
-from app.services.llama_index_service import get_user_pantry_service, get_user_recipes_service, get_user_preferences_service, generate_meal_plan_service, get_grocery_list_service, parse_receipt_service, store_user_meal_history
+from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, Depends, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+import asyncio
+import orjson
+from app.services.llama_index_service import get_user_pantry_service_async, get_user_recipes_service_async, get_user_preferences_service_async, get_grocery_list_service_async
+from app.services.llama_index_service import get_user_recipes_batch_service_async, get_grocery_list_batch_service_async, pantry_embedding_queue
+from app.services.llama_index_service import get_pantry_revision_async, get_pantry_delta_service_async, search_recipes_service_async
+from app.services.llm_gateway import GatewayRejected
+from app.services.meal_plan_cache import get_meal_plan_service_async, meal_plan_sse_events
+from app.services.meal_planner import NoFeasibleMealPlan
+from app.services.receipt_jobs import receipt_job_queue
+from app.services.request_context import RequestContext, get_request_context
+from app.services.schemas import OrjsonResponse, parse_fields, project_recipes
 
 router = APIRouter()
 
 
+class BatchRequest(BaseModel):
+    user_ids: List[str]
+
+
+async def _ndjson(results):
+    """One JSON object per line; a failure mid-stream becomes a final error line."""
+    try:
+        async for result in results:
+            yield orjson.dumps(result, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY)
+    except Exception as e:
+        yield orjson.dumps({"error": str(e)}, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def _pantry_etag(revision: int) -> str:
+    return f'"pantry-{revision}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already names ``etag``."""
+    header = request.headers.get("if-none-match")
+    return header is not None and (header.strip() == "*" or etag in (tag.strip() for tag in header.split(",")))
+
 
 # ✅ Endpoint 1: Get User Pantry Inventory
 @router.get("/pantry/{user_id}")
-def get_user_pantry(user_id: str):
-    """Retrieve a user's pantry inventory"""
+async def get_user_pantry(user_id: str, request: Request, since: Optional[int] = None,
+                          ctx: RequestContext = Depends(get_request_context)):
+    """Retrieve a user's pantry inventory, or with ``since`` only what changed after that revision.
+
+    The ETag is the pantry revision, so a client holding the current revision
+    gets a 304 without the pantry being loaded.
+    """
     try:
-        return get_user_pantry_service(user_id)
+        revision = await get_pantry_revision_async(user_id, ctx)
+        etag = _pantry_etag(revision)
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        if since is not None:
+            body = await get_pantry_delta_service_async(user_id, since)
+            etag = _pantry_etag(body["revision"])
+        else:
+            body = {**await get_user_pantry_service_async(user_id, ctx), "revision": revision}
+        return OrjsonResponse(body, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/pantry/{user_id}/changed", status_code=202)
+async def pantry_changed(user_id: str):
+    """Change hook for pantry edits made outside this API: queues a pantry embedding recompute"""
+    return {"user_id": user_id, "queued": pantry_embedding_queue.enqueue(user_id)}
+
+
+# ✅ Batch endpoints: results stream back as NDJSON, one line per user
+@router.post("/recipes/batch")
+async def get_suggested_recipes_batch(request: BatchRequest):
+    """Suggested recipes for many users (one pantry query, batched embeddings)"""
+    return StreamingResponse(_ndjson(get_user_recipes_batch_service_async(request.user_ids)), media_type="application/x-ndjson")
+
+@router.post("/grocery_list/batch")
+async def get_grocery_list_batch(request: BatchRequest):
+    """Grocery lists for many users (one pantry query, batched embeddings)"""
+    return StreamingResponse(_ndjson(get_grocery_list_batch_service_async(request.user_ids)), media_type="application/x-ndjson")
+
+
+# ✅ Keyword recipe search (declared before /recipes/{user_id}, which would otherwise match it)
+@router.get("/recipes/search")
+async def search_recipes(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50),
+                         mode: Literal["keyword", "hybrid"] = "keyword", fields: Optional[str] = None):
+    """Search recipes by name, cuisine, category and ingredients; the last word matches as a prefix.
+
+    ``mode=keyword`` needs no OpenAI call (type-ahead); ``mode=hybrid`` also
+    embeds the query and fuses keyword and vector rankings.
+    """
+    try:
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        return OrjsonResponse(project_recipes(await search_recipes_service_async(q, limit, mode, projection), projection, key="recipes"))
+    except GatewayRejected:
+        raise  # 429/503/504 from the OpenAI call gateway, answered by main.py
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ✅ Endpoint 2: Get Suggested Recipes Based on Pantry
 @router.get("/recipes/{user_id}")
-def get_suggested_recipes(user_id: str):
-    """Generate meal suggestions based on user's pantry"""
+async def get_suggested_recipes(user_id: str, ranking: Literal["embedding", "coverage", "hybrid"] = "embedding",
+                                fields: Optional[str] = None, ctx: RequestContext = Depends(get_request_context)):
+    """Generate meal suggestions based on user's pantry
+
+    ``fields`` (e.g. ``recipe_name,score,image_url``) trims each recipe for list views.
+    """
     try:
-        return get_user_recipes_service(user_id)
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        return OrjsonResponse(project_recipes(await get_user_recipes_service_async(user_id, ctx, ranking, projection), projection))
+    except GatewayRejected:
+        raise  # 429/503/504 from the OpenAI call gateway, answered by main.py
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/preferences/{user_id}")
-def get_user_preferences(user_id: str):
+async def get_user_preferences(user_id: str, ctx: RequestContext = Depends(get_request_context)):
     try:
-        return get_user_preferences_service(user_id)
+        return await get_user_preferences_service_async(user_id, ctx)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
     
 @router.get("/meal_plans/{user_id}")
-def get_user_meal_plan(user_id: str):
+async def get_user_meal_plan(user_id: str, background_tasks: BackgroundTasks, ctx: RequestContext = Depends(get_request_context)):
+    """Serve the stored meal plan while its inputs are unchanged; regenerate in the background otherwise"""
     try:
-        # 1️⃣ Generate Meal Plan
-        meal_plan = generate_meal_plan_service(user_id)
-
-        # 2️⃣ Store in Supabase
-        store_response = store_user_meal_history(user_id, meal_plan)
-
-    except Exception as E:
-        HTTPException(status_code=500)
+        return await get_meal_plan_service_async(user_id, background_tasks, ctx)
+    except NoFeasibleMealPlan as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except GatewayRejected:
+        raise  # 429/503/504 from the OpenAI call gateway, answered by main.py
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    # 3️⃣ Return the stored meal plan
-    return store_response
+@router.get("/meal_plans/{user_id}/stream")
+async def stream_user_meal_plan(user_id: str, ctx: RequestContext = Depends(get_request_context)):
+    """Stream the meal plan as server-sent events, one validated day at a time"""
+    return StreamingResponse(
+        meal_plan_sse_events(user_id, ctx),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
  
 @router.get("/grocery_list/{user_id}")
-def get_grocery_list(user_id: str):
+async def get_grocery_list(user_id: str, ranking: Literal["embedding", "coverage", "hybrid"] = "embedding",
+                           ctx: RequestContext = Depends(get_request_context)):
     try:
-        return get_grocery_list_service(user_id)
+        return OrjsonResponse(await get_grocery_list_service_async(user_id, ctx, ranking))
+    except GatewayRejected:
+        raise  # 429/503/504 from the OpenAI call gateway, answered by main.py
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/parse-receipt/")
+@router.post("/parse-receipt/", status_code=202)
 async def parse_receipt(file: UploadFile = File(...), user_id: str = Form(...)):
-    """Upload an image and parse the receipt."""
-    result = await parse_receipt_service(file, user_id)
-
-    if "error" in result:
-        raise HTTPException(status_code=400, detail=result["error"])
+    """Queue a receipt image for parsing; poll GET /parse-receipt/{job_id} for the result."""
+    if not user_id:
+        raise HTTPException(status_code=400, detail="User ID is required")
 
-    return result
+    content = await file.read()
+    try:
+        job = receipt_job_queue.submit(user_id, file.filename, content, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Receipt parser is busy, try again shortly")
+    return {"job_id": job.job_id, "status": job.status}
 
+@router.get("/parse-receipt/{job_id}")
+async def get_receipt_job(job_id: str):
+    """Status of a receipt parsing job, with the pantry rows once it's done."""
+    job = receipt_job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown receipt job")
+    return job
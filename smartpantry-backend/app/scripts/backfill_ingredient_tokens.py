@@ -0,0 +1,33 @@
+from app.pinecone_client import pinecone_index
+from app.services.ingredients import ingredient_tokens
+from app.services.recipe_details import get_recipe_details
+
+# ✅ Add (or recompute) the canonical ingredient_tokens the allergen filter matches on,
+# for recipes ingested before allergen filters existed or with older tokens
+FETCH_BATCH = 100
+
+def backfill_ingredient_tokens():
+    updated = 0
+    for id_page in pinecone_index.list():
+        for start in range(0, len(id_page), FETCH_BATCH):
+            response = pinecone_index.fetch(ids=id_page[start:start + FETCH_BATCH])
+            vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+            # Slim records keep their ingredients in the recipe detail store
+            details = get_recipe_details().get_many(list(vectors), fields=("ingredients",), cache=False)
+            records = []
+            for vector_id, vector in vectors.items():
+                values = vector["values"] if isinstance(vector, dict) else vector.values
+                metadata = dict((vector["metadata"] if isinstance(vector, dict) else vector.metadata) or {})
+                ingredients = details.get(vector_id, {}).get("ingredients") or metadata.get("ingredients", [])
+                tokens = ingredient_tokens(ingredients)
+                if metadata.get("ingredient_tokens") == tokens:
+                    continue
+                metadata["ingredient_tokens"] = tokens
+                records.append({"id": vector_id, "values": list(values), "metadata": metadata})
+            if records:
+                pinecone_index.upsert(vectors=records)
+                updated += len(records)
+    print(f"✅ Backfilled ingredient_tokens on {updated} recipes")
+
+if __name__ == "__main__":
+    backfill_ingredient_tokens()
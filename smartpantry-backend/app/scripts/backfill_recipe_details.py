@@ -0,0 +1,31 @@
+from app.pinecone_client import pinecone_index
+from app.services.recipe_details import get_recipe_details, split_recipe_metadata
+
+# ✅ Move recipe details out of vector metadata (recipes ingested before the detail store)
+# into the local detail store, then re-upsert the vectors with slim metadata
+FETCH_BATCH = 100
+
+def backfill_recipe_details():
+    details = get_recipe_details()
+    moved = 0
+    for id_page in pinecone_index.list():
+        for start in range(0, len(id_page), FETCH_BATCH):
+            response = pinecone_index.fetch(ids=id_page[start:start + FETCH_BATCH])
+            vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+            records, page_details = [], {}
+            for vector_id, vector in vectors.items():
+                values = vector["values"] if isinstance(vector, dict) else vector.values
+                metadata = dict((vector["metadata"] if isinstance(vector, dict) else vector.metadata) or {})
+                if "ingredients" not in metadata:
+                    continue  # already slim
+                page_details[vector_id], slim = split_recipe_metadata(metadata)
+                records.append({"id": vector_id, "values": list(values), "metadata": slim})
+            if records:
+                # Details first, so the slimmed vectors stay hydratable
+                details.put_many(page_details)
+                pinecone_index.upsert(vectors=records)
+                moved += len(records)
+    print(f"✅ Moved details of {moved} recipes into the recipe detail store")
+
+if __name__ == "__main__":
+    backfill_recipe_details()
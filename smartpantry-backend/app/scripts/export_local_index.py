@@ -0,0 +1,30 @@
+from pinecone import Pinecone
+from app.config import PINECONE_API_KEY, LOCAL_VECTOR_PATH, LOCAL_VECTOR_DTYPE, LOCAL_VECTOR_INDEX
+from app.services.recipe_details import get_recipe_details, split_recipe_metadata
+from app.services.vector_store import LocalRecipeStore
+
+# ✅ Copy every recipe vector from Pinecone into the local memory-mapped store,
+# moving recipe details into the local detail store on the way
+FETCH_BATCH = 100
+
+def export_pinecone_to_local(index_name="recipe-index", path=LOCAL_VECTOR_PATH):
+    index = Pinecone(api_key=PINECONE_API_KEY).Index(index_name)
+    store = LocalRecipeStore(dtype=LOCAL_VECTOR_DTYPE, index_type=LOCAL_VECTOR_INDEX)
+    details = get_recipe_details()
+
+    for id_page in index.list():
+        for start in range(0, len(id_page), FETCH_BATCH):
+            response = index.fetch(ids=id_page[start:start + FETCH_BATCH])
+            records, page_details = [], {}
+            for vector_id, vector in response.vectors.items():
+                page_details[vector_id], slim = split_recipe_metadata(dict(vector.metadata or {}))
+                records.append({"id": vector_id, "values": list(vector.values), "metadata": slim})
+            details.put_many({vector_id: row for vector_id, row in page_details.items() if row})
+            store.upsert(records)
+        print(f"📦 Exported {len(store)} recipes so far...")
+
+    store.save(path)
+    print(f"✅ Saved {len(store)} recipes to {path}")
+
+if __name__ == "__main__":
+    export_pinecone_to_local()
@@ -1,23 +1,26 @@
-import requests
+import argparse
+import asyncio
+import json
+import os
 import time
-from app.pinecone_client import pinecone_index
-from app.services.llama_index_service import generate_embedding
+
+import httpx
+
+from app.pinecone_client import get_recipe_store
+from app.services.llama_index_service import generate_embeddings_async
+from app.services.ingredients import ingredient_tokens
+from app.services.recipe_details import get_recipe_details, split_recipe_metadata
+from app.services.rate_limit import TokenBucket
 
 # ✅ Constants
 RECIPE_API_URL = "https://www.themealdb.com/api/json/v1/1/random.php"
 NUM_RECIPES = 30  # Number of recipes to fetch
-
-# ✅ Function to fetch a random recipe
-def fetch_random_recipe():
-    try:
-        response = requests.get(RECIPE_API_URL)
-        response.raise_for_status()  # Raise an error if API call fails
-        data = response.json()
-        if "meals" in data and data["meals"]:
-            return data["meals"][0]  # Return the first meal
-    except requests.RequestException as e:
-        print(f"❌ Error fetching recipe: {e}")
-        return None
+FETCH_CONCURRENCY = 4  # Requests in flight against TheMealDB
+FETCH_RATE = 2.0  # Requests per second allowed against TheMealDB
+EMBED_BATCH_SIZE = 64  # Texts per embeddings.create call
+UPSERT_BATCH_SIZE = 100  # Vectors per upsert
+CHECKPOINT_EVERY = 10  # Upserted chunks between store saves + checkpoints
+CHECKPOINT_PATH = "insert_pc.checkpoint.json"
 
 # ✅ Function to transform recipe data for Pinecone
 def transform_recipe(recipe):
@@ -26,7 +29,7 @@ def transform_recipe(recipe):
         recipe.get(f"strIngredient{i}") for i in range(1, 21)
         if recipe.get(f"strIngredient{i}") and recipe.get(f"strIngredient{i}").strip()
     ]
-    
+
     # Create a textual representation
     recipe_text = f"""
     Recipe: {recipe["strMeal"]}
@@ -35,50 +38,216 @@ def transform_recipe(recipe):
     Ingredients: {", ".join(ingredients)}
     Instructions: {recipe["strInstructions"]}
     """
-    
+
     return {
         "id": recipe["idMeal"],  # Unique ID
         "name": recipe["strMeal"],  # Recipe title
         "category": recipe["strCategory"],
         "cuisine": recipe["strArea"],
         "ingredients": ingredients,
+        "ingredient_tokens": ingredient_tokens(ingredients),  # normalized, for allergen filters
         "instructions": recipe["strInstructions"],
         "image_url": recipe["strMealThumb"],
     }, recipe_text
 
-# ✅ Function to upsert recipes into Pinecone
-def upsert_recipes_to_pinecone(recipes):
-    vectors = []
-    
-    for recipe in recipes:
-        transformed_data, recipe_text = transform_recipe(recipe)
-        print(transformed_data)
-        embedding_vector = generate_embedding(recipe_text)  # Generate embedding
-
-        vectors.append({
-            "id": transformed_data["id"],
-            "values": embedding_vector,
-            "metadata": transformed_data  # Store metadata for filtering later
-        })
-
-    # ✅ Upsert to Pinecone
-    if vectors:
-        pinecone_index.upsert(vectors=vectors)
-        print(f"✅ Successfully upserted {len(vectors)} recipes into Pinecone!")
+
+# ✅ Checkpoint: ids already upserted, so an interrupted run resumes where it stopped
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f)["indexed_ids"])
+
+def save_checkpoint(path, indexed_ids):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"indexed_ids": sorted(indexed_ids)}, f)
+    os.replace(tmp_path, path)
+
+
+# ✅ Stage 1: fetch raw TheMealDB recipes
+def load_recipes_from_json(path):
+    """Read a TheMealDB dump: either {"meals": [...]} or a plain list of meals."""
+    with open(path) as f:
+        data = json.load(f)
+    return data["meals"] if isinstance(data, dict) else data
+
+async def fetch_random_recipes(count, concurrency=FETCH_CONCURRENCY, rate=FETCH_RATE):
+    """Fetch ``count`` random recipes with bounded concurrency and a token-bucket rate limit."""
+    bucket = TokenBucket(rate, capacity=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(client):
+        async with semaphore:
+            await bucket.acquire()
+            try:
+                response = await client.get(RECIPE_API_URL)
+                response.raise_for_status()
+                data = response.json()
+                if "meals" in data and data["meals"]:
+                    return data["meals"][0]  # Return the first meal
+            except httpx.HTTPError as e:
+                print(f"❌ Error fetching recipe: {e}")
+            return None
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        for result in asyncio.as_completed([fetch_one(client) for _ in range(count)]):
+            recipe = await result
+            if recipe:
+                yield recipe
+
+
+async def _next_batch(queue, size, linger=0.5):
+    """Collect up to ``size`` items, waiting at most ``linger`` seconds after the first one.
+
+    Returns (items, done) where done means the producer's None sentinel was seen.
+    """
+    item = await queue.get()
+    if item is None:
+        return [], True
+    items = [item]
+    deadline = time.monotonic() + linger
+    while len(items) < size:
+        try:
+            item = await asyncio.wait_for(queue.get(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            break
+        if item is None:
+            return items, True
+        items.append(item)
+    return items, False
+
+
+class RecipeIngestionPipeline:
+    """fetch → batched embed → chunked upsert, connected by bounded queues.
+
+    Each upserted chunk writes its recipe details to the detail store first,
+    then the vectors with only the metadata filters need. The store is saved
+    (and the checkpoint written) every ``checkpoint_every`` chunks and once at
+    the end, after the approximate index is rebuilt.
+    """
+
+    def __init__(self, store=None, embed_batch_size=EMBED_BATCH_SIZE,
+                 upsert_batch_size=UPSERT_BATCH_SIZE, checkpoint_path=CHECKPOINT_PATH, details=None,
+                 checkpoint_every=CHECKPOINT_EVERY):
+        self.store = store or get_recipe_store()
+        self.details = details or get_recipe_details()
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.indexed_ids = load_checkpoint(checkpoint_path)
+        self.stats = {"fetched": 0, "skipped": 0, "embedded": 0, "upserted": 0}
+
+    async def run(self, recipes):
+        """Ingest an (async) iterable of raw TheMealDB recipes."""
+        raw_queue = asyncio.Queue(maxsize=self.embed_batch_size * 4)
+        vector_queue = asyncio.Queue(maxsize=self.upsert_batch_size * 4)
+        started = time.perf_counter()
+
+        await asyncio.gather(
+            self._produce(recipes, raw_queue),
+            self._embed(raw_queue, vector_queue),
+            self._upsert(vector_queue),
+        )
+        await asyncio.to_thread(self.store.build_index)
+        await self._checkpoint()
+
+        elapsed = time.perf_counter() - started
+        self.stats["seconds"] = round(elapsed, 2)
+        self.stats["recipes_per_second"] = round(self.stats["upserted"] / elapsed, 2) if elapsed else 0.0
+        return self.stats
+
+    async def _produce(self, recipes, raw_queue):
+        seen = set()
+        if hasattr(recipes, "__aiter__"):
+            async for recipe in recipes:
+                await self._enqueue(recipe, seen, raw_queue)
+        else:
+            for recipe in recipes:
+                await self._enqueue(recipe, seen, raw_queue)
+        await raw_queue.put(None)
+
+    async def _enqueue(self, recipe, seen, raw_queue):
+        self.stats["fetched"] += 1
+        if recipe["idMeal"] in seen or recipe["idMeal"] in self.indexed_ids:
+            self.stats["skipped"] += 1
+            return
+        seen.add(recipe["idMeal"])
+        await raw_queue.put(recipe)
+
+    async def _embed(self, raw_queue, vector_queue):
+        done = False
+        while not done:
+            batch, done = await _next_batch(raw_queue, self.embed_batch_size)
+            batch = await self._drop_already_indexed(batch)
+            if batch:
+                transformed = [transform_recipe(recipe) for recipe in batch]
+                embeddings = await generate_embeddings_async([text for _, text in transformed], self.embed_batch_size, cache=False)
+                self.stats["embedded"] += len(embeddings)
+                for (metadata, _), embedding in zip(transformed, embeddings):
+                    details, slim = split_recipe_metadata(metadata)
+                    await vector_queue.put(({"id": metadata["id"], "values": embedding, "metadata": slim}, details))
+        await vector_queue.put(None)
+
+    async def _drop_already_indexed(self, batch):
+        """Skip recipes the store already holds (e.g. from a run without this checkpoint)."""
+        if not batch:
+            return batch
+        response = await asyncio.to_thread(self.store.fetch, ids=[recipe["idMeal"] for recipe in batch])
+        existing = response["vectors"] if isinstance(response, dict) else response.vectors
+        if existing:
+            self.stats["skipped"] += len(existing)
+            self.indexed_ids.update(existing)
+        return [recipe for recipe in batch if recipe["idMeal"] not in existing]
+
+    async def _checkpoint(self):
+        """Persist the store, then record what it holds, so a resumed run never skips unsaved vectors."""
+        await asyncio.to_thread(self.store.save)
+        save_checkpoint(self.checkpoint_path, self.indexed_ids)
+
+    async def _upsert(self, vector_queue):
+        done = False
+        chunks = 0
+        while not done:
+            batch, done = await _next_batch(vector_queue, self.upsert_batch_size)
+            if batch:
+                # Details first, so every id a query can return is hydratable
+                await asyncio.to_thread(self.details.put_many, {record["id"]: details for record, details in batch})
+                records = [record for record, _ in batch]
+                await asyncio.to_thread(self.store.upsert, vectors=records)
+                self.indexed_ids.update(record["id"] for record in records)
+                chunks += 1
+                if chunks % self.checkpoint_every == 0:
+                    await self._checkpoint()
+                self.stats["upserted"] += len(batch)
+                print(f"✅ Upserted {self.stats['upserted']} recipes")
+
 
 # ✅ Main script to fetch & upsert recipes
-if __name__ == "__main__":
-    all_recipes = []
+def main():
+    parser = argparse.ArgumentParser(description="Fetch, embed and index TheMealDB recipes.")
+    parser.add_argument("--count", type=int, default=NUM_RECIPES, help="random recipes to fetch from TheMealDB")
+    parser.add_argument("--from-json", help="ingest a local TheMealDB JSON dump instead of calling the API")
+    parser.add_argument("--concurrency", type=int, default=FETCH_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=FETCH_RATE, help="TheMealDB requests per second")
+    parser.add_argument("--embed-batch", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--upsert-batch", type=int, default=UPSERT_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    args = parser.parse_args()
 
-    for i in range(NUM_RECIPES):
-        print(f"🍽️ Fetching recipe {i+1}/{NUM_RECIPES}...")
-        recipe = fetch_random_recipe()
-        if recipe:
-            all_recipes.append(recipe)
-        
-        time.sleep(1)  # Avoid hitting API rate limits
+    if args.from_json:
+        recipes = load_recipes_from_json(args.from_json)
+    else:
+        recipes = fetch_random_recipes(args.count, args.concurrency, args.rate)
 
-    print(f"🔄 Transforming and upserting {len(all_recipes)} recipes into Pinecone...")
-    upsert_recipes_to_pinecone(all_recipes)
+    pipeline = RecipeIngestionPipeline(
+        embed_batch_size=args.embed_batch,
+        upsert_batch_size=args.upsert_batch,
+        checkpoint_path=args.checkpoint,
+    )
+    stats = asyncio.run(pipeline.run(recipes))
+    print(f"🎉 Done: {stats}")
 
-    print("🎉 All recipes stored successfully!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+# ✅ Async load driver: a pool of virtual users cycling through the API's main endpoints.
+# --in-process runs the app inside this process (ASGI transport, no server needed), which
+# together with the fake backends (see seed_fake_backends.py) needs no paid services.
+RECEIPT_IMAGE = os.path.join(os.path.dirname(__file__), "..", "image.jpg")
+RECEIPT_BYTES = b""  # read from RECEIPT_IMAGE in main()
+
+ENDPOINTS = {
+    "pantry": lambda client, user_id: client.get(f"/pantry/{user_id}"),
+    "recipes": lambda client, user_id: client.get(f"/recipes/{user_id}"),
+    "grocery_list": lambda client, user_id: client.get(f"/grocery_list/{user_id}"),
+    "meal_plans": lambda client, user_id: client.get(f"/meal_plans/{user_id}"),
+    "parse_receipt": lambda client, user_id: client.post(
+        "/parse-receipt/", data={"user_id": user_id}, files={"file": ("receipt.jpg", RECEIPT_BYTES, "image/jpeg")}
+    ),
+}
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> float:
+        """Print per-endpoint latency percentiles and return the overall error rate."""
+        print(f"{'endpoint':<14}{'requests':>9}{'errors':>8}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        total = errors = 0
+        for endpoint, latencies in sorted(self.latencies.items()):
+            cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            total += len(latencies)
+            errors += self.errors[endpoint]
+            print(f"{endpoint:<14}{len(latencies):>9}{self.errors[endpoint]:>8}{len(latencies) / elapsed:>8.1f}"
+                  f"{cuts[49] * 1000:>9.1f}{cuts[94] * 1000:>9.1f}{cuts[98] * 1000:>9.1f}")
+        print(f"total: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} rps), {errors} errors")
+        return errors / total if total else 0.0
+
+
+async def virtual_user(client, user_ids, endpoints, stats, deadline, budget):
+    while time.perf_counter() < deadline and budget["remaining"] > 0:
+        budget["remaining"] -= 1
+        endpoint = random.choice(endpoints)
+        started = time.perf_counter()
+        try:
+            response = await ENDPOINTS[endpoint](client, random.choice(user_ids))
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        stats.record(endpoint, time.perf_counter() - started, ok)
+
+
+async def run(args, user_ids) -> float:
+    stats = Stats()
+    deadline = time.perf_counter() + args.duration
+    budget = {"remaining": args.requests or sys.maxsize}
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async def drive(client):
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            virtual_user(client, user_ids, args.endpoints, stats, deadline, budget) for _ in range(args.concurrency)
+        ))
+        return stats.report(time.perf_counter() - started)
+
+    if not args.in_process:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits) as client:
+            return await drive(client)
+
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://smartpantry", timeout=timeout) as client:
+            return await drive(client)
+
+
+def main():
+    global RECEIPT_BYTES
+    parser = argparse.ArgumentParser(description="Drive concurrent load against the SmartPantry API.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="run the app in this process instead of over HTTP")
+    parser.add_argument("--users-file", default="data/fake_users.json", help="JSON list of user ids to request")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = duration only)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="exit 1 above this error rate")
+    args = parser.parse_args()
+
+    with open(args.users_file) as f:
+        user_ids = json.load(f)
+    with open(RECEIPT_IMAGE, "rb") as f:
+        RECEIPT_BYTES = f.read()
+
+    error_rate = asyncio.run(run(args, user_ids))
+    if error_rate > args.max_error_rate:
+        sys.exit(f"❌ Error rate {error_rate:.2%} is above {args.max_error_rate:.2%}")
+    print("✅ Error rate within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.services.llama_index_service import (
+    _meal_plan_candidates,
+    generate_meal_plan_service_async,
+    get_user_pantry_service_async,
+    get_user_preferences_service_async,
+    get_user_recipes_service_async,
+)
+from app.services.meal_planner import NoFeasibleMealPlan, plan_quality
+from app.services.request_context import RequestContext
+
+# ✅ Meal planner benchmark: the local solver vs the LLM planner on the same users, comparing
+# latency and plan quality (pantry coverage, variety, slot fit, preference violations).
+# With the fake backends (see seed_fake_backends.py) the LLM is FakeLLM, so set FAKE_LLM_LATENCY
+# to a realistic gpt-3.5-turbo time, or run against the real services for real numbers.
+PLANNERS = ("local", "llm")
+QUALITY_FIELDS = ("filled_slots", "distinct_recipes", "mean_coverage", "slot_fit", "violations", "unknown_recipes")
+
+
+async def plan_once(user_id: str, planner: str):
+    """(seconds, plan days or None if invalid, candidates) for one user and planner."""
+    ctx = RequestContext()
+    # Warm the shared inputs first so only the planning step is timed
+    pantry_response, preferences, recipes = await asyncio.gather(
+        get_user_pantry_service_async(user_id, ctx),
+        get_user_preferences_service_async(user_id, ctx),
+        get_user_recipes_service_async(user_id, ctx),
+    )
+    candidates = _meal_plan_candidates(pantry_response["pantry"], preferences, recipes["suggested_recipes"])
+
+    started = time.perf_counter()
+    try:
+        content = await generate_meal_plan_service_async(user_id, ctx, planner=planner)
+    except NoFeasibleMealPlan:
+        content = None
+    seconds = time.perf_counter() - started
+    try:
+        days = json.loads(content)["days"]
+    except (TypeError, ValueError, KeyError):
+        days = None
+    return seconds, days, candidates, preferences
+
+
+async def run(user_ids, planners):
+    results = {planner: {"latencies": [], "invalid": 0, "quality": []} for planner in planners}
+    for user_id in user_ids:
+        for planner in planners:
+            seconds, days, candidates, preferences = await plan_once(user_id, planner)
+            results[planner]["latencies"].append(seconds)
+            if days is None:
+                results[planner]["invalid"] += 1
+            else:
+                results[planner]["quality"].append(plan_quality(days, candidates, preferences))
+    return results
+
+
+def report(results):
+    header = f"{'planner':<8}{'plans':>6}{'invalid':>8}{'p50 ms':>9}{'p95 ms':>9}"
+    print(header + "".join(f"{field:>17}" for field in QUALITY_FIELDS))
+    for planner, result in results.items():
+        latencies = result["latencies"]
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        means = [
+            statistics.mean(quality[field] for quality in result["quality"]) if result["quality"] else 0.0
+            for field in QUALITY_FIELDS
+        ]
+        print(f"{planner:<8}{len(latencies):>6}{result['invalid']:>8}{cuts[49] * 1000:>9.1f}{cuts[94] * 1000:>9.1f}"
+              + "".join(f"{mean:>17.3f}" for mean in means))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the local meal planner with the LLM planner.")
+    parser.add_argument("--users-file", default="data/fake_users.json", help="JSON list of user ids to plan for")
+    parser.add_argument("--users", type=int, default=20, help="how many of those users to plan for")
+    parser.add_argument("--planner", choices=PLANNERS, action="append", help="planner(s) to run (default: both)")
+    args = parser.parse_args()
+
+    with open(args.users_file) as f:
+        user_ids = json.load(f)[:args.users]
+    report(asyncio.run(run(user_ids, args.planner or PLANNERS)))
+
+
+if __name__ == "__main__":
+    main()
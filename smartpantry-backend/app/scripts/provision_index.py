@@ -0,0 +1,6 @@
+from app.pinecone_client import index_name, provision_index
+
+# ✅ One-off admin step: create the Pinecone recipe index (the API no longer does this at import)
+if __name__ == "__main__":
+    created = provision_index()
+    print(f"🎉 {'Created' if created else 'Kept existing'} index {index_name}")
@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+
+from app.config import DATABASE_BACKEND, LOCAL_VECTOR_DTYPE, LOCAL_VECTOR_INDEX, LOCAL_VECTOR_PATH, RECIPE_DETAIL_PATH, VECTOR_BACKEND
+from app.services.fakes import FAKE_EMBEDDING_DIMENSION, fake_recipes, seed_fake_users
+from app.services.recipe_details import get_recipe_details, split_recipe_metadata
+from app.services.vector_store import LocalRecipeStore
+from app.supabase_client import get_sql_engine
+
+# ✅ Fill the local stand-ins (SQLite database + local recipe vectors) with synthetic data.
+# Run with DATABASE_BACKEND=sqlite VECTOR_BACKEND=local OPENAI_BACKEND=fake, then start the API
+# (or app/scripts/load_test.py --in-process) with the same settings.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the fake backends with synthetic users and recipes.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users-file", default="data/fake_users.json", help="where to write the seeded user ids")
+    args = parser.parse_args()
+
+    if DATABASE_BACKEND != "sqlite" or VECTOR_BACKEND != "local":
+        raise SystemExit("❌ Set DATABASE_BACKEND=sqlite and VECTOR_BACKEND=local; this script only writes local data")
+
+    store = LocalRecipeStore(dimension=FAKE_EMBEDDING_DIMENSION, dtype=LOCAL_VECTOR_DTYPE, index_type=LOCAL_VECTOR_INDEX)
+    records, details = [], {}
+    for record in fake_recipes(args.recipes, seed=args.seed):
+        details[record["id"]], slim = split_recipe_metadata(record["metadata"])
+        records.append({**record, "metadata": slim})
+    get_recipe_details().put_many(details)
+    store.upsert(records)
+    store.save(LOCAL_VECTOR_PATH)
+    print(f"✅ Saved {len(store)} recipes to {LOCAL_VECTOR_PATH} (details in {RECIPE_DETAIL_PATH})")
+
+    user_ids = seed_fake_users(get_sql_engine(), args.users, seed=args.seed)
+    os.makedirs(os.path.dirname(args.users_file) or ".", exist_ok=True)
+    with open(args.users_file, "w") as f:
+        json.dump(user_ids, f)
+    print(f"✅ Seeded {len(user_ids)} users; ids written to {args.users_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import gzip
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.services.fakes import fake_recipes
+from app.services.schemas import OrjsonResponse, project_recipes
+
+# ✅ Serialization benchmark for /recipes responses: FastAPI's default path
+# (jsonable_encoder + json) vs orjson, with gzip and ?fields= projection
+LIST_VIEW_FIELDS = ["recipe_name", "score", "image_url"]
+
+
+def recipes_response(count: int, instructions_chars: int) -> dict:
+    """A /recipes body with ``count`` synthetic recipes (TheMealDB instructions run ~1-2 KB)."""
+    suggested = []
+    for record in fake_recipes(count):
+        metadata = record["metadata"]
+        instructions = (metadata["instructions"] + " ") * (instructions_chars // len(metadata["instructions"]) + 1)
+        suggested.append({
+            "recipe_id": metadata["id"],
+            "recipe_name": metadata["name"],
+            "score": 0.8123456789,
+            "ingredients": metadata["ingredients"],
+            "instructions": instructions[:instructions_chars],
+            "image_url": metadata["image_url"],
+        })
+    return {"user_id": "00000000-0000-0000-0000-000000000000", "suggested_recipes": suggested}
+
+
+def time_per_call(render, runs: int) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        render()
+    return (time.perf_counter() - started) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare response serialization time and payload size.")
+    parser.add_argument("--recipes", type=int, default=9, help="recipes per response (the API returns 9)")
+    parser.add_argument("--instructions-chars", type=int, default=1500)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    body = recipes_response(args.recipes, args.instructions_chars)
+    variants = {
+        "default (jsonable_encoder + json)": lambda: JSONResponse(jsonable_encoder(body)).body,
+        "orjson": lambda: OrjsonResponse(body).body,
+        f"orjson + fields={','.join(LIST_VIEW_FIELDS)}": lambda: OrjsonResponse(project_recipes(body, LIST_VIEW_FIELDS)).body,
+    }
+
+    print(f"{'variant':<50}{'µs/response':>12}{'bytes':>9}{'gzip bytes':>12}")
+    for name, render in variants.items():
+        payload = render()
+        micros = time_per_call(render, args.runs) * 1e6
+        print(f"{name:<50}{micros:>12.1f}{len(payload):>9}{len(gzip.compress(payload, compresslevel=5)):>12}")
+
+
+if __name__ == "__main__":
+    main()
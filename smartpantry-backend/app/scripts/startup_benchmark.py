@@ -0,0 +1,57 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# ✅ Cold-start benchmark: import the app in fresh interpreters under `python -X importtime`
+DEFAULT_MODULE = "app.main"
+
+
+def run_once(module):
+    """(wall seconds, {module: cumulative microseconds}) for one fresh-interpreter import."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f"❌ import {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return wall, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the API.")
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    walls, imports = [], []
+    for _ in range(args.runs):
+        wall, cumulative = run_once(args.module)
+        walls.append(wall)
+        imports.append(cumulative)
+
+    print(f"📊 import {args.module}: {args.runs} runs")
+    print(f"   wall   median {statistics.median(walls) * 1000:.0f} ms  (min {min(walls) * 1000:.0f}, max {max(walls) * 1000:.0f})")
+    module_ms = [cumulative.get(args.module, 0) / 1000 for cumulative in imports]
+    print(f"   import median {statistics.median(module_ms):.0f} ms")
+
+    last = imports[-1]
+    print("   slowest imports (cumulative, last run):")
+    for name, microseconds in sorted(last.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"   {microseconds / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
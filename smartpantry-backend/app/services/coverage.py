@@ -0,0 +1,133 @@
+import logging
+import threading
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.ingredients import IngredientIndex, get_ingredient_index
+
+logger = logging.getLogger(__name__)
+
+
+class RecipeCoverageIndex:
+    """Recipe × ingredient incidence matrix in CSR and CSC form (NumPy arrays, no SciPy).
+
+    Row ``r`` holds the canonical ingredient ids of recipe ``recipe_ids[r]``
+    in ``indices[indptr[r]:indptr[r + 1]]``; column ``i`` holds the rows of
+    the recipes using ingredient ``i`` in ``col_rows[col_indptr[i]:col_indptr[i + 1]]``.
+    The sparse mat-vec ``incidence @ pantry_mask`` (every recipe's count of
+    ingredients on hand) is one ``bincount`` over the pantry's columns, so its
+    cost follows the pantry's postings rather than the catalog's non-zeros.
+    """
+
+    def __init__(self, recipe_sets: Iterable[Tuple[str, FrozenSet[int]]]):
+        recipe_sets = list(recipe_sets)
+        self.recipe_ids: List[str] = [recipe_id for recipe_id, _ in recipe_sets]
+        self.positions = {recipe_id: r for r, recipe_id in enumerate(self.recipe_ids)}
+        self.counts = np.fromiter((len(ids) for _, ids in recipe_sets), dtype=np.int32, count=len(recipe_sets))
+        self.indptr = np.zeros(len(recipe_sets) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=self.indptr[1:])
+        self.indices = np.fromiter(
+            (i for _, ids in recipe_sets for i in ids), dtype=np.int32, count=int(self.indptr[-1])
+        )
+        self.ingredient_count = int(self.indices.max()) + 1 if len(self.indices) else 0
+
+        rows = np.repeat(np.arange(len(recipe_sets), dtype=np.int32), self.counts)
+        order = np.argsort(self.indices, kind="stable")
+        self.col_rows = rows[order]
+        self.col_indptr = np.zeros(self.ingredient_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.ingredient_count), out=self.col_indptr[1:])
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def _row_sums(self, ingredient_ids: Iterable[int]) -> np.ndarray:
+        """How many of ``ingredient_ids`` each recipe uses."""
+        postings = [
+            self.col_rows[self.col_indptr[i]:self.col_indptr[i + 1]]
+            for i in set(ingredient_ids) if 0 <= i < self.ingredient_count
+        ]
+        if not postings:
+            return np.zeros(len(self.recipe_ids), dtype=np.int64)
+        return np.bincount(np.concatenate(postings), minlength=len(self.recipe_ids))
+
+    def score(self, pantry_ids: Iterable[int], allergen_ids: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(coverage, missing count, allowed) arrays over all recipes.
+
+        ``coverage`` is the share of a recipe's ingredients in the pantry and
+        ``allowed`` is False for recipes containing any allergen.
+        """
+        have = self._row_sums(pantry_ids)
+        allowed = self._row_sums(allergen_ids) == 0
+        return have / np.maximum(self.counts, 1), self.counts - have, allowed
+
+    def top(self, pantry_ids: Iterable[int], allergen_ids: Iterable[int] = (), k: int = 9) -> List[dict]:
+        """The ``k`` allowed recipes with the highest coverage (fewest missing breaks ties)."""
+        if not self.recipe_ids or k < 1:
+            return []
+        coverage, missing, allowed = self.score(pantry_ids, allergen_ids)
+        ranking = coverage - missing * 1e-4
+        ranking[~allowed | (coverage == 0)] = -np.inf
+
+        k = min(k, len(ranking))
+        candidates = np.argpartition(-ranking, k - 1)[:k]
+        candidates = candidates[np.argsort(-ranking[candidates], kind="stable")]
+        return [
+            {"recipe_id": self.recipe_ids[r], "coverage": float(coverage[r]), "missing_count": int(missing[r])}
+            for r in candidates if np.isfinite(ranking[r])
+        ]
+
+    def lookup(self, recipe_ids: Iterable[str], pantry_ids: Iterable[int]) -> dict:
+        """recipe_id -> (coverage, missing count) for specific recipes."""
+        pantry = set(pantry_ids)
+        scores = {}
+        for recipe_id in recipe_ids:
+            r = self.positions.get(recipe_id)
+            if r is not None:
+                row = self.indices[self.indptr[r]:self.indptr[r + 1]]
+                have = sum(1 for i in row.tolist() if i in pantry)
+                scores[recipe_id] = (have / max(len(row), 1), len(row) - have)
+        return scores
+
+
+_coverage_index: Optional[RecipeCoverageIndex] = None
+_coverage_lock = threading.Lock()
+_rebuild_thread: Optional[threading.Thread] = None
+
+
+def get_coverage_index(ingredient_index: Optional[IngredientIndex] = None) -> RecipeCoverageIndex:
+    """The coverage matrix for every recipe the ingredient index knows.
+
+    Built on first use (the app does it at startup). When the ingredient
+    index has learned recipes since, a background thread builds a new matrix
+    and swaps it in; requests keep using the current one meanwhile.
+    """
+    global _coverage_index
+    if ingredient_index is None:
+        ingredient_index = get_ingredient_index()
+    if _coverage_index is None:
+        with _coverage_lock:
+            if _coverage_index is None:
+                _coverage_index = RecipeCoverageIndex(ingredient_index.recipe_ingredient_sets())
+    elif ingredient_index.recipe_count != len(_coverage_index):
+        _schedule_rebuild(ingredient_index)
+    return _coverage_index
+
+
+def _schedule_rebuild(ingredient_index: IngredientIndex):
+    global _rebuild_thread
+    with _coverage_lock:
+        if _rebuild_thread is not None and _rebuild_thread.is_alive():
+            return
+        _rebuild_thread = threading.Thread(target=_rebuild, args=(ingredient_index,), name="coverage-rebuild", daemon=True)
+        _rebuild_thread.start()
+
+
+def _rebuild(ingredient_index: IngredientIndex):
+    global _coverage_index
+    try:
+        index = RecipeCoverageIndex(ingredient_index.recipe_ingredient_sets())
+    except Exception:
+        logger.exception("Could not rebuild the coverage index")
+        return
+    _coverage_index = index
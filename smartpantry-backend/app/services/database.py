@@ -0,0 +1,456 @@
+import json
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import bindparam, event, text
+
+from app.services.tracing import traced
+from app.supabase_client import get_async_sql_engine, get_sql_engine
+
+
+# ✅ Typed records (tuples, so existing index-based callers and JSON responses are unchanged)
+class PantryItem(NamedTuple):
+    ingredient_name: str
+    quantity: float
+    unit: str
+
+
+class UserPreferences(NamedTuple):
+    user_id: str
+    allergies: List[str]
+    dislikes: List[str]
+    diet: Optional[str]
+    favorite_cuisines: List[str]
+    preferred_meal_types: List[str]
+    effort_level: Optional[str]
+
+    @classmethod
+    def empty(cls, user_id: str) -> "UserPreferences":
+        """Defaults for a user who hasn't saved preferences yet."""
+        return cls(user_id, [], [], None, [], [], None)
+
+    @classmethod
+    def from_row(cls, row) -> "UserPreferences":
+        user_id, allergies, dislikes, diet, favorite_cuisines, preferred_meal_types, effort_level = row
+        return cls(str(user_id), _list(allergies), _list(dislikes), diet, _list(favorite_cuisines), _list(preferred_meal_types), effort_level)
+
+
+def _list(value) -> List:
+    """Array column value: a list from Postgres, JSON text from SQLite."""
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value) if value is not None else []
+
+
+class StoredPantryEmbedding(NamedTuple):
+    pantry_hash: str
+    embedding: List[float]
+
+
+class PantryDelta(NamedTuple):
+    """Pantry rows written after a client's revision, and names deleted since then."""
+    revision: int
+    changed: List[PantryItem]
+    deleted: List[str]
+
+
+class StoredMealPlan(NamedTuple):
+    meal_plan: object
+    fingerprint: Optional[str]
+
+
+def encode_meal_plan(meal_plan) -> str:
+    """JSON text for the meal_plan column; a plan that is already JSON text is passed through, not re-encoded."""
+    return meal_plan if isinstance(meal_plan, str) else json.dumps(meal_plan)
+
+
+def decode_meal_plan(value):
+    """The plan object from a meal_plan column value (or buffered plan).
+
+    Depending on the driver the JSONB column comes back as the object or as
+    its JSON text (SQLite always stores the text). Rows written
+    before the column held objects contain the plan as a JSON string, so
+    a string that decodes to a string is decoded once more.
+    """
+    while isinstance(value, str):
+        value = json.loads(value)
+    return value
+
+
+# ✅ Bound-parameter statements, compiled once and reused
+class DialectQuery:
+    """A statement written for Postgres, with an optional SQLite variant for the local fake backend."""
+
+    def __init__(self, postgresql: str, sqlite: Optional[str] = None, expanding: tuple = ()):
+        self.postgresql = text(postgresql)
+        self.sqlite = text(sqlite or postgresql)
+        if expanding:
+            self.sqlite = self.sqlite.bindparams(*(bindparam(name, expanding=True) for name in expanding))
+
+    def on(self, conn):
+        return self.sqlite if conn.dialect.name == "sqlite" else self.postgresql
+
+
+PANTRY_QUERY = DialectQuery("""
+    SELECT ingredient_name, quantity, unit
+    FROM pantry
+    WHERE user_id = CAST(:user_id AS UUID)
+""", """
+    SELECT ingredient_name, quantity, unit
+    FROM pantry
+    WHERE user_id = :user_id
+""")
+
+# Revision sync (data/migrations/003_pantry_revisions.sql)
+PANTRY_REVISION_QUERY = DialectQuery("""
+    SELECT revision
+    FROM pantry_revisions
+    WHERE user_id = CAST(:user_id AS UUID)
+""", """
+    SELECT revision
+    FROM pantry_revisions
+    WHERE user_id = :user_id
+""")
+
+PANTRY_CHANGES_QUERY = DialectQuery("""
+    SELECT ingredient_name, quantity, unit
+    FROM pantry
+    WHERE user_id = CAST(:user_id AS UUID) AND revision > :since
+""", """
+    SELECT ingredient_name, quantity, unit
+    FROM pantry
+    WHERE user_id = :user_id AND revision > :since
+""")
+
+PANTRY_DELETIONS_QUERY = DialectQuery("""
+    SELECT ingredient_name
+    FROM pantry_tombstones
+    WHERE user_id = CAST(:user_id AS UUID) AND revision > :since
+""", """
+    SELECT ingredient_name
+    FROM pantry_tombstones
+    WHERE user_id = :user_id AND revision > :since
+""")
+
+PREFERENCES_QUERY = DialectQuery("""
+    SELECT user_id, allergies, dislikes, diet, favorite_cuisines, preferred_meal_types, effort_level
+    FROM user_preferences
+    WHERE user_id = CAST(:user_id AS UUID)
+""", """
+    SELECT user_id, allergies, dislikes, diet, favorite_cuisines, preferred_meal_types, effort_level
+    FROM user_preferences
+    WHERE user_id = :user_id
+""")
+
+# Batch variants for many users in one round trip
+PANTRIES_QUERY = DialectQuery("""
+    SELECT CAST(user_id AS TEXT), ingredient_name, quantity, unit
+    FROM pantry
+    WHERE user_id = ANY(CAST(:user_ids AS UUID[]))
+""", """
+    SELECT user_id, ingredient_name, quantity, unit
+    FROM pantry
+    WHERE user_id IN :user_ids
+""", expanding=("user_ids",))
+
+PREFERENCES_MANY_QUERY = DialectQuery("""
+    SELECT CAST(user_id AS TEXT), allergies, dislikes, diet, favorite_cuisines, preferred_meal_types, effort_level
+    FROM user_preferences
+    WHERE user_id = ANY(CAST(:user_ids AS UUID[]))
+""", """
+    SELECT user_id, allergies, dislikes, diet, favorite_cuisines, preferred_meal_types, effort_level
+    FROM user_preferences
+    WHERE user_id IN :user_ids
+""", expanding=("user_ids",))
+
+STORED_MEAL_PLAN_QUERY = DialectQuery("""
+    SELECT meal_plan, fingerprint
+    FROM user_meal_history
+    WHERE user_id = CAST(:user_id AS UUID)
+""", """
+    SELECT meal_plan, fingerprint
+    FROM user_meal_history
+    WHERE user_id = :user_id
+""")
+
+
+# pgvector columns are read and written as float4[] so asyncpg needs no extra codec
+PANTRY_EMBEDDING_QUERY = DialectQuery("""
+    SELECT pantry_hash, CAST(embedding AS FLOAT4[])
+    FROM pantry_embeddings
+    WHERE user_id = CAST(:user_id AS UUID)
+""", """
+    SELECT pantry_hash, embedding
+    FROM pantry_embeddings
+    WHERE user_id = :user_id
+""")
+
+UPSERT_PANTRY_EMBEDDING = DialectQuery("""
+    INSERT INTO pantry_embeddings (user_id, pantry_hash, embedding, updated_at)
+    VALUES (CAST(:user_id AS UUID), :pantry_hash, CAST(CAST(:embedding AS FLOAT4[]) AS VECTOR), NOW())
+    ON CONFLICT (user_id) DO UPDATE
+    SET pantry_hash = EXCLUDED.pantry_hash, embedding = EXCLUDED.embedding, updated_at = EXCLUDED.updated_at
+""", """
+    INSERT INTO pantry_embeddings (user_id, pantry_hash, embedding, updated_at)
+    VALUES (:user_id, :pantry_hash, :embedding, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE
+    SET pantry_hash = excluded.pantry_hash, embedding = excluded.embedding, updated_at = excluded.updated_at
+""")
+
+DELETE_PANTRY_EMBEDDING = DialectQuery("""
+    DELETE FROM pantry_embeddings
+    WHERE user_id = CAST(:user_id AS UUID)
+""", """
+    DELETE FROM pantry_embeddings
+    WHERE user_id = :user_id
+""")
+
+
+# Bulk upserts for the write-behind buffer: one statement per flush on Postgres
+# (rows passed as parallel arrays), executemany on SQLite
+UPSERT_PANTRY_ITEMS = DialectQuery("""
+    INSERT INTO pantry (user_id, ingredient_name, quantity, unit, storage_location, created_at)
+    SELECT user_id, ingredient_name, quantity, unit, storage_location, NOW()
+    FROM unnest(
+        CAST(:user_id AS UUID[]), CAST(:ingredient_name AS TEXT[]), CAST(:quantity AS FLOAT8[]),
+        CAST(:unit AS TEXT[]), CAST(:storage_location AS TEXT[])
+    ) AS rows (user_id, ingredient_name, quantity, unit, storage_location)
+    ON CONFLICT (user_id, ingredient_name) DO UPDATE
+    SET quantity = COALESCE(pantry.quantity, 0) + EXCLUDED.quantity,
+        unit = EXCLUDED.unit, storage_location = EXCLUDED.storage_location
+""", """
+    INSERT INTO pantry (user_id, ingredient_name, quantity, unit, storage_location, created_at)
+    VALUES (:user_id, :ingredient_name, :quantity, :unit, :storage_location, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id, ingredient_name) DO UPDATE
+    SET quantity = COALESCE(pantry.quantity, 0) + excluded.quantity,
+        unit = excluded.unit, storage_location = excluded.storage_location
+""")
+
+UPSERT_MEAL_HISTORY = DialectQuery("""
+    INSERT INTO user_meal_history (user_id, meal_plan, fingerprint, created_at)
+    SELECT user_id, CAST(meal_plan AS JSONB), fingerprint, NOW()
+    FROM unnest(CAST(:user_id AS UUID[]), CAST(:meal_plan AS TEXT[]), CAST(:fingerprint AS TEXT[]))
+        AS rows (user_id, meal_plan, fingerprint)
+    ON CONFLICT (user_id) DO UPDATE
+    SET meal_plan = EXCLUDED.meal_plan, fingerprint = EXCLUDED.fingerprint, created_at = EXCLUDED.created_at
+""", """
+    INSERT INTO user_meal_history (user_id, meal_plan, fingerprint, created_at)
+    VALUES (:user_id, :meal_plan, :fingerprint, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id) DO UPDATE
+    SET meal_plan = excluded.meal_plan, fingerprint = excluded.fingerprint, created_at = excluded.created_at
+""")
+
+
+# ✅ Pool metrics
+class PoolMetrics:
+    """Connection acquisition wait times plus live pool counters for one engine."""
+
+    def __init__(self, name: str, pool):
+        self.name = name
+        self.pool = pool
+        self.acquisitions = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.connects = 0
+        self._lock = threading.Lock()
+        event.listen(pool, "connect", self._on_connect)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.connects += 1
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.acquisitions += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "pool_size": self.pool.size(),
+            "checked_out": self.pool.checkedout(),
+            "checked_in": self.pool.checkedin(),
+            "overflow": self.pool.overflow(),
+            "connections_opened": self.connects,
+            "acquisitions": self.acquisitions,
+            "avg_wait_ms": round(1000 * self.total_wait / self.acquisitions, 3) if self.acquisitions else 0.0,
+            "max_wait_ms": round(1000 * self.max_wait, 3),
+        }
+
+
+# Created with their engine on first use
+@lru_cache(maxsize=None)
+def sync_pool_metrics() -> PoolMetrics:
+    return PoolMetrics("sync", get_sql_engine().pool)
+
+
+@lru_cache(maxsize=None)
+def async_pool_metrics() -> PoolMetrics:
+    return PoolMetrics("async", get_async_sql_engine().sync_engine.pool)
+
+
+def pool_metrics() -> dict:
+    return {"sync": sync_pool_metrics().snapshot(), "async": async_pool_metrics().snapshot()}
+
+
+@contextmanager
+def connect():
+    """Check a connection out of the sync pool, recording how long that took."""
+    metrics = sync_pool_metrics()
+    started = time.perf_counter()
+    with get_sql_engine().connect() as conn:
+        metrics.record_wait(time.perf_counter() - started)
+        yield conn
+
+
+@asynccontextmanager
+async def connect_async():
+    """Check a connection out of the async pool, recording how long that took."""
+    metrics = async_pool_metrics()
+    started = time.perf_counter()
+    async with get_async_sql_engine().connect() as conn:
+        metrics.record_wait(time.perf_counter() - started)
+        yield conn
+
+
+# ✅ Queries
+@traced("sql.pantry")
+def fetch_pantry(user_id: str) -> List[PantryItem]:
+    with connect() as conn:
+        return [PantryItem(*row) for row in conn.execute(PANTRY_QUERY.on(conn), {"user_id": user_id})]
+
+
+@traced("sql.preferences")
+def fetch_preferences(user_id: str) -> UserPreferences:
+    with connect() as conn:
+        row = conn.execute(PREFERENCES_QUERY.on(conn), {"user_id": user_id}).first()
+    return UserPreferences.from_row(row) if row is not None else UserPreferences.empty(user_id)
+
+
+@traced("sql.pantry")
+async def fetch_pantry_async(user_id: str) -> List[PantryItem]:
+    async with connect_async() as conn:
+        result = await conn.execute(PANTRY_QUERY.on(conn), {"user_id": user_id})
+        return [PantryItem(*row) for row in result]
+
+
+@traced("sql.pantry_revision")
+async def fetch_pantry_revision_async(user_id: str) -> int:
+    """The user's current pantry revision (0 before their first pantry write)."""
+    async with connect_async() as conn:
+        result = await conn.execute(PANTRY_REVISION_QUERY.on(conn), {"user_id": user_id})
+        return result.scalar() or 0
+
+
+@traced("sql.pantry")
+async def fetch_pantry_delta_async(user_id: str, since: int) -> PantryDelta:
+    """Rows written and names deleted after revision ``since``.
+
+    The revision is read first, so a write racing this call is at worst
+    returned again on the client's next sync, never skipped.
+    """
+    async with connect_async() as conn:
+        revision = (await conn.execute(PANTRY_REVISION_QUERY.on(conn), {"user_id": user_id})).scalar() or 0
+        params = {"user_id": user_id, "since": since}
+        changed = [PantryItem(*row) for row in await conn.execute(PANTRY_CHANGES_QUERY.on(conn), params)]
+        deleted = [row[0] for row in await conn.execute(PANTRY_DELETIONS_QUERY.on(conn), params)]
+    return PantryDelta(revision, changed, deleted)
+
+
+@traced("sql.preferences")
+async def fetch_preferences_async(user_id: str) -> UserPreferences:
+    async with connect_async() as conn:
+        result = await conn.execute(PREFERENCES_QUERY.on(conn), {"user_id": user_id})
+        row = result.first()
+    return UserPreferences.from_row(row) if row is not None else UserPreferences.empty(user_id)
+
+
+@traced("sql.pantries")
+async def fetch_pantries_async(user_ids: List[str]) -> Dict[str, List[PantryItem]]:
+    """Pantry rows for many users in one query; users without rows map to []."""
+    pantries = defaultdict(list)
+    async with connect_async() as conn:
+        result = await conn.execute(PANTRIES_QUERY.on(conn), {"user_ids": list(user_ids)})
+        for user_id, *row in result:
+            pantries[str(user_id)].append(PantryItem(*row))
+    return {user_id: pantries.get(user_id.lower(), []) for user_id in user_ids}
+
+
+@traced("sql.preferences")
+async def fetch_preferences_many_async(user_ids: List[str]) -> Dict[str, UserPreferences]:
+    """Preferences for many users in one query, with defaults for users without a row."""
+    async with connect_async() as conn:
+        result = await conn.execute(PREFERENCES_MANY_QUERY.on(conn), {"user_ids": list(user_ids)})
+        found = {str(row[0]): UserPreferences.from_row(row) for row in result}
+    return {user_id: found.get(user_id.lower()) or UserPreferences.empty(user_id) for user_id in user_ids}
+
+
+@traced("sql.pantry_embedding")
+async def fetch_pantry_embedding_async(user_id: str) -> Optional[StoredPantryEmbedding]:
+    async with connect_async() as conn:
+        result = await conn.execute(PANTRY_EMBEDDING_QUERY.on(conn), {"user_id": user_id})
+        row = result.first()
+    return StoredPantryEmbedding(row[0], _list(row[1])) if row is not None else None
+
+
+@traced("sql.pantry_embedding_write")
+async def store_pantry_embedding_async(user_id: str, pantry_hash: str, embedding: List[float]):
+    async with connect_async() as conn:
+        vector = json.dumps(list(embedding)) if conn.dialect.name == "sqlite" else list(embedding)
+        await conn.execute(UPSERT_PANTRY_EMBEDDING.on(conn), {"user_id": user_id, "pantry_hash": pantry_hash, "embedding": vector})
+        await conn.commit()
+
+
+@traced("sql.pantry_embedding_write")
+async def delete_pantry_embedding_async(user_id: str):
+    async with connect_async() as conn:
+        await conn.execute(DELETE_PANTRY_EMBEDDING.on(conn), {"user_id": user_id})
+        await conn.commit()
+
+
+@traced("sql.meal_history")
+async def fetch_stored_meal_plan_async(user_id: str) -> Optional[StoredMealPlan]:
+    async with connect_async() as conn:
+        result = await conn.execute(STORED_MEAL_PLAN_QUERY.on(conn), {"user_id": user_id})
+        row = result.first()
+    return StoredMealPlan(decode_meal_plan(row[0]), row[1]) if row is not None else None
+
+
+async def _bulk_upsert(query: DialectQuery, rows: List[dict]):
+    if not rows:
+        return
+    async with connect_async() as conn:
+        if conn.dialect.name == "sqlite":
+            await conn.execute(query.on(conn), rows)
+        else:
+            await conn.execute(query.on(conn), {column: [row[column] for row in rows] for column in rows[0]})
+        await conn.commit()
+
+
+@traced("sql.pantry_write")
+async def upsert_pantry_items_async(rows: List[dict]):
+    """Add quantities to (user_id, ingredient_name) pantry rows, inserting missing ones.
+
+    ``rows`` must be unique per key (the write-behind buffer merges them).
+    """
+    await _bulk_upsert(UPSERT_PANTRY_ITEMS, [
+        {column: row.get(column) for column in ("user_id", "ingredient_name", "quantity", "unit", "storage_location")}
+        for row in rows
+    ])
+
+
+@traced("sql.meal_history_write")
+async def upsert_meal_history_async(rows: List[dict]):
+    """Replace the stored meal plan (and fingerprint) of each user in ``rows``."""
+    # JSON text: cast to JSONB on Postgres, stored as is by SQLite
+    await _bulk_upsert(UPSERT_MEAL_HISTORY, [
+        {
+            "user_id": row["user_id"],
+            "meal_plan": encode_meal_plan(row["meal_plan"]),
+            "fingerprint": row.get("fingerprint"),
+        }
+        for row in rows
+    ])
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.config import DERIVED_CACHE_SIZE
+
+
+class RevisionCache:
+    """LRU of derived per-user results (recipes, grocery lists), each stored with the
+    version it was computed from.
+
+    A version is the user's pantry revision plus anything else the result
+    depends on (preferences). An entry is only served while the caller's
+    current version equals the stored one, so no explicit invalidation is
+    needed when the pantry changes.
+
+    The cache is per process. With several workers each keeps its own
+    entries; that is safe because every read compares against the version
+    just read from the database, so a write made through one worker (or the
+    write-behind flush of another) is seen by all of them on their next read.
+    ``invalidate_user`` only reaches the local process, so nothing may depend
+    on it for correctness.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (kind, user_id, ...) -> (version, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, version: Any, value: Any):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: str):
+        """Drop a user's entries (for changes the pantry revision doesn't cover, e.g. a new embedding)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == user_id]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+derived_cache = RevisionCache(DERIVED_CACHE_SIZE)
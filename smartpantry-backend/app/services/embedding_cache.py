@@ -0,0 +1,178 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+from app.config import EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_PATH
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so equivalent pantry texts share one cache key."""
+    return " ".join(text.split()).casefold()
+
+
+def make_cache_key(text: str, model: str) -> str:
+    """Content hash of the normalized text, scoped to the embedding model."""
+    payload = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class MemoryEmbeddingTier:
+    """In-process LRU tier with a per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (stored_at, vector)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, vector = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return vector
+
+    def set(self, key: str, vector: List[float]):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteEmbeddingTier:
+    """On-disk tier that keeps vectors as packed float32 blobs in a SQLite file."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl: Optional[float] = None):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " stored_at REAL NOT NULL,"
+            " vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stored_at, vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            stored_at, blob = row
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+        return array("f", blob).tolist()
+
+    def set(self, key: str, vector: List[float]):
+        blob = array("f", vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, stored_at, vector) VALUES (?, ?, ?)",
+                (key, time.time(), blob),
+            )
+            self._conn.commit()
+
+
+class EmbeddingCache:
+    """Read-through embedding cache over an ordered list of tiers (fastest first).
+
+    A hit in a slower tier is copied into every faster tier. Any object with
+    ``get(key)`` / ``set(key, vector)`` can be plugged in as a tier.
+    """
+
+    def __init__(self, tiers: List):
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+        self.tier_hits = {tier.name: 0 for tier in tiers}
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = make_cache_key(text, model)
+        for position, tier in enumerate(self.tiers):
+            vector = tier.get(key)
+            if vector is not None:
+                self.hits += 1
+                self.tier_hits[tier.name] += 1
+                for faster in self.tiers[:position]:
+                    faster.set(key, vector)
+                return vector
+        self.misses += 1
+        return None
+
+    def set(self, text: str, model: str, vector: List[float]):
+        key = make_cache_key(text, model)
+        for tier in self.tiers:
+            tier.set(key, vector)
+
+    def get_or_compute(self, text: str, model: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Return the cached embedding for ``text`` or compute and store it."""
+        vector = self.get(text, model)
+        if vector is None:
+            vector = compute(text)
+            self.set(text, model, vector)
+        return vector
+
+    async def aget_or_compute(self, text: str, model: str, compute: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        """Async variant of get_or_compute for an awaitable embedder."""
+        vector = self.get(text, model)
+        if vector is None:
+            vector = await compute(text)
+            self.set(text, model, vector)
+        return vector
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "tier_hits": dict(self.tier_hits),
+        }
+
+    def prometheus_lines(self) -> List[str]:
+        """Hit (per tier) and miss counters in the Prometheus text format, for /metrics."""
+        lines = [
+            "# HELP smartpantry_embedding_cache_hits_total Embedding cache hits, by the tier that answered.",
+            "# TYPE smartpantry_embedding_cache_hits_total counter",
+        ]
+        lines += [f'smartpantry_embedding_cache_hits_total{{tier="{tier}"}} {hits}' for tier, hits in self.tier_hits.items()]
+        return lines + [
+            "# HELP smartpantry_embedding_cache_misses_total Embedding cache lookups no tier could answer.",
+            "# TYPE smartpantry_embedding_cache_misses_total counter",
+            f"smartpantry_embedding_cache_misses_total {self.misses}",
+        ]
+
+
+def build_embedding_cache() -> EmbeddingCache:
+    """Create the cache described by the EMBEDDING_CACHE_* settings."""
+    tiers = [MemoryEmbeddingTier(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL)]
+    if EMBEDDING_CACHE_PATH:
+        tiers.append(SQLiteEmbeddingTier(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_TTL))
+    return EmbeddingCache(tiers)
+
+
+embedding_cache = build_embedding_cache()
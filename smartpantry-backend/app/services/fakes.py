@@ -0,0 +1,312 @@
+"""Local stand-ins for OpenAI, Pinecone, Supabase and the receipt parser.
+
+Selected by config (OPENAI_BACKEND=fake, VECTOR_BACKEND=local,
+DATABASE_BACKEND=sqlite, RECEIPT_PARSER_URL=fake) so the API can be run and
+load-tested without paid remote services. Everything here is deterministic.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+import numpy as np
+from pydantic import BaseModel
+from sqlalchemy import text
+
+from app.services.ingredients import ingredient_tokens
+from app.services.prompt_builder import MEAL_SLOTS, PLAN_DAYS
+
+FAKE_EMBEDDING_DIMENSION = 1536
+
+
+# ✅ Embeddings: feature hashing, so texts sharing words get similar vectors
+def hash_embedding(text: str, dimension: int = FAKE_EMBEDDING_DIMENSION) -> List[float]:
+    vector = np.zeros(dimension, dtype=np.float32)
+    for token in re.findall(r"[a-z]+", text.casefold()):
+        digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[digest % dimension] += 1.0 if digest >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def _embedding_response(inputs):
+    inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+    data = [_Namespace(embedding=hash_embedding(text), index=i) for i, text in enumerate(inputs)]
+    tokens = sum(len(text.split()) for text in inputs)
+    return _Namespace(data=data, usage=_Namespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+class _Namespace:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class _FakeEmbeddings:
+    def create(self, input, model=None, **kwargs):
+        return _embedding_response(input)
+
+
+class _FakeAsyncEmbeddings:
+    async def create(self, input, model=None, **kwargs):
+        return _embedding_response(input)
+
+
+class FakeOpenAI:
+    """The slice of ``openai.OpenAI`` the services use: ``embeddings.create``."""
+
+    def __init__(self):
+        self.embeddings = _FakeEmbeddings()
+
+
+class FakeAsyncOpenAI:
+    def __init__(self):
+        self.embeddings = _FakeAsyncEmbeddings()
+
+
+# ✅ LLM: a canned planner that always answers with a valid plan over the prompt's recipes
+class FakeLLM:
+    """Stands in for the LlamaIndex OpenAI LLM (chat, achat, astream_chat)."""
+
+    def __init__(self, model: str = "gpt-3.5-turbo", latency: float = 0.0, chunk_size: int = 48):
+        self.model = model
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    def _reply(self, messages) -> str:
+        prompt = messages[-1].content if messages else ""
+        recipe_ids = []
+        for line in prompt.splitlines():
+            if line.startswith("Recipes (JSON): "):
+                recipe_ids = [recipe["id"] for recipe in json.loads(line[len("Recipes (JSON): "):])]
+        days = []
+        for day in range(PLAN_DAYS):
+            meals = {}
+            for slot_index, slot in enumerate(MEAL_SLOTS):
+                if recipe_ids:
+                    meals[slot] = {"recipe_id": recipe_ids[(day * len(MEAL_SLOTS) + slot_index) % len(recipe_ids)]}
+            days.append({"day": day + 1, "meals": meals})
+        return json.dumps({"days": days})
+
+    def _response(self, messages, content: str, **fields):
+        # Word counts stand in for the token usage the OpenAI LLM reports in additional_kwargs
+        usage = {
+            "prompt_tokens": sum(len(str(message.content).split()) for message in messages),
+            "completion_tokens": len(content.split()),
+        }
+        return _Namespace(message=_Namespace(content=content), additional_kwargs=usage, **fields)
+
+    def chat(self, messages, **kwargs):
+        time.sleep(self.latency)
+        return self._response(messages, self._reply(messages))
+
+    async def achat(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._response(messages, self._reply(messages))
+
+    async def astream_chat(self, messages, **kwargs):
+        content = self._reply(messages)
+
+        async def stream():
+            chunks = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+            for i, chunk in enumerate(chunks):
+                await asyncio.sleep(self.latency / max(len(chunks), 1))
+                if i == len(chunks) - 1:
+                    yield self._response(messages, content, delta=chunk)
+                else:
+                    yield _Namespace(delta=chunk, additional_kwargs={})
+
+        return stream()
+
+
+# ✅ Supabase: the PostgREST upsert calls the services make, executed against the SQL engine
+class FakeAPIResponse(BaseModel):
+    data: list
+    count: Optional[int] = None
+
+
+class _FakeTable:
+    def __init__(self, engine, name: str):
+        self.engine = engine
+        self.name = name
+        self._rows: List[dict] = []
+        self._conflict: List[str] = []
+
+    def upsert(self, rows, on_conflict=None, **kwargs):
+        self._rows = [rows] if isinstance(rows, dict) else list(rows)
+        if isinstance(on_conflict, str):
+            on_conflict = on_conflict.split(",")
+        self._conflict = [column.strip() for column in on_conflict or []]
+        return self
+
+    def insert(self, rows, **kwargs):
+        return self.upsert(rows)
+
+    def execute(self):
+        with self.engine.begin() as conn:
+            for row in self._rows:
+                columns = list(row)
+                statement = f"INSERT INTO {self.name} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})"
+                updates = [c for c in columns if c not in self._conflict]
+                if self._conflict and updates:
+                    statement += f" ON CONFLICT ({', '.join(self._conflict)}) DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in updates)
+                conn.execute(text(statement), {c: json.dumps(v) if isinstance(v, (list, dict)) else v for c, v in row.items()})
+        return FakeAPIResponse(data=self._rows, count=len(self._rows))
+
+
+class FakeSupabase:
+    """``supabase.table(name).upsert(rows, on_conflict=...).execute()`` on a local SQL engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def table(self, name: str) -> _FakeTable:
+        return _FakeTable(self.engine, name)
+
+
+# Tables the services read and write, in SQLite (arrays as JSON text)
+FAKE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS pantry (
+        user_id TEXT NOT NULL, ingredient_name TEXT NOT NULL, quantity REAL, unit TEXT,
+        expiry_date TEXT, storage_location TEXT, created_at TEXT,
+        revision INTEGER NOT NULL DEFAULT 0, updated_at TEXT,
+        UNIQUE (user_id, ingredient_name))""",
+    "CREATE INDEX IF NOT EXISTS pantry_user_revision_idx ON pantry (user_id, revision)",
+    """CREATE TABLE IF NOT EXISTS pantry_revisions (
+        user_id TEXT PRIMARY KEY, revision INTEGER NOT NULL DEFAULT 0)""",
+    """CREATE TABLE IF NOT EXISTS pantry_tombstones (
+        user_id TEXT NOT NULL, ingredient_name TEXT NOT NULL, revision INTEGER NOT NULL, deleted_at TEXT,
+        PRIMARY KEY (user_id, ingredient_name))""",
+    # SQLite version of the revision trigger in 003_pantry_revisions.sql
+    """CREATE TRIGGER IF NOT EXISTS pantry_revision_insert AFTER INSERT ON pantry BEGIN
+        INSERT INTO pantry_revisions (user_id, revision) VALUES (NEW.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET revision = revision + 1;
+        UPDATE pantry SET revision = (SELECT revision FROM pantry_revisions WHERE user_id = NEW.user_id),
+            updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+        DELETE FROM pantry_tombstones WHERE user_id = NEW.user_id AND ingredient_name = NEW.ingredient_name;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pantry_revision_update AFTER UPDATE ON pantry
+    WHEN NEW.revision IS OLD.revision BEGIN
+        INSERT INTO pantry_revisions (user_id, revision) VALUES (NEW.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET revision = revision + 1;
+        INSERT INTO pantry_tombstones (user_id, ingredient_name, revision, deleted_at)
+            SELECT OLD.user_id, OLD.ingredient_name, revision, CURRENT_TIMESTAMP FROM pantry_revisions
+            WHERE user_id = NEW.user_id AND OLD.ingredient_name <> NEW.ingredient_name
+            ON CONFLICT (user_id, ingredient_name) DO UPDATE SET revision = excluded.revision, deleted_at = excluded.deleted_at;
+        UPDATE pantry SET revision = (SELECT revision FROM pantry_revisions WHERE user_id = NEW.user_id),
+            updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+        DELETE FROM pantry_tombstones WHERE user_id = NEW.user_id AND ingredient_name = NEW.ingredient_name;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pantry_revision_delete AFTER DELETE ON pantry BEGIN
+        INSERT INTO pantry_revisions (user_id, revision) VALUES (OLD.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET revision = revision + 1;
+        INSERT INTO pantry_tombstones (user_id, ingredient_name, revision, deleted_at)
+            SELECT OLD.user_id, OLD.ingredient_name, revision, CURRENT_TIMESTAMP FROM pantry_revisions WHERE user_id = OLD.user_id
+            ON CONFLICT (user_id, ingredient_name) DO UPDATE SET revision = excluded.revision, deleted_at = excluded.deleted_at;
+    END""",
+    """CREATE TABLE IF NOT EXISTS user_preferences (
+        user_id TEXT PRIMARY KEY, allergies TEXT, dislikes TEXT, diet TEXT,
+        favorite_cuisines TEXT, preferred_meal_types TEXT, effort_level TEXT)""",
+    """CREATE TABLE IF NOT EXISTS user_meal_history (
+        user_id TEXT PRIMARY KEY, meal_plan TEXT, fingerprint TEXT, created_at TEXT)""",
+    """CREATE TABLE IF NOT EXISTS pantry_embeddings (
+        user_id TEXT PRIMARY KEY, pantry_hash TEXT NOT NULL, embedding TEXT NOT NULL, updated_at TEXT)""",
+]
+
+
+def create_fake_schema(engine):
+    with engine.begin() as conn:
+        conn.execute(text("PRAGMA journal_mode=WAL"))
+        for statement in FAKE_SCHEMA:
+            conn.execute(text(statement))
+
+
+# ✅ Receipt parser: canned line items for any upload
+FAKE_RECEIPT_PARSER_URL = "http://fake-receipt-parser/parse-receipt/"
+FAKE_RECEIPT = {
+    "receipt_data": {
+        "store_name": "Fake Grocer",
+        "line_items": [
+            {"item_name": "CHKN BRST 2LB", "item_quantity": "1"},
+            {"item_name": "Garlic", "item_quantity": "3"},
+            {"item_name": "Basmati Rice", "item_quantity": "1"},
+        ],
+    }
+}
+
+
+def fake_receipt_transport() -> httpx.MockTransport:
+    return httpx.MockTransport(lambda request: httpx.Response(200, json=FAKE_RECEIPT))
+
+
+# ✅ Seed data: synthetic TheMealDB-style recipes and users
+FAKE_INGREDIENTS = [
+    "Chicken Breast", "Chicken Thighs", "Minced Beef", "Pork Chops", "Salmon", "Prawns", "Eggs", "Milk",
+    "Butter", "Double Cream", "Cheddar Cheese", "Parmesan", "Plain Flour", "Sugar", "Rice", "Spaghetti",
+    "Potatoes", "Onion", "Garlic", "Ginger", "Tomatoes", "Carrots", "Celery", "Spinach", "Mushrooms",
+    "Peppers", "Courgettes", "Aubergine", "Lemon", "Lime", "Coriander", "Parsley", "Basil", "Thyme",
+    "Cumin", "Paprika", "Chilli Powder", "Soy Sauce", "Olive Oil", "Vegetable Oil", "Coconut Milk",
+    "Chickpeas", "Lentils", "Peanuts", "Honey", "Bread", "Yogurt", "Spring Onions", "Bacon", "Peas",
+]
+FAKE_CATEGORIES = ["Chicken", "Beef", "Seafood", "Vegetarian", "Pasta", "Dessert", "Breakfast"]
+FAKE_CUISINES = ["British", "Indian", "Italian", "Mexican", "Chinese", "French", "Thai"]
+
+
+def fake_user_id(n: int) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"smartpantry-fake-user-{n}"))
+
+
+def fake_recipes(count: int, seed: int = 0) -> List[dict]:
+    """Vector records (id, values, metadata) shaped like insert_pc.transform_recipe output."""
+    rng = random.Random(seed)
+    records = []
+    for n in range(count):
+        ingredients = rng.sample(FAKE_INGREDIENTS, rng.randint(4, 12))
+        name = f"{ingredients[0]} and {ingredients[1]} {rng.choice(['Stew', 'Bake', 'Curry', 'Salad', 'Stir Fry', 'Pie'])}"
+        metadata = {
+            "id": str(100000 + n),
+            "name": name,
+            "category": rng.choice(FAKE_CATEGORIES),
+            "cuisine": rng.choice(FAKE_CUISINES),
+            "ingredients": ingredients,
+            "ingredient_tokens": ingredient_tokens(ingredients),
+            "instructions": f"Prepare the {', '.join(ingredients).lower()} and cook until done.",
+            "image_url": f"https://example.invalid/recipes/{100000 + n}.jpg",
+        }
+        recipe_text = f"Recipe: {name}\nCategory: {metadata['category']}\nCuisine: {metadata['cuisine']}\nIngredients: {', '.join(ingredients)}"
+        records.append({"id": metadata["id"], "values": hash_embedding(recipe_text), "metadata": metadata})
+    return records
+
+
+def seed_fake_users(engine, count: int, seed: int = 0) -> List[str]:
+    """Insert ``count`` users with pantries and preferences; returns their ids."""
+    rng = random.Random(seed)
+    create_fake_schema(engine)
+    user_ids = [fake_user_id(n) for n in range(count)]
+    with engine.begin() as conn:
+        for user_id in user_ids:
+            conn.execute(text("DELETE FROM pantry WHERE user_id = :user_id"), {"user_id": user_id})
+            for ingredient in rng.sample(FAKE_INGREDIENTS, rng.randint(3, 15)):
+                conn.execute(
+                    text("INSERT INTO pantry (user_id, ingredient_name, quantity, unit) VALUES (:user_id, :name, :quantity, 'unit')"),
+                    {"user_id": user_id, "name": ingredient, "quantity": rng.randint(1, 5)},
+                )
+            conn.execute(
+                text("""INSERT OR REPLACE INTO user_preferences
+                        (user_id, allergies, dislikes, diet, favorite_cuisines, preferred_meal_types, effort_level)
+                        VALUES (:user_id, :allergies, :dislikes, :diet, :cuisines, :meal_types, :effort)"""),
+                {
+                    "user_id": user_id,
+                    "allergies": json.dumps(rng.sample(["Peanuts", "Prawns", "Milk", "Eggs"], rng.randint(0, 1))),
+                    "dislikes": json.dumps(rng.sample(FAKE_INGREDIENTS, 2)),
+                    "diet": rng.choice([None, "vegetarian", "high protein"]),
+                    "cuisines": json.dumps(rng.sample(FAKE_CUISINES, 2)),
+                    "meal_types": json.dumps(["breakfast", "lunch", "dinner"]),
+                    "effort": rng.choice(["low", "medium", "high"]),
+                },
+            )
+    return user_ids
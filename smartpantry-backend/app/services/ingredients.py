@@ -0,0 +1,319 @@
+import logging
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_ingredient(name: str) -> str:
+    """Lowercase an ingredient name and collapse its whitespace."""
+    return " ".join(name.split()).casefold()
+
+
+# ✅ Canonicalization: receipt lines and recipe ingredients → one canonical name → integer id
+
+# Receipt abbreviations, expanded word by word
+ABBREVIATIONS = {
+    "chkn": "chicken", "chk": "chicken", "brst": "breast", "bnls": "boneless", "sknls": "skinless",
+    "grnd": "ground", "bf": "beef", "trky": "turkey", "tom": "tomato", "toms": "tomato",
+    "ptato": "potato", "pots": "potato", "onin": "onion", "grlc": "garlic", "mlk": "milk",
+    "chs": "cheese", "chse": "cheese", "crm": "cream", "btr": "butter", "brd": "bread",
+    "evoo": "olive oil", "veg": "vegetable", "yog": "yogurt", "yoghurt": "yogurt",
+}
+
+# Words that describe the product rather than the ingredient
+DESCRIPTORS = {
+    "fresh", "organic", "large", "small", "medium", "lg", "sm", "med", "boneless", "skinless",
+    "whole", "chopped", "diced", "sliced", "minced", "frozen", "raw", "lean", "extra", "virgin",
+    "free", "range", "pack", "pk", "ct", "bag", "org", "value", "finely",
+}
+
+# Synonyms (after cleaning) → the name TheMealDB recipes use
+ALIASES = {
+    "scallion": "spring onion",
+    "green onion": "spring onion",
+    "cilantro": "coriander",
+    "coriander leaf": "coriander",
+    "garbanzo bean": "chickpea",
+    "eggplant": "aubergine",
+    "zucchini": "courgette",
+    "confectioners sugar": "icing sugar",
+    "powdered sugar": "icing sugar",
+    "heavy cream": "double cream",
+    "all purpose flour": "plain flour",
+    "ground beef": "beef",
+    "beef mince": "beef",
+    "shrimp": "prawn",
+}
+
+# Words up to this length only match exactly in fuzzy lookups
+FUZZY_MIN_WORD_LENGTH = 4
+
+_QUANTITY = re.compile(r"\b\d+(?:[.,/]\d+)?\s*(?:lbs?|oz|kg|g|ml|l|ct|pk|x)?\b")
+_NON_LETTERS = re.compile(r"[^a-z\s]+")
+
+
+def _singular(word: str) -> str:
+    if len(word) <= 3 or word.endswith(("ss", "us")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def canonical_ingredient_name(name: str) -> str:
+    """Receipt- or recipe-style ingredient name → canonical form ("CHKN BRST 2LB" → "chicken breast")."""
+    text = _NON_LETTERS.sub(" ", _QUANTITY.sub(" ", name.casefold()))
+    words = []
+    for word in text.split():
+        for expanded in ABBREVIATIONS.get(word, word).split():
+            if len(expanded) > 1 and expanded not in DESCRIPTORS:
+                words.append(_singular(expanded))
+    cleaned = " ".join(words)
+    if not cleaned:
+        # Nothing left after cleanup (e.g. a bare code); keep the name itself
+        return normalize_ingredient(name)
+    return ALIASES.get(cleaned, cleaned)
+
+
+# ✅ Allergens: one exclusion rule for the vector filter, coverage ranking, hydrated
+# recipes and the meal planner. An allergy excludes a recipe when all the words of
+# its canonical name appear in the canonical name of one ingredient ("peanut" excludes
+# "Peanut Butter", "pine nut" excludes "Toasted Pine Nuts"). Words match exactly, never fuzzily.
+
+def ingredient_terms(names: Iterable[str]) -> List[FrozenSet[str]]:
+    """Canonical word sets of ``names`` (allergies, dislikes or ingredients), skipping blanks."""
+    return [frozenset(canonical_ingredient_name(name).split()) for name in names if name and name.strip()]
+
+
+def contains_allergen(ingredients: Iterable[str], allergen_terms: List[FrozenSet[str]]) -> bool:
+    """True if an ingredient's canonical words include every word of one of ``allergen_terms``."""
+    if not allergen_terms:
+        return False
+    return any(term <= words for words in ingredient_terms(ingredients) for term in allergen_terms)
+
+
+def ingredient_tokens(ingredients: Iterable[str]) -> List[str]:
+    """Canonical ingredient names and their words, stored in vector metadata for allergen filters."""
+    tokens = set()
+    for name in ingredients:
+        if name and name.strip():
+            canonical = canonical_ingredient_name(name)
+            tokens.add(canonical)
+            tokens.update(canonical.split())
+    return sorted(tokens)
+
+
+def allergen_filter(allergies: Iterable[str]) -> Optional[dict]:
+    """Metadata filter dropping recipes whose ``ingredient_tokens`` name an allergen (None without allergies).
+
+    It matches single-word allergens anywhere and multi-word ones by full name,
+    so it only ever drops recipes contains_allergen would; callers run that
+    check on the hydrated recipes for the rest (and for records with older tokens).
+    """
+    tokens = sorted({canonical_ingredient_name(name) for name in allergies or [] if name and name.strip()})
+    return {"ingredient_tokens": {"$nin": tokens}} if tokens else None
+
+
+def _trigrams(name: str) -> FrozenSet[str]:
+    padded = f"  {name} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class IngredientIndex:
+    """Canonical ingredient vocabulary with integer ids and a trigram index for fuzzy lookup.
+
+    Recipe ingredients are added to the vocabulary as they are seen. Pantry and
+    receipt names are looked up with ``fuzzy=True``: canonical exact match
+    first, then the vocabulary entry with the highest trigram Dice similarity
+    above ``fuzzy_threshold``. A fuzzy match must have the same number of
+    words, each similar to the word in its place, so typos match ("chiken
+    brest") but other products don't ("coconut" vs "coconut milk", "rice
+    vinegar" vs "wine vinegar", "peas" vs "pears"). Ties go to the shorter name, then the lower
+    id. Lookups are memoized per raw name.
+    """
+
+    def __init__(self, fuzzy_threshold: float = 0.6):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.names: List[str] = []  # id -> canonical name
+        self.ids: Dict[str, int] = {}  # canonical name -> id
+        self._trigram_ids: Dict[str, List[int]] = {}  # trigram -> ids of names containing it
+        self._trigram_counts: List[int] = []
+        self._word_ids: Dict[str, List[int]] = {}  # word -> ids of names containing it
+        self._recipe_ids: Dict[str, FrozenSet[int]] = {}  # recipe_id -> ingredient ids
+        self._lock = threading.Lock()
+        self.lookup = lru_cache(maxsize=65536)(self._lookup)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name: str) -> int:
+        """Id of ``name``'s canonical form, adding it to the vocabulary if new."""
+        canonical = canonical_ingredient_name(name)
+        ingredient_id = self.ids.get(canonical)
+        if ingredient_id is not None:
+            return ingredient_id
+        with self._lock:
+            if canonical in self.ids:
+                return self.ids[canonical]
+            ingredient_id = len(self.names)
+            trigrams = _trigrams(canonical)
+            for trigram in trigrams:
+                self._trigram_ids.setdefault(trigram, []).append(ingredient_id)
+            self._trigram_counts.append(len(trigrams))
+            for word in set(canonical.split()):
+                self._word_ids.setdefault(word, []).append(ingredient_id)
+            self.names.append(canonical)
+            self.ids[canonical] = ingredient_id
+        # A new name can turn a previous fuzzy miss into a hit
+        self.lookup.cache_clear()
+        return ingredient_id
+
+    def _lookup(self, name: str) -> Optional[int]:
+        if not name or not name.strip():
+            return None
+        canonical = canonical_ingredient_name(name)
+        ingredient_id = self.ids.get(canonical)
+        if ingredient_id is not None:
+            return ingredient_id
+        return self._fuzzy(canonical)
+
+    def _fuzzy(self, canonical: str) -> Optional[int]:
+        trigrams = _trigrams(canonical)
+        overlaps = Counter()
+        for trigram in trigrams:
+            overlaps.update(self._trigram_ids.get(trigram, ()))
+        words = canonical.split()
+        best_id, best_key = None, None
+        for ingredient_id, overlap in overlaps.items():
+            score = 2 * overlap / (len(trigrams) + self._trigram_counts[ingredient_id])
+            if score <= self.fuzzy_threshold:
+                continue
+            name = self.names[ingredient_id]
+            key = (-score, len(name), ingredient_id)
+            if (best_key is None or key < best_key) and self._words_match(words, name.split()):
+                best_id, best_key = ingredient_id, key
+        return best_id
+
+    def _words_match(self, words: List[str], candidate: List[str]) -> bool:
+        # Short words differ by a letter too easily ("pea", "pear"), so they must match exactly
+        return len(words) == len(candidate) and all(
+            word == other or (min(len(word), len(other)) > FUZZY_MIN_WORD_LENGTH
+                              and _dice(_trigrams(word), _trigrams(other)) > self.fuzzy_threshold)
+            for word, other in zip(words, candidate)
+        )
+
+    def ids_for(self, names: Iterable[str], fuzzy: bool = False) -> FrozenSet[int]:
+        """Ingredient ids for ``names``: recipe names are added, pantry names (``fuzzy``) only matched."""
+        if fuzzy:
+            return frozenset(i for i in map(self.lookup, names) if i is not None)
+        return frozenset(self.add(name) for name in names if name and name.strip())
+
+    def allergen_ids(self, allergies: Iterable[str]) -> FrozenSet[int]:
+        """Ids of every vocabulary entry ``allergies`` exclude, by the contains_allergen rule (never fuzzy)."""
+        ids = set()
+        for term in ingredient_terms(allergies):
+            postings = [set(self._word_ids.get(word, ())) for word in term]
+            ids.update(set.intersection(*postings) if postings else ())
+        return frozenset(ids)
+
+    def named_ids(self, names: Iterable[str]) -> Dict[int, str]:
+        """Ingredient id -> the first of ``names`` (as written) with that canonical form, in ``names`` order."""
+        named = {}
+        for name in names:
+            if name and name.strip():
+                named.setdefault(self.add(name), " ".join(name.split()))
+        return named
+
+    def add_recipe(self, recipe_id: str, ingredients: Iterable[str]) -> FrozenSet[int]:
+        ids = self._recipe_ids[recipe_id] = self.ids_for(ingredients)
+        return ids
+
+    def recipe_ingredient_ids(self, recipe: dict) -> FrozenSet[int]:
+        """Ingredient ids of a suggested recipe dict, memoized by recipe_id."""
+        recipe_id = recipe.get("recipe_id")
+        ids = self._recipe_ids.get(recipe_id) if recipe_id else None
+        if ids is None:
+            ids = self.add_recipe(recipe_id, recipe["ingredients"]) if recipe_id else self.ids_for(recipe["ingredients"])
+        return ids
+
+    def name(self, ingredient_id: int) -> str:
+        return self.names[ingredient_id]
+
+    @property
+    def recipe_count(self) -> int:
+        return len(self._recipe_ids)
+
+    def recipe_ingredient_sets(self) -> List[tuple]:
+        """Snapshot of (recipe_id, ingredient ids) for every recipe seen so far."""
+        return list(self._recipe_ids.items())
+
+
+def build_ingredient_index(store, page_size: int = 100, details=None) -> IngredientIndex:
+    """Index every recipe ingredient, read from the recipe detail store or else the vector store's metadata.
+
+    Built at startup, so it doubles as the deploy check that every recipe has
+    details: recipes with neither a detail row nor ingredients in their vector
+    metadata are logged as an error (they can't be served until
+    ``app.scripts.backfill_recipe_details`` has run).
+    """
+    index = IngredientIndex()
+    undetailed = []
+    for ids in store.list(limit=page_size):
+        ids = list(ids)
+        stored = details.get_many(ids, fields=("ingredients",), cache=False) if details is not None else {}
+        for recipe_id, record in stored.items():
+            index.add_recipe(recipe_id, record.get("ingredients", []))
+        missing = [recipe_id for recipe_id in ids if recipe_id not in stored]
+        if not missing:
+            continue
+        response = store.fetch(ids=missing)
+        vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+        for recipe_id, record in vectors.items():
+            metadata = record["metadata"] if isinstance(record, dict) else record.metadata
+            if "ingredients" not in (metadata or {}):
+                undetailed.append(recipe_id)
+                continue
+            index.add_recipe(recipe_id, metadata["ingredients"])
+    if undetailed:
+        logger.error(
+            "%d recipes have no details (e.g. %s) and won't be suggested; run python -m app.scripts.backfill_recipe_details",
+            len(undetailed), ", ".join(undetailed[:5]),
+        )
+    return index
+
+
+_ingredient_index: Optional[IngredientIndex] = None
+_ingredient_index_lock = threading.Lock()
+
+
+def get_ingredient_index() -> IngredientIndex:
+    """The process-wide ingredient index, built from the recipe store on first use.
+
+    If the store can't be listed, the index starts empty and learns recipe
+    ingredients as suggestions pass through it.
+    """
+    global _ingredient_index
+    if _ingredient_index is None:
+        with _ingredient_index_lock:
+            if _ingredient_index is None:
+                from app.pinecone_client import get_recipe_store
+                from app.services.recipe_details import get_recipe_details
+                try:
+                    _ingredient_index = build_ingredient_index(get_recipe_store(), details=get_recipe_details())
+                except Exception as e:
+                    logger.error("Could not build ingredient index from the recipe store: %s", e)
+                    _ingredient_index = IngredientIndex()
+    return _ingredient_index
@@ -0,0 +1,68 @@
+import json
+from typing import List
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove a Markdown ```json fence the model may have wrapped its output in."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+class JsonArrayItemParser:
+    """Incrementally extracts the objects of one top-level array from streamed JSON text.
+
+    Feed it text chunks as they arrive; ``feed`` returns every element of
+    ``{"<array_key>": [ {...}, {...} ]}`` that became complete in that chunk, already
+    decoded. Text outside the outermost object (e.g. Markdown code fences) is ignored.
+    """
+
+    def __init__(self, array_key: str = "days"):
+        self.array_key = array_key
+        self.text = ""
+        self._position = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string = None
+        self._array_depth = None  # stack depth of the target array once it opens
+        self._item_start = None
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.text += chunk
+        items = []
+        text = self.text
+        for i in range(self._position, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._stack.append(char)
+                if char == "[" and self._array_depth is None and len(self._stack) == 2 and self._last_string == self.array_key:
+                    self._array_depth = len(self._stack)
+                elif char == "{" and self._array_depth is not None and len(self._stack) == self._array_depth + 1:
+                    self._item_start = i
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and self._item_start is not None and len(self._stack) == self._array_depth:
+                    items.append(json.loads(text[self._item_start:i + 1]))
+                    self._item_start = None
+                elif char == "]" and self._array_depth is not None and len(self._stack) == self._array_depth - 1:
+                    self._array_depth = -1  # array finished; ignore anything after it
+        self._position = len(text)
+        return items
@@ -1,231 +1,365 @@
 
+import asyncio
 import datetime
-from typing import Dict, List
-from app.supabase_client import sql_database, supabase
-from app.openai_client import openai
-from app.pinecone_client import pinecone_index
-from app.config import llm
-from llama_index.core.llms import ChatMessage
+import json
+import logging
+from typing import Dict, List, Optional
+from app.supabase_client import get_supabase
+from app.services.database import (
+    fetch_pantry, fetch_preferences, fetch_pantry_async, fetch_preferences_async,
+    fetch_pantries_async, fetch_preferences_many_async,
+    fetch_pantry_embedding_async, store_pantry_embedding_async, delete_pantry_embedding_async,
+    fetch_pantry_revision_async, fetch_pantry_delta_async,
+)
+from app.openai_client import get_openai, get_async_openai
+from app.pinecone_client import get_recipe_store
+from app.config import get_llm, EMBEDDING_MODEL, LLM_MODEL, MEAL_PLANNER, MEAL_PLAN_LLM_NOTES, PANTRY_EMBEDDING_WORKERS, RECIPE_COVERAGE_WEIGHT
+from app.services.coverage import get_coverage_index
+from app.services.derived_cache import derived_cache
+from app.services.embedding_cache import embedding_cache
+from app.services.request_context import RequestContext
+from app.services.recipe_details import get_recipe_details
+from app.services.recipe_search import get_recipe_search_index, reciprocal_rank_fusion
+from app.services.schemas import GroceryListResponse, PantryResponse, RecipeSearchResponse, RecipesResponse
+from app.services.ingredients import allergen_filter, contains_allergen, get_ingredient_index, ingredient_terms
+from app.services.pantry_embeddings import PantryEmbeddingQueue, pantry_hash
+from app.services.llm_gateway import embedding_gateway, llm_gateway, request_key
+from app.services.json_stream import JsonArrayItemParser, strip_code_fences
+from app.services.meal_planner import plan_meals
+from app.services.prompt_builder import build_meal_plan_messages, build_meal_plan_notes_messages, rehydrate_meal_plan, rehydrate_meal_plan_day
+from app.services.write_behind import WriteBehindBuffer
+from app.services.tracing import record_chat_usage, record_embedding_usage, stage, traced
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
 
-def get_user_preferences_service(user_id: str):
-    query=f"""
-        SELECT *
-        FROM user_preferences
-        WHERE user_id = '{user_id}'::UUID;    
-    """
 
-    response = sql_database.run_sql(query)
-    result_dict = response[1]  # Extract dictionary response
-    preference_data = result_dict["result"]  # Pantry items
-    return preference_data[0]
+def get_user_preferences_service(user_id: str, ctx: RequestContext = None):
+    """Fetch a user's preferences as a UserPreferences record"""
+    ctx = ctx or RequestContext()
+    return ctx.load(("preferences", user_id), fetch_preferences, user_id)
+
+# Number of recipes suggested per user, and the most the over-fetch loop will ask for
+SUGGESTED_RECIPE_COUNT = 9
+MAX_RECIPE_FETCH = 90
 
-def get_user_recipes_service(user_id: str):
-    """Generate meal suggestions based on user's pantry"""
+# How suggestions are ranked:
+# - "embedding": nearest recipes to the pantry embedding
+# - "coverage": the whole catalog by share of each recipe's ingredients already in the pantry
+# - "hybrid": embedding and coverage candidates, blended by RECIPE_COVERAGE_WEIGHT
 
+def get_user_recipes_service(user_id: str, ctx: RequestContext = None, ranking: str = "embedding", fields=None):
+    """Generate meal suggestions based on user's pantry
+
+    ``fields`` (SuggestedRecipe keys) limits the recipe details loaded to what those fields need.
+    """
+    ctx = ctx or RequestContext()
+    detail_fields = _detail_fields(fields)
+    return ctx.load(("recipes", user_id, ranking, detail_fields), _suggest_user_recipes, user_id, ctx, ranking, detail_fields)
+
+def _suggest_user_recipes(user_id: str, ctx: RequestContext, ranking: str = "embedding", detail_fields=None):
     # Retrieve Pantry Data
-    pantry_response = get_user_pantry_service(user_id)
+    pantry_response = get_user_pantry_service(user_id, ctx)
     if "pantry" not in pantry_response or not pantry_response["pantry"]:
         return {"user_id": user_id, "suggested_recipes": []}
 
+    if ranking == "coverage":
+        user_allergies = get_user_preferences_service(user_id, ctx).allergies
+        return {"user_id": user_id, "suggested_recipes": _coverage_recipes(pantry_response["pantry"], user_allergies, detail_fields=detail_fields)}
+
     # Convert pantry data into text format
-    pantry_text = ", ".join([f"{item['ingredient']} ({item['quantity']} {item['unit']})" for item in pantry_response["pantry"]])
+    pantry_text = _pantry_text(pantry_response["pantry"])
 
     # Generate pantry embedding
-    embedding_response = generate_embedding(pantry_text)
-
-    # Query Pinecone for similar recipes
-    query_results = pinecone_index.query(
-        vector=embedding_response,
-        top_k=9,  # Get top 5 matching recipes
-        include_metadata=True
-    )
+    embedding_response = ctx.load(("embedding", pantry_text), generate_embedding, pantry_text)
 
     # ✅ Retrieve user allergies
-    user_allergies = get_user_preferences_service(user_id)[1]  # List of allergic ingredients
+    user_allergies = get_user_preferences_service(user_id, ctx).allergies  # List of allergic ingredients
+
+    # ✅ Query Pinecone for similar recipes, excluding allergens inside the query
+    if ranking == "hybrid":
+        filtered_recipes = _hybrid_recipes(embedding_response, pantry_response["pantry"], user_allergies, detail_fields=detail_fields)
+    else:
+        filtered_recipes = _query_allergen_free_recipes(embedding_response, user_allergies, detail_fields=detail_fields)
+
+    return {"user_id": user_id, "suggested_recipes": filtered_recipes}
 
-    # ✅ Filter out recipes containing allergens
+def _pantry_text(pantry_items: List[dict]) -> str:
+    """Serialize pantry items for embedding (sorted so the same pantry always yields the same text)."""
+    return ", ".join(sorted(f"{item['ingredient']} ({item['quantity']} {item['unit']})" for item in pantry_items))
+
+def _query_allergen_free_recipes(vector, user_allergies, count: int = SUGGESTED_RECIPE_COUNT, detail_fields=None) -> List[dict]:
+    """Top ``count`` recipes for ``vector`` that contain none of the user's allergens.
+
+    Allergens are excluded by a ``$nin`` metadata filter on ``ingredient_tokens``,
+    so the index returns (mostly) safe recipes. The query returns ids and scores;
+    details are hydrated from the recipe detail store. The contains_allergen check
+    afterwards catches what the filter can't express and records with older
+    tokens; if it removes any, the query is repeated with a doubled ``top_k``
+    until enough recipes survive.
+    """
+    query_filter = allergen_filter(user_allergies)
+
+    top_k = count
+    while True:
+        with stage("vector_query"):
+            query_results = get_recipe_store().query(
+                vector=vector,
+                top_k=top_k,
+                include_metadata=False,
+                filter=query_filter
+            )
+        matches = query_results["matches"]
+        recipes = _filter_recipe_matches(_hydrate_matches(matches, detail_fields), user_allergies)
+        if len(recipes) >= count or len(matches) < top_k or top_k >= MAX_RECIPE_FETCH:
+            return recipes[:count]
+        top_k = min(top_k * 2, MAX_RECIPE_FETCH)
+
+@traced("allergy_filter")
+def _filter_recipe_matches(matches, user_allergies) -> List[dict]:
+    """Turn vector matches into recipe dicts, dropping any recipe that contains an allergen."""
+    allergens = ingredient_terms(user_allergies or [])
     filtered_recipes = []
-    for match in query_results["matches"]:
+    for match in matches:
         recipe_metadata = match["metadata"]
         recipe_name = recipe_metadata.get("name", "Unknown Recipe")
         ingredients = recipe_metadata.get("ingredients", [])  # Ingredients list from metadata
         instructions = recipe_metadata.get("instructions")
         image_url = recipe_metadata.get("image_url")
 
-        # Check if any allergy is present in the recipe's ingredients
-        if not any(allergen.lower() in [ingredient.lower() for ingredient in ingredients] for allergen in user_allergies):
-            filtered_recipes.append({"recipe_name": recipe_name, "score": match["score"], "ingredients": ingredients, "instructions": instructions, "image_url": image_url})
+        # Check if any allergy is present in the recipe's ingredients; without
+        # ingredients that is unknown, so the recipe isn't offered to allergic users
+        if (ingredients or not allergens) and not contains_allergen(ingredients, allergens):
+            filtered_recipes.append({"recipe_id": match["id"], "recipe_name": recipe_name, "score": match["score"], "ingredients": ingredients, "instructions": instructions, "image_url": image_url})
+    return filtered_recipes
 
-    # ✅ Return the top 5 filtered recipes
-    return {"user_id": user_id, "suggested_recipes": filtered_recipes[:9]}
+def _coverage_recipes(pantry_items: List[dict], user_allergies, count: int = SUGGESTED_RECIPE_COUNT, detail_fields=None) -> List[dict]:
+    """Top ``count`` allergen-free recipes in the whole catalog by pantry coverage.
 
-def get_user_pantry_service(user_id: str):
-    """Fetch pantry inventory from Supabase for a given user"""
-    query = f"""
-    SELECT ingredient_name, quantity, unit
-    FROM pantry
-    WHERE user_id = '{user_id}'::UUID;
+    Each recipe also carries ``coverage`` (share of its ingredients in the
+    pantry) and ``missing_count`` (1 means "one ingredient away").
     """
+    with stage("coverage"):
+        ingredient_index = get_ingredient_index()
+        pantry_ids = ingredient_index.ids_for((item["ingredient"] for item in pantry_items), fuzzy=True)
+        allergen_ids = ingredient_index.allergen_ids(user_allergies or [])
 
-    response = sql_database.run_sql(query)
-    result_dict = response[1]  # Extract dictionary response
-    pantry_data = result_dict["result"]  # Pantry items
+        # Over-fetch so the allergen check on the hydrated recipes can still drop some
+        ranked = get_coverage_index(ingredient_index).top(pantry_ids, allergen_ids, count * 2)
+    matches = _hydrate_matches([{"id": entry["recipe_id"], "score": entry["coverage"]} for entry in ranked], detail_fields)
+    recipes = _filter_recipe_matches(matches, user_allergies)[:count]
+
+    missing_counts = {entry["recipe_id"]: entry["missing_count"] for entry in ranked}
+    for recipe in recipes:
+        recipe["coverage"] = recipe["score"]
+        recipe["missing_count"] = missing_counts[recipe["recipe_id"]]
+    return recipes
+
+def _hybrid_recipes(vector, pantry_items: List[dict], user_allergies, count: int = SUGGESTED_RECIPE_COUNT, detail_fields=None) -> List[dict]:
+    """Embedding and coverage candidates re-ranked by a weighted blend of both scores.
+
+    Embedding scores are min-max scaled over the embedding candidates, so the
+    blend isn't dominated by how tightly ada-002 cosine scores cluster.
+    """
+    candidates = {recipe["recipe_id"]: recipe for recipe in _coverage_recipes(pantry_items, user_allergies, count * 2, detail_fields)}
+    embedding_recipes = _query_allergen_free_recipes(vector, user_allergies, count * 3, detail_fields)
+    embedding_scores = {recipe["recipe_id"]: recipe["score"] for recipe in embedding_recipes}
+    for recipe in embedding_recipes:
+        candidates.setdefault(recipe["recipe_id"], recipe)
+
+    ingredient_index = get_ingredient_index()
+    pantry_ids = ingredient_index.ids_for((item["ingredient"] for item in pantry_items), fuzzy=True)
+    coverage = get_coverage_index(ingredient_index).lookup(candidates, pantry_ids)
+
+    low, high = min(embedding_scores.values(), default=0.0), max(embedding_scores.values(), default=0.0)
+    for recipe_id, recipe in candidates.items():
+        similarity = (embedding_scores[recipe_id] - low) / (high - low) if recipe_id in embedding_scores and high > low else float(recipe_id in embedding_scores)
+        recipe["coverage"], recipe["missing_count"] = coverage.get(recipe_id, (0.0, len(recipe["ingredients"])))
+        recipe["score"] = RECIPE_COVERAGE_WEIGHT * recipe["coverage"] + (1 - RECIPE_COVERAGE_WEIGHT) * similarity
+    return sorted(candidates.values(), key=lambda recipe: recipe["score"], reverse=True)[:count]
+
+# Detail store columns behind each SuggestedRecipe field. Name and ingredients are
+# always loaded: every caller needs them for the allergen check, coverage or the grocery diff
+RECIPE_DETAIL_COLUMNS = {"recipe_name": "name", "ingredients": "ingredients", "instructions": "instructions", "image_url": "image_url"}
+GROCERY_RECIPE_FIELDS = ("recipe_id", "recipe_name", "ingredients")
+
+def _detail_fields(fields) -> Optional[tuple]:
+    """Detail store columns needed for recipes with only ``fields`` (None: all of them)."""
+    if fields is None:
+        return None
+    return tuple(sorted({"name", "ingredients", *(RECIPE_DETAIL_COLUMNS[field] for field in fields if field in RECIPE_DETAIL_COLUMNS)}))
+
+@traced("recipe_hydrate")
+def _hydrate_matches(matches, detail_fields=None) -> List[dict]:
+    """Attach recipe details (only ``detail_fields``, if given) to id/score matches as ``metadata``, in one batched lookup.
+
+    Ids missing from the detail store (records ingested with full vector
+    metadata) fall back to a vector-store fetch. A recipe still without a name
+    and ingredients (a slim record whose details were never backfilled) is
+    dropped with an error log: serving it would mean guessing its allergens.
+    """
+    ids = [match["id"] for match in matches]
+    details = get_recipe_details().get_many(ids, fields=detail_fields)
+    missing = [recipe_id for recipe_id in ids if recipe_id not in details]
+    if missing:
+        details.update(_fetch_recipe_metadata(missing))
+
+    incomplete = [recipe_id for recipe_id in ids if not _has_details(details.get(recipe_id))]
+    if incomplete:
+        logger.error(
+            "Dropping %d recipes without details (e.g. %s); run python -m app.scripts.backfill_recipe_details",
+            len(incomplete), ", ".join(incomplete[:5]),
+        )
+    return [
+        {"id": match["id"], "score": match["score"], "metadata": details[match["id"]]}
+        for match in matches if _has_details(details.get(match["id"]))
+    ]
+
+def _has_details(metadata: Optional[dict]) -> bool:
+    return metadata is not None and "name" in metadata and "ingredients" in metadata
+
+@traced("vector_fetch")
+def _fetch_recipe_metadata(recipe_ids: List[str]) -> dict:
+    """recipe_id -> vector metadata for the ids the store holds."""
+    if not recipe_ids:
+        return {}
+    response = get_recipe_store().fetch(ids=recipe_ids)
+    vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+    return {
+        recipe_id: record["metadata"] if isinstance(record, dict) else record.metadata
+        for recipe_id, record in vectors.items()
+    }
+
+def get_user_pantry_service(user_id: str, ctx: RequestContext = None):
+    """Fetch pantry inventory from Supabase for a given user"""
+    ctx = ctx or RequestContext()
+    return ctx.load(("pantry", user_id), _fetch_user_pantry, user_id)
 
-    # Format pantry items into a structured list
-    pantry_items = [{"ingredient": row[0], "quantity": row[1], "unit": row[2]} for row in pantry_data]
+def _fetch_user_pantry(user_id: str):
+    return _format_pantry(user_id, fetch_pantry(user_id))
+
+def _format_pantry(user_id: str, pantry_data) -> PantryResponse:
+    """Format PantryItem rows into the pantry response."""
+    pantry_items = [{"ingredient": row.ingredient_name, "quantity": row.quantity, "unit": row.unit} for row in pantry_data]
 
     return {"user_id": user_id, "pantry": pantry_items}
 
 def generate_embedding(text: str):
-    """Generate a text embedding using OpenAI's text-embedding-ada-002 model."""
-    response = openai.embeddings.create(
-        input=text,
-        model="text-embedding-ada-002"
-    )
+    """Generate a text embedding using OpenAI's text-embedding-ada-002 model.
+
+    Results are cached by a hash of the normalized text and model name, so a
+    pantry that hasn't changed skips the OpenAI round-trip.
+    """
+    return embedding_cache.get_or_compute(text, EMBEDDING_MODEL, _create_embedding)
+
+def _create_embedding(text: str):
+    """Call OpenAI for a single embedding (no caching)."""
+    with stage("embedding"):
+        response = get_openai().embeddings.create(
+            input=text,
+            model=EMBEDDING_MODEL
+        )
+    record_embedding_usage(response, EMBEDDING_MODEL)
     return response.data[0].embedding
 
 
 # ✅ Define structured JSON format
+class MealPlanMeal(BaseModel):
+    """One meal slot, as written by the meal planner."""
+    recipe_id: Optional[str] = None
+    name: str
+    ingredients: List[str] = []
+    instructions: Optional[str] = None
+    image_url: Optional[str] = None
+
 class MealPlanDay(BaseModel):
     """A structured meal plan for a single day."""
     day: int
-    meals: Dict[str, str]  # Keys: "breakfast", "lunch", "dinner"
+    meals: Dict[str, MealPlanMeal]  # Keys: "breakfast", "lunch", "dinner"
 
 class MealPlan(BaseModel):
     """A structured 7-day meal plan."""
     user_id: str
     days: List[MealPlanDay]
+    notes: Optional[str] = None  # LLM prep tips (MEAL_PLAN_LLM_NOTES)
 
-def generate_meal_plan_service(user_id: str):
-    # Get Data
-    preferences = get_user_preferences_service(user_id)
-    recipes = get_user_recipes_service(user_id)
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
 
-    if "error" in recipes:
-        return recipes  # No pantry data
+# Coverage-ranked recipes added to the suggestions as local planner candidates
+MEAL_PLAN_CANDIDATES = 30
 
-    # Structure Input for LLM
-    input_data = {
-        "diet": preferences[3],
-        "effort_level": preferences[6],
-        "dislikes": preferences[2],
-        "favorite_cuisines": preferences[4],
-        "preferred_meal_types": preferences[5],
-        "recipes": recipes
-    }
+def generate_meal_plan_service(user_id: str, ctx: RequestContext = None, planner: str = MEAL_PLANNER):
+    ctx = ctx or RequestContext()
 
-    json_format = """
-{
-    "user_id": "USER_ID_PLACEHOLDER",
-    "days": [
-        {
-            "day": 1,
-            "meals": {
-                "breakfast": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/breakfast.jpg"
-                },
-                "lunch": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/lunch.jpg"
-                },
-                "dinner": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/dinner.jpg"
-                }
-            }
-        },
-        {
-            "day": 2,
-            "meals": {
-                "breakfast": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/breakfast.jpg"
-                },
-                "lunch": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/lunch.jpg"
-                },
-                "dinner": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/dinner.jpg"
-                }
-            }
-        },
-        {
-            "day": 3,
-            "meals": {
-                "breakfast": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/breakfast.jpg"
-                },
-                "lunch": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/lunch.jpg"
-                },
-                "dinner": {
-                    "name": "Meal Name",
-                    "ingredients": ["Ingredient 1", "Ingredient 2"],
-                    "instructions": "Step 1. Do this. Step 2. Do that.",
-                    "image_url": "https://example.com/dinner.jpg"
-                }
-            }
-        }
-    ]
-}
-
-"""
-    content = f"""
-            User Preferences:
-            - Diet: {input_data["diet"]}
-            - Effort Level: {input_data["effort_level"]}
-            - Dislikes: {", ".join(input_data["dislikes"])}
-            - Preferred Meal Types: {", ".join(input_data["preferred_meal_types"])}
-
-            Suggested Recipes:
-            {recipes}
-            
-            Ensure the output is **valid JSON**, and the meal names should align with the provided **Suggested Recipes**.
-            """    
-
-    # Construct Chat Messages for LLM
-    messages = [
-        ChatMessage(
-            role="system",
-            content="You are a nutritionist generating meal plans in the exact JSON format provided."
-        ),
-        ChatMessage(
-            role="user",
-            content=content + json_format
-        )
-    ]
+    # Get Data
+    preferences = get_user_preferences_service(user_id, ctx)
+    recipes = get_user_recipes_service(user_id, ctx)
 
-    # Use OpenAI to Generate Meal Plan
-    meal_plan_response = llm.chat(messages)
-    if (is_valid_json(meal_plan_response.message.content)):
-        print("Output: " + meal_plan_response.message.content)
-        return meal_plan_response.message.content
-    return "Error"
+    if "error" in recipes:
+        return recipes  # No pantry data
 
-import json
+    if planner != "llm":
+        pantry_items = get_user_pantry_service(user_id, ctx)["pantry"]
+        meal_plan = _local_meal_plan(user_id, pantry_items, preferences, recipes["suggested_recipes"])
+        if MEAL_PLAN_LLM_NOTES:
+            meal_plan.notes = _meal_plan_notes(meal_plan)
+        return meal_plan.model_dump_json()
+
+    # Use OpenAI to Generate Meal Plan (JSON mode, so the reply is always a JSON object)
+    messages = _meal_plan_messages(preferences, recipes)
+    with stage("llm"):
+        meal_plan_response = get_llm().chat(messages, response_format=JSON_RESPONSE_FORMAT)
+    record_chat_usage(meal_plan_response, LLM_MODEL)
+    return _meal_plan_output(meal_plan_response.message.content, recipes)
+
+@traced("meal_plan_candidates")
+def _meal_plan_candidates(pantry_items: List[dict], preferences, suggested: List[dict]) -> List[dict]:
+    """Suggested recipes plus the best pantry-coverage recipes, with coverage, category and cuisine."""
+    candidates = {recipe["recipe_id"]: dict(recipe) for recipe in suggested}
+    if pantry_items:
+        for recipe in _coverage_recipes(pantry_items, preferences.allergies, MEAL_PLAN_CANDIDATES):
+            candidates.setdefault(recipe["recipe_id"], recipe)
+
+    ingredient_index = get_ingredient_index()
+    pantry_ids = ingredient_index.ids_for((item["ingredient"] for item in pantry_items), fuzzy=True)
+    coverage = get_coverage_index(ingredient_index).lookup(candidates, pantry_ids)
+    details = get_recipe_details().get_many(candidates, fields=("category", "cuisine"))
+    for recipe_id, recipe in candidates.items():
+        recipe["coverage"], recipe["missing_count"] = coverage.get(recipe_id, (0.0, len(recipe["ingredients"])))
+        recipe.update(details.get(recipe_id, {}))
+    return list(candidates.values())
+
+def _local_meal_plan(user_id: str, pantry_items: List[dict], preferences, suggested: List[dict]) -> MealPlan:
+    """Meal plan from the deterministic planner (no LLM call)."""
+    candidates = _meal_plan_candidates(pantry_items, preferences, suggested)
+    with stage("meal_plan_solve"):
+        days = plan_meals(candidates, preferences)
+    return MealPlan(user_id=user_id, days=days)
+
+def _meal_plan_notes(meal_plan: MealPlan) -> Optional[str]:
+    """Optional LLM prep tips for a finished plan; the plan is served without them on any failure."""
+    try:
+        with stage("llm"):
+            response = get_llm().chat(build_meal_plan_notes_messages(meal_plan.model_dump()["days"]))
+        record_chat_usage(response, LLM_MODEL)
+        return response.message.content.strip()
+    except Exception as e:
+        logger.warning("Meal plan notes failed: %s", e)
+        return None
+
+@traced("prompt_build")
+def _meal_plan_messages(preferences, recipes):
+    """Build the chat prompt for the meal planner from preferences and suggested recipes."""
+    return build_meal_plan_messages(preferences, recipes["suggested_recipes"], model=LLM_MODEL)
+
+@traced("meal_plan_parse")
+def _meal_plan_output(content: str, recipes):
+    """Return the meal plan as JSON with recipe details filled in, or "Error" if the LLM output is invalid."""
+    content = strip_code_fences(content)
+    if not is_valid_json(content):
+        return "Error"
+    meal_plan = rehydrate_meal_plan(json.loads(content), recipes["suggested_recipes"], recipes["user_id"])
+    return json.dumps(meal_plan)
 
 def is_valid_json(data):
     """Check if the given data is a valid JSON string or Python dict."""
@@ -239,42 +373,54 @@ def is_valid_json(data):
 
 from collections import Counter
 
-def get_grocery_list_service(user_id: str):
+def get_grocery_list_service(user_id: str, ctx: RequestContext = None, ranking: str = "embedding"):
     """Match recipes with user inventory and determine missing ingredients."""
-    
+    ctx = ctx or RequestContext()
+
     # Step 1: Retrieve user pantry
-    user_inventory = get_user_pantry_service(user_id)["pantry"]
-    user_ingredients = {item["ingredient"].lower() for item in user_inventory}  # Normalize ingredient names
+    user_inventory = get_user_pantry_service(user_id, ctx)["pantry"]
 
     # Step 2: Get top-K recipes from Pinecone
-    recipes = get_user_recipes_service(user_id)["suggested_recipes"]
+    recipes = get_user_recipes_service(user_id, ctx, ranking, GROCERY_RECIPE_FIELDS)["suggested_recipes"]
+
+    return _build_grocery_list(user_id, user_inventory, recipes)
+
+@traced("grocery_diff")
+def _build_grocery_list(user_id: str, user_inventory: List[dict], recipes: List[dict]) -> GroceryListResponse:
+    """Compare pantry items against recipe ingredients and consolidate what's missing."""
+    index = get_ingredient_index()
+    # Recipe ingredients go into the vocabulary before the pantry is matched against it
+    recipe_ingredients = [index.named_ids(recipe["ingredients"]) for recipe in recipes]
+    # Canonical ingredient ids, so "CHKN BRST 2LB" in the pantry covers a recipe's "Chicken Breast"
+    user_ingredients = index.ids_for((item["ingredient"] for item in user_inventory), fuzzy=True)
 
     # Step 3: Compare user inventory with recipe ingredients
     fully_makable_recipes = []
     recipes_with_missing_ingredients = []
     missing_ingredients_counter = Counter()
+    display_names = {}  # ingredient id -> name as first written in a recipe
 
-    for recipe in recipes:
+    for recipe, named in zip(recipes, recipe_ingredients):
         recipe_name = recipe["recipe_name"]
-        recipe_ingredients = {ingredient.lower() for ingredient in recipe["ingredients"]}  # Normalize names
-        
-        # Find missing ingredients
-        missing_ingredients = recipe_ingredients - user_ingredients
+        # Missing ingredients keep the recipe's wording and order
+        missing_ingredients = {i: name for i, name in named.items() if i not in user_ingredients}
 
         if not missing_ingredients:
             fully_makable_recipes.append(recipe_name)  # ✅ User can fully make this recipe
         else:
             recipes_with_missing_ingredients.append({
                 "recipe_name": recipe_name,
-                "missing_ingredients": list(missing_ingredients)  # Convert set to list
+                "missing_ingredients": list(missing_ingredients.values())
             })
-            
+
             # Count how many times each ingredient is missing
-            missing_ingredients_counter.update(missing_ingredients)
+            missing_ingredients_counter.update(missing_ingredients.keys())
+            for i, name in missing_ingredients.items():
+                display_names.setdefault(i, name)
 
-    # Step 4: Generate consolidated grocery list
+    # Step 4: Generate consolidated grocery list (ties keep first-seen order)
     grocery_list = sorted(
-        [{"ingredient": ingredient, "count": count} for ingredient, count in missing_ingredients_counter.items()],
+        [{"ingredient": display_names[i], "count": count} for i, count in missing_ingredients_counter.items()],
         key=lambda x: x["count"],
         reverse=True  # Sort by most frequently missing ingredient
     )
@@ -287,31 +433,34 @@ def get_grocery_list_service(user_id: str):
         "consolidated_grocery_list": grocery_list
     }
 
-def get_pantry_ingredients(user_id):
-    """Extracts available ingredient names from the user's pantry."""
-    pantry_response = get_user_pantry_service(user_id)
+def get_pantry_ingredients(user_id, ctx: RequestContext = None):
+    """Canonical ingredient ids available in the user's pantry."""
+    pantry_response = get_user_pantry_service(user_id, ctx)
 
     if "pantry" not in pantry_response:
-        return set()  # Return empty set if no pantry data
+        return frozenset()  # Return empty set if no pantry data
 
-    return {item["ingredient"].lower() for item in pantry_response["pantry"]}
+    return get_ingredient_index().ids_for((item["ingredient"] for item in pantry_response["pantry"]), fuzzy=True)
 
-def get_recipe_ingredients(user_id):
-    """Extracts recipe ingredient lists for comparison."""
-    recipes_response = get_user_recipes_service(user_id)
+def get_recipe_ingredients(user_id, ctx: RequestContext = None):
+    """Extracts recipe ingredient id sets for comparison."""
+    recipes_response = get_user_recipes_service(user_id, ctx)
 
     if "suggested_recipes" not in recipes_response:
         return []  # Return empty list if no recipes found
 
+    index = get_ingredient_index()
     return [
-        {"recipe_name": recipe["recipe_name"], "ingredients": set(map(str.lower, recipe["ingredients"]))}
+        {"recipe_name": recipe["recipe_name"], "ingredients": index.recipe_ingredient_ids(recipe)}
         for recipe in recipes_response["suggested_recipes"]
     ]
 
-def compare_pantry_and_recipes(user_id):
+def compare_pantry_and_recipes(user_id, ctx: RequestContext = None):
     """Compares user's pantry with suggested recipes and returns matching & missing ingredients."""
-    pantry_ingredients = get_pantry_ingredients(user_id)  # Pantry as set
-    recipes = get_recipe_ingredients(user_id)  # List of recipes with ingredients
+    ctx = ctx or RequestContext()
+    pantry_ingredients = get_pantry_ingredients(user_id, ctx)  # Pantry as id set
+    recipes = get_recipe_ingredients(user_id, ctx)  # List of recipes with ingredient ids
+    index = get_ingredient_index()
 
     recipe_comparisons = []
 
@@ -321,66 +470,23 @@ def compare_pantry_and_recipes(user_id):
 
         recipe_comparisons.append({
             "recipe_name": recipe["recipe_name"],
-            "available_ingredients": list(available),
-            "missing_ingredients": list(missing),
+            "available_ingredients": [index.name(i) for i in available],
+            "missing_ingredients": [index.name(i) for i in missing],
             "can_make": len(missing) == 0  # ✅ Fully makeable if nothing is missing
         })
 
     return recipe_comparisons
 
-import httpx
-from fastapi import UploadFile
-import aiofiles
-
-EXTERNAL_RECEIPT_API = "https://c8wgwo8w0c8swww08oo088kg.deploy.jensenhshoots.com/parse-receipt/"
+# ✅ Receipt → pantry rows (the parser call itself runs as a job, see receipt_jobs.py)
+def receipt_pantry_items(receipt_data: dict, user_id: str) -> List[dict]:
+    """Transform parsed receipt line items into pantry rows.
 
-async def parse_receipt_image(file: UploadFile):
-    """Send the receipt image to the external API and return parsed data."""
-
-    try:
-        # Read the file contents
-        content = await file.read()  # ✅ Ensure content is read before making request
-        files = {"file": (file.filename, content, file.content_type)}
-
-        # Send the request asynchronously
-        async with httpx.AsyncClient(timeout=60) as client:  # ✅ Increase timeout
-            response = await client.post(EXTERNAL_RECEIPT_API, files=files)
-
-        # ✅ Ensure response is returned as JSON
-        response.raise_for_status()  # Raises error if status is 4xx or 5xx
-        return response.json()  # ✅ Extract and return JSON data
-
-    except httpx.HTTPStatusError as e:
-        return {"error": f"HTTP error: {e.response.status_code} - {e.response.text}"}
-    except httpx.TimeoutException:
-        return {"error": "Request to receipt parser API timed out"}
-    except Exception as e:
-        return {"error": f"Unexpected error: {str(e)}"}
-
-    except Exception as e:
-        return {"error": f"Unexpected error: {str(e)}"}
-    
-async def parse_receipt_service(file: UploadFile, user_id: str):
-    """Parse receipt image and transform into pantry ingredient data."""
-
-    # ✅ Step 1: Parse the Receipt Image
-    result = await parse_receipt_image(file)  # Ensure this function correctly extracts receipt details
-    if "error" in result:
-        return {"error": result["error"]}
-    
-    receipt_data = result.get("receipt_data", {})  # ✅ Get "receipt_data" dictionary
-
-    # ✅ Step 2: Extract relevant data
-    store_name = receipt_data.get("store_name", "Unknown Store")  # ✅ Corrected
-    items = receipt_data.get("line_items", [])  # ✅ Corrected
-
-    if not user_id:
-        return {"error": "User ID is required"}
-
-    # ✅ Step 3: Transform receipt items into pantry ingredients
+    Names are stored as printed (whitespace collapsed); matching them to
+    recipe ingredients happens at read time through the ingredient index.
+    """
     pantry_items = []
-    for item in items:
-        item_name = item.get("item_name", "").strip()
+    for item in receipt_data.get("line_items", []):
+        item_name = " ".join(item.get("item_name", "").split())
         item_quantity = float(item.get("item_quantity", "1"))  # Default to 1 if missing
 
         if not item_name:
@@ -395,30 +501,31 @@ async def parse_receipt_service(file: UploadFile, user_id: str):
             "storage_location": "Unknown",  # Default storage
             "created_at": "NOW()"  # Set current timestamp
         })
+    return pantry_items
+
+@traced("supabase_upsert")
+def store_receipt_pantry_items(user_id: str, pantry_items: List[dict]):
+    """Upsert receipt rows into the pantry (blocking Supabase call; run it in a thread)."""
+    if not pantry_items:
+        return
+    response = (
+        get_supabase().table("pantry")
+        .upsert(pantry_items, on_conflict="user_id,ingredient_name")
+        .execute()
+    )
+    if "error" in response:
+        raise RuntimeError(response["error"]["message"])
 
-    # ✅ Step 4: Insert into Supabase
-    if pantry_items:
-        response = (
-            supabase.table("pantry")
-            .upsert(pantry_items, on_conflict="user_id,ingredient_name")
-            .execute()
-)
-        if "error" in response:
-            return {"error": response["error"]["message"]}
+@traced("supabase_upsert")
+def store_user_meal_history(user_id: str, meal_plan: dict, fingerprint: str = None):
+    """Store user's meal plan history in Supabase using Supabase client.
 
-    # ✅ Step 5: Return structured response
-    return {
-        "message": "Receipt processed and pantry updated",
-        "store_name": store_name,
-        "pantry_items": pantry_items
-    }
-    
-def store_user_meal_history(user_id: str, meal_plan: dict):
-    """Store user's meal plan history in Supabase using Supabase client."""
+    ``fingerprint`` identifies the pantry/preferences/recipes the plan was built from.
+    """
 
     try:
         # response = (
-        #     supabase.table("user_meal_history")
+        #     get_supabase().table("user_meal_history")
         #     .upsert({"user_id": user_id, "meal_plan": meal_plan})  # Convert to JSON
         #     .execute()
         # )
@@ -429,14 +536,413 @@ def store_user_meal_history(user_id: str, meal_plan: dict):
             "meal_plan": meal_plan,  # Supabase JSONB column
             "created_at": "NOW()"  # Track latest update timestamp
         }
+        if fingerprint is not None:
+            data_to_upsert["fingerprint"] = fingerprint
 
         # Upsert into Supabase (Insert if new, Update if exists)
         response = (
-            supabase.table("user_meal_history")
+            get_supabase().table("user_meal_history")
             .upsert([data_to_upsert], on_conflict=["user_id"])  # Conflict on `user_id`
             .execute()
         )
         return {"status": "success"}
 
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+# ✅ Async service layer: same results as the sync functions above, but the
+# database, OpenAI and Pinecone calls don't hold a threadpool worker while waiting,
+# and independent lookups run concurrently.
+
+async def get_user_pantry_service_async(user_id: str, ctx: RequestContext = None):
+    """Async get_user_pantry_service (asyncpg)."""
+    ctx = ctx or RequestContext()
+    return await ctx.load_async(("pantry", user_id), _fetch_user_pantry_async, user_id)
+
+async def _fetch_user_pantry_async(user_id: str):
+    return _format_pantry(user_id, await fetch_pantry_async(user_id))
+
+async def get_pantry_revision_async(user_id: str, ctx: RequestContext = None) -> int:
+    """The user's pantry revision; it moves on every pantry write."""
+    ctx = ctx or RequestContext()
+    return await ctx.load_async(("pantry_revision", user_id), fetch_pantry_revision_async, user_id)
+
+async def get_pantry_delta_service_async(user_id: str, since: int):
+    """Pantry items written and ingredient names deleted after revision ``since``."""
+    delta = await fetch_pantry_delta_async(user_id, since)
+    return {
+        "user_id": user_id,
+        "revision": delta.revision,
+        "since": since,
+        "changed": _format_pantry(user_id, delta.changed)["pantry"],
+        "deleted": delta.deleted,
+    }
+
+async def _cached_by_revision(key: tuple, user_id: str, ctx: RequestContext, compute, *args):
+    """Serve a derived result from ``derived_cache`` while the pantry revision and preferences are unchanged.
+
+    Both are read from the database on every call, so each worker process
+    revalidates its own cache against writes made through any worker.
+    """
+    revision, preferences = await asyncio.gather(
+        get_pantry_revision_async(user_id, ctx),
+        get_user_preferences_service_async(user_id, ctx),
+    )
+    version = (revision, preferences)
+    result = derived_cache.get(key, version)
+    if result is None:
+        result = await compute(*args)
+        if "error" not in result and ctx.cacheable:
+            derived_cache.set(key, version, result)
+    return result
+
+async def get_user_preferences_service_async(user_id: str, ctx: RequestContext = None):
+    """Async get_user_preferences_service (asyncpg)."""
+    ctx = ctx or RequestContext()
+    return await ctx.load_async(("preferences", user_id), fetch_preferences_async, user_id)
+
+async def generate_embedding_async(text: str):
+    """Async generate_embedding using AsyncOpenAI, sharing the same cache."""
+    return await embedding_cache.aget_or_compute(text, EMBEDDING_MODEL, _create_embedding_async)
+
+async def _create_embedding_async(text: str):
+    response = await embedding_gateway.call(request_key(EMBEDDING_MODEL, text), lambda: _embeddings_create_async(text))
+    return response.data[0].embedding
+
+async def _embeddings_create_async(inputs):
+    """One embeddings.create request (run through embedding_gateway)."""
+    with stage("embedding"):
+        response = await get_async_openai().embeddings.create(
+            input=inputs,
+            model=EMBEDDING_MODEL
+        )
+    record_embedding_usage(response, EMBEDDING_MODEL)
+    return response
+
+async def generate_embeddings_async(texts: List[str], batch_size: int = 256, cache: bool = True) -> List[List[float]]:
+    """Embed many texts, sending cache misses to OpenAI ``batch_size`` inputs per request.
+
+    Bulk callers (ingestion, batch endpoints) pass ``cache=False`` so their
+    one-off texts don't evict the request path's pantry embeddings.
+    """
+    vectors = [embedding_cache.get(text, EMBEDDING_MODEL) for text in texts] if cache else [None] * len(texts)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+    for start in range(0, len(missing), batch_size):
+        positions = missing[start:start + batch_size]
+        batch = [texts[i] for i in positions]
+        response = await embedding_gateway.call(request_key(EMBEDDING_MODEL, batch), lambda: _embeddings_create_async(batch))
+        for i, item in zip(positions, sorted(response.data, key=lambda item: item.index)):
+            vectors[i] = item.embedding
+            if cache:
+                embedding_cache.set(texts[i], EMBEDDING_MODEL, item.embedding)
+    return vectors
+
+async def get_user_recipes_service_async(user_id: str, ctx: RequestContext = None, ranking: str = "embedding",
+                                         fields=None) -> RecipesResponse:
+    """Async get_user_recipes_service: allergies are fetched alongside the pantry→embedding→query chain.
+
+    Results are cached per set of detail columns, so narrow callers never get (or store) wide recipes.
+    """
+    ctx = ctx or RequestContext()
+    detail_fields = _detail_fields(fields)
+    key = ("recipes", user_id, ranking, detail_fields)
+    return await ctx.load_async(key, _cached_by_revision, key, user_id, ctx, _suggest_user_recipes_async, user_id, ctx, ranking, detail_fields)
+
+async def _suggest_user_recipes_async(user_id: str, ctx: RequestContext, ranking: str = "embedding", detail_fields=None):
+    if ranking == "coverage":
+        # No embedding needed: the coverage matrix scores the pantry directly
+        pantry_response, preferences = await asyncio.gather(
+            get_user_pantry_service_async(user_id, ctx),
+            get_user_preferences_service_async(user_id, ctx),
+        )
+        if not pantry_response["pantry"]:
+            return {"user_id": user_id, "suggested_recipes": []}
+        filtered_recipes = await asyncio.to_thread(_coverage_recipes, pantry_response["pantry"], preferences.allergies, detail_fields=detail_fields)
+        return {"user_id": user_id, "suggested_recipes": filtered_recipes}
+
+    embedding_response, preferences = await asyncio.gather(
+        _pantry_embedding_async(user_id, ctx),
+        get_user_preferences_service_async(user_id, ctx),
+    )
+    if embedding_response is None:
+        return {"user_id": user_id, "suggested_recipes": []}
+
+    # The Pinecone client is blocking, so run the query on a worker thread
+    if ranking == "hybrid":
+        pantry_response = await get_user_pantry_service_async(user_id, ctx)
+        filtered_recipes = await asyncio.to_thread(_hybrid_recipes, embedding_response, pantry_response["pantry"], preferences.allergies, detail_fields=detail_fields)
+    else:
+        filtered_recipes = await asyncio.to_thread(_query_allergen_free_recipes, embedding_response, preferences.allergies, detail_fields=detail_fields)
+    return {"user_id": user_id, "suggested_recipes": filtered_recipes}
+
+# Candidates taken from each ranking before reciprocal rank fusion in hybrid search
+SEARCH_FUSION_DEPTH = 50
+
+async def search_recipes_service_async(query: str, limit: int = 10, mode: str = "keyword", fields=None) -> RecipeSearchResponse:
+    """Recipes matching ``query``: BM25 keyword search (no OpenAI call), or with
+    ``mode="hybrid"`` BM25 and vector rankings fused by reciprocal rank.
+
+    ``fields`` limits the recipe details loaded, as in get_user_recipes_service."""
+    with stage("keyword_search"):
+        hits = get_recipe_search_index().search(query, max(limit, SEARCH_FUSION_DEPTH) if mode == "hybrid" else limit)
+
+    if mode == "hybrid":
+        vector = await generate_embedding_async(query)
+        with stage("vector_query"):
+            response = await asyncio.to_thread(
+                get_recipe_store().query, vector=vector, top_k=SEARCH_FUSION_DEPTH, include_metadata=False,
+            )
+        hits = reciprocal_rank_fusion([
+            [recipe_id for recipe_id, _ in hits],
+            [match["id"] for match in response["matches"]],
+        ])
+
+    matches = _hydrate_matches([{"id": recipe_id, "score": score} for recipe_id, score in hits[:limit]], _detail_fields(fields))
+    return {"query": query, "mode": mode, "recipes": _filter_recipe_matches(matches, [])}
+
+async def _pantry_embedding_async(user_id: str, ctx: RequestContext):
+    """The user's stored pantry embedding; None when the pantry is empty.
+
+    The stored embedding is used even when the pantry has changed since it was
+    computed (the recompute is queued instead), so OpenAI is only called inline
+    for a user who has no stored embedding yet.
+    """
+    pantry_response, stored = await asyncio.gather(
+        get_user_pantry_service_async(user_id, ctx),
+        ctx.load_async(("pantry_embedding", user_id), fetch_pantry_embedding_async, user_id),
+    )
+    if not pantry_response["pantry"]:
+        return None
+
+    pantry_text = _pantry_text(pantry_response["pantry"])
+    current_hash = pantry_hash(pantry_text, EMBEDDING_MODEL)
+    if stored is not None:
+        if stored.pantry_hash != current_hash:
+            pantry_embedding_queue.enqueue(user_id)
+            ctx.cacheable = False  # results from the old embedding mustn't be cached under the new revision
+        return stored.embedding
+
+    embedding = await ctx.load_async(("embedding", pantry_text), generate_embedding_async, pantry_text)
+    await store_pantry_embedding_async(user_id, current_hash, embedding)
+    return embedding
+
+async def refresh_pantry_embedding_async(user_id: str):
+    """Recompute and store a user's pantry embedding if their pantry changed."""
+    pantry_items = _format_pantry(user_id, await fetch_pantry_async(user_id))["pantry"]
+    if not pantry_items:
+        await delete_pantry_embedding_async(user_id)
+        derived_cache.invalidate_user(user_id)
+        return
+
+    pantry_text = _pantry_text(pantry_items)
+    current_hash = pantry_hash(pantry_text, EMBEDDING_MODEL)
+    stored = await fetch_pantry_embedding_async(user_id)
+    if stored is not None and stored.pantry_hash == current_hash:
+        return
+    await store_pantry_embedding_async(user_id, current_hash, await generate_embedding_async(pantry_text))
+    # Frees this worker's entries for older revisions early; correctness doesn't rely on it,
+    # since results computed from a stale embedding are never cached
+    derived_cache.invalidate_user(user_id)
+
+# Change hook for pantry writes: receipt uploads and client edits enqueue the user here
+pantry_embedding_queue = PantryEmbeddingQueue(refresh_pantry_embedding_async, workers=PANTRY_EMBEDDING_WORKERS)
+
+# Receipt pantry rows and meal history are written behind the response, in bulk;
+# flushed pantry rows queue the user's embedding refresh
+write_behind = WriteBehindBuffer(on_pantry_flushed=pantry_embedding_queue.enqueue)
+
+async def generate_meal_plan_service_async(user_id: str, ctx: RequestContext = None, planner: str = MEAL_PLANNER):
+    """Async generate_meal_plan_service: the local planner, or with ``planner="llm"`` llm.achat."""
+    ctx = ctx or RequestContext()
+    preferences, recipes = await asyncio.gather(
+        get_user_preferences_service_async(user_id, ctx),
+        get_user_recipes_service_async(user_id, ctx),
+    )
+
+    if "error" in recipes:
+        return recipes  # No pantry data
+
+    if planner != "llm":
+        pantry_response = await get_user_pantry_service_async(user_id, ctx)
+        meal_plan = await asyncio.to_thread(
+            _local_meal_plan, user_id, pantry_response["pantry"], preferences, recipes["suggested_recipes"],
+        )
+        if MEAL_PLAN_LLM_NOTES:
+            meal_plan.notes = await _meal_plan_notes_async(meal_plan, user_id)
+        return meal_plan.model_dump_json()
+
+    messages = _meal_plan_messages(preferences, recipes)
+
+    async def chat():
+        with stage("llm"):
+            return await get_llm().achat(messages, response_format=JSON_RESPONSE_FORMAT)
+
+    # Identical prompts in flight (double taps, several devices) share one LLM call
+    key = request_key(LLM_MODEL, [(str(message.role), message.content) for message in messages])
+    meal_plan_response = await llm_gateway.call(key, chat, user_id=user_id)
+    record_chat_usage(meal_plan_response, LLM_MODEL)
+    return _meal_plan_output(meal_plan_response.message.content, recipes)
+
+async def _meal_plan_notes_async(meal_plan: MealPlan, user_id: str) -> Optional[str]:
+    """Async _meal_plan_notes through the LLM call gateway."""
+    messages = build_meal_plan_notes_messages(meal_plan.model_dump()["days"])
+
+    async def chat():
+        with stage("llm"):
+            return await get_llm().achat(messages)
+
+    try:
+        key = request_key(LLM_MODEL, [(str(message.role), message.content) for message in messages])
+        response = await llm_gateway.call(key, chat, user_id=user_id)
+        record_chat_usage(response, LLM_MODEL)
+        return response.message.content.strip()
+    except Exception as e:
+        logger.warning("Meal plan notes failed for %s: %s", user_id, e)
+        return None
+
+async def stream_meal_plan_service_async(user_id: str, ctx: RequestContext = None):
+    """Stream the meal plan from llm.astream_chat.
+
+    Yields ``("day", MealPlanDay)`` as soon as each day's object is complete in
+    the streamed JSON (``("invalid_day", error)`` if it fails validation), then
+    ``("plan", content)`` with the full response text.
+    """
+    ctx = ctx or RequestContext()
+    preferences, recipes = await asyncio.gather(
+        get_user_preferences_service_async(user_id, ctx),
+        get_user_recipes_service_async(user_id, ctx),
+    )
+
+    suggested = recipes["suggested_recipes"]
+    by_id = {recipe["recipe_id"]: recipe for recipe in suggested}
+    by_name = {recipe["recipe_name"].casefold(): recipe for recipe in suggested}
+
+    parser = JsonArrayItemParser("days")
+    messages = _meal_plan_messages(preferences, recipes)
+    chunk = None
+    # A stream can't be shared, but it still counts against the user's quota and holds a slot
+    async with llm_gateway.admit(user_id):
+        with stage("llm.stream_open"):
+            response_stream = await get_llm().astream_chat(messages, response_format=JSON_RESPONSE_FORMAT)
+        async for chunk in response_stream:
+            for day in parser.feed(chunk.delta or ""):
+                try:
+                    yield "day", MealPlanDay.model_validate(rehydrate_meal_plan_day(day, by_id, by_name))
+                except ValueError as e:
+                    yield "invalid_day", str(e)
+
+    if chunk is not None:
+        record_chat_usage(chunk, LLM_MODEL)  # only reported on the last chunk, when the API includes usage
+    yield "plan", _meal_plan_output(parser.text, recipes)
+
+async def get_grocery_list_service_async(user_id: str, ctx: RequestContext = None, ranking: str = "embedding") -> GroceryListResponse:
+    """Async get_grocery_list_service, recomputed only when the pantry revision or preferences move."""
+    ctx = ctx or RequestContext()
+    return await _cached_by_revision(("grocery_list", user_id, ranking), user_id, ctx, _grocery_list_async, user_id, ctx, ranking)
+
+async def _grocery_list_async(user_id: str, ctx: RequestContext, ranking: str):
+    pantry_response, recipes_response = await asyncio.gather(
+        get_user_pantry_service_async(user_id, ctx),
+        get_user_recipes_service_async(user_id, ctx, ranking, GROCERY_RECIPE_FIELDS),
+    )
+    return await asyncio.to_thread(_build_grocery_list, user_id, pantry_response["pantry"], recipes_response["suggested_recipes"])
+
+# ✅ Batch service layer for many users at once (nightly precompute).
+# One query loads every pantry and one loads every preferences row, pantry texts
+# are embedded in batched embeddings.create calls, and vector queries run
+# concurrently; results are yielded per user as they complete.
+
+BATCH_CHUNK_SIZE = 500  # users loaded/embedded together before results start streaming
+BATCH_QUERY_CONCURRENCY = 8  # vector queries in flight at once
+
+async def get_user_recipes_batch_service_async(user_ids: List[str]):
+    """Yield get_user_recipes_service results for each user in ``user_ids``."""
+    async for user_id, pantry_items, recipes in _suggest_recipes_batch_async(user_ids):
+        yield recipes
+
+async def get_grocery_list_batch_service_async(user_ids: List[str]):
+    """Yield get_grocery_list_service results for each user in ``user_ids``."""
+    async for user_id, pantry_items, recipes in _suggest_recipes_batch_async(user_ids, _detail_fields(GROCERY_RECIPE_FIELDS)):
+        if "error" in recipes:
+            yield recipes
+        else:
+            yield await asyncio.to_thread(_build_grocery_list, user_id, pantry_items, recipes["suggested_recipes"])
+
+async def _suggest_recipes_batch_async(user_ids: List[str], detail_fields=None):
+    """Yield (user_id, pantry items, recipes response) for every user, chunk by chunk."""
+    user_ids = list(dict.fromkeys(user_ids))
+    for start in range(0, len(user_ids), BATCH_CHUNK_SIZE):
+        chunk = user_ids[start:start + BATCH_CHUNK_SIZE]
+        pantries, preferences = await asyncio.gather(
+            fetch_pantries_async(chunk),
+            fetch_preferences_many_async(chunk),
+        )
+        pantry_items = {user_id: _format_pantry(user_id, pantries[user_id])["pantry"] for user_id in chunk}
+
+        # Users with an empty pantry get no suggestions, as in the single-user path
+        for user_id in chunk:
+            if not pantry_items[user_id]:
+                yield user_id, [], {"user_id": user_id, "suggested_recipes": []}
+
+        stocked = [user_id for user_id in chunk if pantry_items[user_id]]
+        texts = {user_id: _pantry_text(pantry_items[user_id]) for user_id in stocked}
+        unique_texts = list(dict.fromkeys(texts.values()))
+        vectors = dict(zip(unique_texts, await generate_embeddings_async(unique_texts, cache=False)))
+
+        # Matrix stores answer every user that shares an allergen filter in one
+        # query_many call; other stores get one query per user
+        groups = {}
+        for user_id in stocked:
+            key = repr(allergen_filter(preferences[user_id].allergies)) if hasattr(get_recipe_store(), "query_many") else user_id
+            groups.setdefault(key, []).append(user_id)
+
+        semaphore = asyncio.Semaphore(BATCH_QUERY_CONCURRENCY)
+
+        async def query_group(group):
+            async with semaphore:
+                try:
+                    results = await asyncio.to_thread(
+                        _query_allergen_free_recipes_many,
+                        [vectors[texts[user_id]] for user_id in group],
+                        preferences[group[0]].allergies,
+                        detail_fields=detail_fields,
+                    )
+                    return [(user_id, {"user_id": user_id, "suggested_recipes": recipes}) for user_id, recipes in zip(group, results)]
+                except Exception as e:
+                    return [(user_id, {"user_id": user_id, "error": str(e)}) for user_id in group]
+
+        for finished in asyncio.as_completed([query_group(group) for group in groups.values()]):
+            for user_id, response in await finished:
+                yield user_id, pantry_items[user_id], response
+
+def _query_allergen_free_recipes_many(vectors, user_allergies, count: int = SUGGESTED_RECIPE_COUNT, detail_fields=None) -> List[List[dict]]:
+    """_query_allergen_free_recipes for several vectors that share one allergen list."""
+    if len(vectors) == 1 or not hasattr(get_recipe_store(), "query_many"):
+        return [_query_allergen_free_recipes(vector, user_allergies, count, detail_fields) for vector in vectors]
+
+    query_filter = allergen_filter(user_allergies)
+    with stage("vector_query"):
+        responses = get_recipe_store().query_many(vectors, top_k=count, include_metadata=False, filter=query_filter)
+
+    # One hydration lookup for every user in the group
+    hydrated = {match["id"]: match for match in _hydrate_matches([m for response in responses for m in response["matches"]], detail_fields)}
+
+    results = []
+    for vector, response in zip(vectors, responses):
+        matches = [{**hydrated[m["id"]], "score": m["score"]} for m in response["matches"] if m["id"] in hydrated]
+        recipes = _filter_recipe_matches(matches, user_allergies)
+        if len(recipes) < count and len(response["matches"]) == count:
+            # The allergen check dropped some; fall back to the over-fetch loop
+            recipes = _query_allergen_free_recipes(vector, user_allergies, count, detail_fields)
+        results.append(recipes[:count])
+    return results
+
+async def store_user_meal_history_async(user_id: str, meal_plan: dict, fingerprint: str = None):
+    """Buffer the meal plan in ``write_behind``; it reaches the database with the next bulk flush."""
+    try:
+        write_behind.add_meal_history(user_id, meal_plan, fingerprint)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"status": "success"}
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import random
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from app.config import (
+    EMBEDDING_GATEWAY_CONCURRENCY,
+    EMBEDDING_GATEWAY_QUEUE,
+    EMBEDDING_GATEWAY_TIMEOUT,
+    LLM_GATEWAY_CONCURRENCY,
+    LLM_GATEWAY_QUEUE,
+    LLM_GATEWAY_QUEUE_TIMEOUT,
+    LLM_GATEWAY_RETRIES,
+    LLM_GATEWAY_TIMEOUT,
+    LLM_USER_BURST,
+    LLM_USER_RATE,
+)
+from app.services.rate_limit import TokenBucket
+
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled (with jitter) after each one
+
+
+class GatewayRejected(Exception):
+    """The call was shed before reaching OpenAI (503 overloaded, 429 over quota) or timed out (504).
+
+    ``status_code`` is the HTTP status to answer with and ``retry_after`` the
+    seconds a client should wait; main.py turns it into the response.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def _retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, 429 and 5xx from the OpenAI SDK (or LlamaIndex wrapping it)."""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if getattr(error, "status_code", None) in RETRY_STATUS_CODES:
+        return True
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def request_key(*parts) -> str:
+    """Stable single-flight key for a call's inputs (model, messages, ...)."""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class CallGateway:
+    """Admission control in front of one kind of upstream call (LLM chat, embeddings).
+
+    - Single flight: identical calls in flight share the leader's result, so
+      a double-tapped refresh costs one OpenAI request.
+    - At most ``max_concurrency`` calls run at once; up to ``max_queue`` more
+      wait (for at most ``queue_timeout`` seconds) and anything beyond that is
+      shed with a 503 right away.
+    - Per-user token buckets (``user_rate`` calls/second, ``user_burst``
+      at once) answer 429 when a user is over quota.
+    - Each attempt is cut off after ``call_timeout`` seconds; timeouts, 429
+      and 5xx are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 call_timeout: float, retries: int = 0, user_rate: float = 0.0, user_burst: float = 1.0,
+                 max_users: int = 10000):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.retries = retries
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._running = 0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.stats_counts = {"calls": 0, "coalesced": 0, "shed": 0, "over_quota": 0, "retries": 0, "timeouts": 0}
+
+    # ✅ Per-user quota
+    def _check_quota(self, user_id: Optional[str]):
+        if not user_id or self.user_rate <= 0:
+            return
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, capacity=self.user_burst)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(user_id)
+        if not bucket.try_acquire():
+            self.stats_counts["over_quota"] += 1
+            raise GatewayRejected(429, f"Too many {self.name} requests, slow down", bucket.wait_time())
+
+    # ✅ Concurrency limit with a bounded wait queue
+    @asynccontextmanager
+    async def _slot(self):
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self.stats_counts["shed"] += 1
+            raise GatewayRejected(503, f"{self.name} is at capacity, try again shortly", self.queue_timeout)
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats_counts["shed"] += 1
+            raise GatewayRejected(503, f"{self.name} is at capacity, try again shortly", self.queue_timeout)
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self, user_id: Optional[str] = None):
+        """Quota check and a concurrency slot for calls that can't be coalesced (streams)."""
+        self._check_quota(user_id)
+        async with self._slot():
+            yield
+
+    async def _run(self, call: Callable[[], Awaitable]):
+        async with self._slot():
+            for attempt in range(self.retries + 1):
+                try:
+                    self.stats_counts["calls"] += 1
+                    return await asyncio.wait_for(call(), self.call_timeout)
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.stats_counts["timeouts"] += 1
+                    if attempt == self.retries or not _retryable(e):
+                        if isinstance(e, asyncio.TimeoutError):
+                            raise GatewayRejected(504, f"{self.name} call timed out", self.call_timeout) from e
+                        raise
+                self.stats_counts["retries"] += 1
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def call(self, key: Optional[Hashable], call: Callable[[], Awaitable], user_id: Optional[str] = None):
+        """Run ``call()`` through the gateway; calls with the same ``key`` in flight share one result."""
+        leader = self._inflight.get(key) if key is not None else None
+        if leader is not None:
+            self.stats_counts["coalesced"] += 1
+            return await asyncio.shield(leader)
+
+        self._check_quota(user_id)
+        task = asyncio.ensure_future(self._run(call))
+        if key is not None:
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded, so a disconnecting leader doesn't cancel the call its followers wait on
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counts,
+            "running": self._running,
+            "waiting": self._waiting,
+            "inflight_keys": len(self._inflight),
+        }
+
+
+llm_gateway = CallGateway(
+    "LLM", LLM_GATEWAY_CONCURRENCY, LLM_GATEWAY_QUEUE, LLM_GATEWAY_QUEUE_TIMEOUT, LLM_GATEWAY_TIMEOUT,
+    retries=LLM_GATEWAY_RETRIES, user_rate=LLM_USER_RATE, user_burst=LLM_USER_BURST,
+)
+embedding_gateway = CallGateway(
+    "Embedding", EMBEDDING_GATEWAY_CONCURRENCY, EMBEDDING_GATEWAY_QUEUE, LLM_GATEWAY_QUEUE_TIMEOUT,
+    EMBEDDING_GATEWAY_TIMEOUT, retries=LLM_GATEWAY_RETRIES,
+)
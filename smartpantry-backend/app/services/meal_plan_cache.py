@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import List
+
+from fastapi import BackgroundTasks
+from app.config import MEAL_PLANNER
+from app.services.database import decode_meal_plan, fetch_stored_meal_plan_async
+from app.services.llama_index_service import (
+    MealPlan,
+    generate_meal_plan_service_async,
+    get_user_pantry_service_async,
+    get_user_preferences_service_async,
+    get_user_recipes_service_async,
+    is_valid_json,
+    store_user_meal_history_async,
+    stream_meal_plan_service_async,
+    write_behind,
+)
+from app.services.request_context import RequestContext
+
+logger = logging.getLogger(__name__)
+
+# Users whose plan is being regenerated in the background, so repeat hits don't pile up LLM calls
+_regenerating = set()
+
+
+def meal_plan_fingerprint(pantry_items: List[dict], preferences, recipes: List[dict]) -> str:
+    """Hash of everything a meal plan depends on: pantry rows, preferences row and candidate recipe ids."""
+    payload = {
+        "pantry": sorted([item["ingredient"], item["quantity"], item["unit"]] for item in pantry_items),
+        "preferences": list(preferences),
+        "recipes": sorted(recipe.get("recipe_id") or recipe["recipe_name"] for recipe in recipes),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+async def meal_plan_fingerprint_async(user_id: str, ctx: RequestContext) -> str:
+    pantry_response, preferences, recipes_response = await asyncio.gather(
+        get_user_pantry_service_async(user_id, ctx),
+        get_user_preferences_service_async(user_id, ctx),
+        get_user_recipes_service_async(user_id, ctx),
+    )
+    return meal_plan_fingerprint(pantry_response["pantry"], preferences, recipes_response["suggested_recipes"])
+
+
+async def regenerate_meal_plan_async(user_id: str, fingerprint: str, ctx: RequestContext = None):
+    """Generate a fresh plan and store it under ``fingerprint``."""
+    meal_plan = await generate_meal_plan_service_async(user_id, ctx)
+    if meal_plan == "Error":
+        raise ValueError("Meal plan generation returned invalid JSON")
+
+    store_response = await store_user_meal_history_async(user_id, meal_plan, fingerprint)
+    if "error" in store_response:
+        raise RuntimeError(store_response["error"])
+    return meal_plan
+
+
+async def _regenerate_in_background(user_id: str, fingerprint: str, ctx: RequestContext):
+    try:
+        await regenerate_meal_plan_async(user_id, fingerprint, ctx)
+    except Exception as e:
+        logger.error("Background meal plan regeneration failed for %s: %s", user_id, e)
+    finally:
+        _regenerating.discard(user_id)
+
+
+async def _stored_meal_plan_async(user_id: str):
+    """The user's stored plan, including one still waiting in the write-behind buffer."""
+    return write_behind.pending_meal_plan(user_id) or await fetch_stored_meal_plan_async(user_id)
+
+
+async def get_meal_plan_service_async(user_id: str, background_tasks: BackgroundTasks, ctx: RequestContext = None):
+    """Serve the stored meal plan when its inputs are unchanged (stale-while-revalidate otherwise).
+
+    - fingerprint matches: return the stored plan, no LLM call
+    - fingerprint differs: return the stored plan now and regenerate in a background task
+    - nothing stored yet: generate inline
+
+    All three return the plan as a decoded object.
+    """
+    ctx = ctx or RequestContext()
+    stored, fingerprint = await asyncio.gather(
+        _stored_meal_plan_async(user_id),
+        meal_plan_fingerprint_async(user_id, ctx),
+    )
+
+    if stored is not None and stored.fingerprint == fingerprint:
+        return {"status": "success", "source": "cache", "meal_plan": stored.meal_plan}
+
+    if stored is not None:
+        if user_id not in _regenerating:
+            _regenerating.add(user_id)
+            background_tasks.add_task(_regenerate_in_background, user_id, fingerprint, ctx)
+        return {"status": "success", "source": "stale", "meal_plan": stored.meal_plan}
+
+    meal_plan = await regenerate_meal_plan_async(user_id, fingerprint, ctx)
+    return {"status": "success", "source": "generated", "meal_plan": decode_meal_plan(meal_plan)}
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def meal_plan_sse_events(user_id: str, ctx: RequestContext = None):
+    """Server-sent events for /meal_plans/{user_id}/stream.
+
+    Emits one ``day`` event per validated MealPlanDay (while the LLM is still
+    writing, with MEAL_PLANNER=llm), stores the finished plan (with its
+    fingerprint), then ``done``. Failures are reported as an ``error`` event
+    since the status line is already sent.
+    """
+    ctx = ctx or RequestContext()
+    try:
+        fingerprint = await meal_plan_fingerprint_async(user_id, ctx)
+        if MEAL_PLANNER != "llm":
+            content = await generate_meal_plan_service_async(user_id, ctx)
+            for day in MealPlan.model_validate_json(content).days:
+                yield _sse("day", day.model_dump_json())
+            await store_user_meal_history_async(user_id, content, fingerprint)
+            yield _sse("done", json.dumps({"status": "success"}))
+            return
+
+        content = None
+        async for event, payload in stream_meal_plan_service_async(user_id, ctx):
+            if event == "day":
+                yield _sse("day", payload.model_dump_json())
+            elif event == "invalid_day":
+                yield _sse("error", json.dumps({"error": payload}))
+            else:
+                content = payload
+
+        if not content or not is_valid_json(content):
+            yield _sse("error", json.dumps({"error": "Meal plan generation returned invalid JSON"}))
+            return
+
+        await store_user_meal_history_async(user_id, content, fingerprint)
+        yield _sse("done", json.dumps({"status": "success"}))
+    except Exception as e:
+        yield _sse("error", json.dumps({"error": str(e)}))
+
@@ -0,0 +1,208 @@
+from typing import Dict, List, Sequence
+
+from app.services.ingredients import contains_allergen, ingredient_terms
+from app.services.prompt_builder import MEAL_SLOTS, PLAN_DAYS
+
+# ✅ Deterministic meal planner: fills the PLAN_DAYS × MEAL_SLOTS grid from candidate
+# recipes by maximizing pantry coverage under the user's preferences, with no LLM call.
+# Allergies, dislikes and meat-free diets are hard constraints; effort level, slot fit,
+# favorite cuisines and variety are scored. A greedy fill is improved by local search.
+
+# TheMealDB categories that suit each slot (anything else is neutral)
+SLOT_CATEGORIES = {
+    "breakfast": {"breakfast"},
+    "lunch": {"starter", "side", "pasta", "vegetarian", "vegan", "miscellaneous"},
+    "dinner": {"beef", "chicken", "lamb", "pork", "seafood", "goat", "pasta", "vegetarian", "vegan"},
+}
+NON_MEAL_CATEGORIES = {"dessert"}
+MEAT_CATEGORIES = {"beef", "chicken", "lamb", "pork", "seafood", "goat"}
+MEAT_FREE_DIETS = {"vegetarian", "vegan"}
+
+# Most ingredients a recipe should need at each effort level (no limit otherwise)
+EFFORT_INGREDIENT_LIMITS = {"low": 6, "easy": 6, "quick": 6, "medium": 10, "moderate": 10}
+
+# Objective weights
+SLOT_FIT_WEIGHT = 0.3  # bonus for a suited category, penalty for breakfast/dessert in the wrong slot
+CUISINE_WEIGHT = 0.1  # favorite cuisine bonus
+EFFORT_PENALTY = 0.05  # per ingredient over the effort level's limit
+PREFERRED_SLOT_WEIGHT = 1.5  # slots in preferred_meal_types count this much more
+REPEAT_PENALTY = 0.5  # per extra use of a recipe in the plan
+SAME_DAY_PENALTY = 1.0  # per extra use of a recipe on one day
+MAX_SEARCH_ROUNDS = 50
+
+
+class NoFeasibleMealPlan(Exception):
+    """No candidate recipe satisfies the user's allergies and diet, so no plan can be made."""
+
+
+def allowed_recipe(recipe: dict, preferences, hard_dislikes: bool = True) -> bool:
+    """Whether ``recipe`` respects the user's allergies, dislikes and diet."""
+    ingredients = recipe.get("ingredients", [])
+    allergens = ingredient_terms(preferences.allergies or [])
+    # Without ingredients, allergen-free can't be known
+    if allergens and (not ingredients or contains_allergen(ingredients, allergens)):
+        return False
+    # Dislikes use the allergen rule too ("chicken" rules out "Chicken Thighs")
+    if hard_dislikes and contains_allergen(ingredients, ingredient_terms(preferences.dislikes or [])):
+        return False
+    diet = (preferences.diet or "").casefold()
+    return not (diet in MEAT_FREE_DIETS and (recipe.get("category") or "").casefold() in MEAT_CATEGORIES)
+
+
+def slot_score(recipe: dict, slot: str, preferences) -> float:
+    """Value of putting ``recipe`` in ``slot``, before repeat penalties."""
+    score = recipe.get("coverage", 0.0)
+    category = (recipe.get("category") or "").casefold()
+    if category in SLOT_CATEGORIES.get(slot, ()):
+        score += SLOT_FIT_WEIGHT
+    elif category in NON_MEAL_CATEGORIES or (category == "breakfast" and slot != "breakfast"):
+        score -= SLOT_FIT_WEIGHT
+    favorite_cuisines = {cuisine.casefold() for cuisine in preferences.favorite_cuisines or []}
+    if (recipe.get("cuisine") or "").casefold() in favorite_cuisines:
+        score += CUISINE_WEIGHT
+    limit = EFFORT_INGREDIENT_LIMITS.get((preferences.effort_level or "").casefold())
+    if limit is not None:
+        score -= EFFORT_PENALTY * max(0, len(recipe.get("ingredients", [])) - limit)
+    preferred = {meal_type.casefold() for meal_type in preferences.preferred_meal_types or []}
+    if slot in preferred and score > 0:
+        score *= PREFERRED_SLOT_WEIGHT
+    return score
+
+
+def _objective(assignment: List[int], scores: List[List[float]], slot_count: int) -> float:
+    total = 0.0
+    uses: Dict[int, int] = {}
+    day_uses: Dict[tuple, int] = {}
+    for cell, recipe in enumerate(assignment):
+        day, slot = divmod(cell, slot_count)
+        total += scores[slot][recipe]
+        total -= REPEAT_PENALTY * uses.get(recipe, 0) + SAME_DAY_PENALTY * day_uses.get((day, recipe), 0)
+        uses[recipe] = uses.get(recipe, 0) + 1
+        day_uses[(day, recipe)] = day_uses.get((day, recipe), 0) + 1
+    return total
+
+
+def _solve(scores: List[List[float]], days: int, slot_count: int) -> List[int]:
+    """Greedy fill (best-valued slots first), then first-improvement replace/swap moves.
+
+    Moves are valued by their change to ``_objective``, computed in O(1) from
+    per-recipe use counts, so a search round costs O(cells × (recipes + cells)).
+    """
+    recipe_count = len(scores[0])
+    cells = sorted(range(days * slot_count), key=lambda cell: (-max(scores[cell % slot_count]), cell))
+    assignment = [-1] * (days * slot_count)
+    uses = [0] * recipe_count
+    day_uses = [[0] * recipe_count for _ in range(days)]
+    for cell in cells:
+        day, slot = divmod(cell, slot_count)
+        best = max(
+            range(recipe_count),
+            key=lambda r: (scores[slot][r] - REPEAT_PENALTY * uses[r] - SAME_DAY_PENALTY * (day_uses[day][r] > 0), -r),
+        )
+        assignment[cell] = best
+        uses[best] += 1
+        day_uses[day][best] += 1
+
+    for _ in range(MAX_SEARCH_ROUNDS):
+        improved = False
+        for cell in range(len(assignment)):
+            day, slot = divmod(cell, slot_count)
+            for recipe in range(recipe_count):
+                current = assignment[cell]
+                if recipe == current:
+                    continue
+                delta = (
+                    scores[slot][recipe] - scores[slot][current]
+                    - REPEAT_PENALTY * (uses[recipe] - (uses[current] - 1))
+                    - SAME_DAY_PENALTY * (day_uses[day][recipe] - (day_uses[day][current] - 1))
+                )
+                if delta > 1e-9:
+                    assignment[cell] = recipe
+                    uses[current] -= 1
+                    uses[recipe] += 1
+                    day_uses[day][current] -= 1
+                    day_uses[day][recipe] += 1
+                    improved = True
+        for a in range(len(assignment)):
+            for b in range(a + 1, len(assignment)):
+                first, second = assignment[a], assignment[b]
+                if first == second:
+                    continue
+                (day_a, slot_a), (day_b, slot_b) = divmod(a, slot_count), divmod(b, slot_count)
+                delta = scores[slot_a][second] + scores[slot_b][first] - scores[slot_a][first] - scores[slot_b][second]
+                if day_a != day_b:
+                    # Total uses are unchanged; only the two days' counts move
+                    delta -= SAME_DAY_PENALTY * (
+                        day_uses[day_a][second] - (day_uses[day_a][first] - 1)
+                        + day_uses[day_b][first] - (day_uses[day_b][second] - 1)
+                    )
+                if delta > 1e-9:
+                    assignment[a], assignment[b] = second, first
+                    if day_a != day_b:
+                        day_uses[day_a][first] -= 1
+                        day_uses[day_a][second] += 1
+                        day_uses[day_b][second] -= 1
+                        day_uses[day_b][first] += 1
+                    improved = True
+        if not improved:
+            break
+    return assignment
+
+
+def _meal(recipe: dict) -> dict:
+    return {
+        "recipe_id": recipe.get("recipe_id"),
+        "name": recipe["recipe_name"],
+        "ingredients": recipe.get("ingredients", []),
+        "instructions": recipe.get("instructions"),
+        "image_url": recipe.get("image_url"),
+    }
+
+
+def plan_meals(candidates: List[dict], preferences, days: int = PLAN_DAYS,
+               slots: Sequence[str] = MEAL_SLOTS) -> List[dict]:
+    """MealPlanDay-shaped dicts for ``days`` × ``slots`` chosen from ``candidates``.
+
+    Candidates are suggested-recipe dicts with ``coverage`` and, when known,
+    ``category`` and ``cuisine``. Dislikes are relaxed (never allergies or
+    diet) only if no candidate satisfies them; with no allowed candidate at
+    all, NoFeasibleMealPlan is raised. The same inputs always give the same
+    plan.
+    """
+    pool = sorted(candidates, key=lambda recipe: str(recipe.get("recipe_id") or recipe["recipe_name"]))
+    allowed = [recipe for recipe in pool if allowed_recipe(recipe, preferences)]
+    if not allowed:
+        allowed = [recipe for recipe in pool if allowed_recipe(recipe, preferences, hard_dislikes=False)]
+    if not allowed:
+        raise NoFeasibleMealPlan(
+            f"No meal plan fits these preferences: none of the {len(pool)} candidate recipes "
+            "is free of the user's allergies and fits their diet"
+        )
+
+    scores = [[slot_score(recipe, slot, preferences) for recipe in allowed] for slot in slots]
+    assignment = _solve(scores, days, len(slots))
+    return [
+        {"day": day + 1, "meals": {slot: _meal(allowed[assignment[day * len(slots) + i]]) for i, slot in enumerate(slots)}}
+        for day in range(days)
+    ]
+
+
+def plan_quality(days: List[dict], candidates: List[dict], preferences) -> dict:
+    """Comparable quality numbers for any plan over ``candidates`` (used by the benchmark)."""
+    by_id = {recipe.get("recipe_id"): recipe for recipe in candidates}
+    meals = [meal for day in days for meal in day.get("meals", {}).values()]
+    slot_meals = [(slot, meal) for day in days for slot, meal in day.get("meals", {}).items()]
+    planned = [by_id.get(meal.get("recipe_id")) for meal in meals]
+    known = [recipe for recipe in planned if recipe is not None]
+    slot_fits = [
+        (by_id[meal.get("recipe_id")].get("category") or "").casefold() in SLOT_CATEGORIES.get(slot, ())
+        for slot, meal in slot_meals if meal.get("recipe_id") in by_id
+    ]
+    return {
+        "filled_slots": len(meals),
+        "distinct_recipes": len({meal.get("recipe_id") for meal in meals}),
+        "mean_coverage": round(sum(recipe.get("coverage", 0.0) for recipe in known) / len(known), 3) if known else 0.0,
+        "violations": sum(1 for recipe in known if not allowed_recipe(recipe, preferences)),
+        "slot_fit": round(sum(slot_fits) / len(slot_fits), 3) if slot_fits else 0.0,
+        "unknown_recipes": len(planned) - len(known),
+    }
@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def pantry_hash(pantry_text: str, model: str) -> str:
+    """Identifies the pantry text (and embedding model) a stored embedding was computed from."""
+    return hashlib.sha256(f"{model}\n{pantry_text}".encode("utf-8")).hexdigest()
+
+
+class PantryEmbeddingQueue:
+    """Background workers that recompute stored pantry embeddings.
+
+    ``enqueue`` is the change hook: it returns immediately, and a user already
+    waiting in the queue is not queued twice, so a burst of pantry edits costs
+    one recompute. ``refresh`` is the coroutine that does the work for one user.
+    """
+
+    def __init__(self, refresh: Callable[[str], Awaitable[None]], workers: int = 2, max_pending: int = 10000):
+        self.refresh = refresh
+        self.worker_count = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.pending = set()
+        self._workers: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+
+    def enqueue(self, user_id: str) -> bool:
+        """Schedule a recompute for ``user_id``; False if it was already pending or the queue is full."""
+        if user_id in self.pending:
+            return False
+        try:
+            self.queue.put_nowait(user_id)
+        except asyncio.QueueFull:
+            return False
+        self.pending.add(user_id)
+        return True
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    async def stop(self, timeout: Optional[float] = 10.0):
+        """Let queued recomputes finish (up to ``timeout`` seconds), then cancel the workers."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self):
+        while True:
+            user_id = await self.queue.get()
+            # Cleared before the work starts, so an edit during the recompute queues another pass
+            self.pending.discard(user_id)
+            try:
+                await self.refresh(user_id)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Pantry embedding refresh failed for %s: %s", user_id, e)
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {"pending": self.queue.qsize(), "processed": self.processed, "failed": self.failed, "workers": len(self._workers)}
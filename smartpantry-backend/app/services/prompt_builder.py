@@ -0,0 +1,150 @@
+import json
+import logging
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional
+
+from app.config import MEAL_PLAN_PROMPT_TOKEN_BUDGET
+
+if TYPE_CHECKING:
+    from llama_index.core.llms import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+MEAL_SLOTS = ("breakfast", "lunch", "dinner")
+PLAN_DAYS = 3
+
+SYSTEM_PROMPT = "You are a nutritionist generating meal plans. Reply with a single JSON object only."
+
+# The output schema, described once. The model only picks recipe ids; names,
+# ingredients, instructions and images are filled back in by rehydrate_meal_plan.
+OUTPUT_SCHEMA = (
+    '{"days": [{"day": 1, "meals": {"breakfast": {"recipe_id": "<id>"}, '
+    '"lunch": {"recipe_id": "<id>"}, "dinner": {"recipe_id": "<id>"}}}, ...]}'
+)
+
+# Per-message overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    """The model's tiktoken encoding, or None if tiktoken or its BPE file is unavailable.
+
+    Cached per model, so the fallback warning is logged once.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed; estimating %s prompt tokens as len(text) // 4", model)
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads BPE files on first use; offline, estimate instead of failing
+        logger.warning("No tiktoken encoding for %s (%s); estimating prompt tokens as len(text) // 4", model, e)
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Token count with the model's tokenizer (about 4 characters per token without tiktoken)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: List["ChatMessage"], model: str = "gpt-3.5-turbo") -> int:
+    return sum(count_tokens(message.content or "", model) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def compact_recipes(recipes: List[dict], max_ingredients: Optional[int] = None) -> List[dict]:
+    """Only what the planner needs to choose: id, name and ingredients."""
+    return [
+        {
+            "id": recipe["recipe_id"],
+            "name": recipe["recipe_name"],
+            "ingredients": recipe["ingredients"][:max_ingredients] if max_ingredients else recipe["ingredients"],
+        }
+        for recipe in recipes
+    ]
+
+
+def _user_prompt(preferences, recipes: List[dict]) -> str:
+    lines = [
+        f"Plan {PLAN_DAYS} days of {', '.join(MEAL_SLOTS)} using only these recipes (a recipe may repeat).",
+        f"Diet: {preferences.diet}. Effort level: {preferences.effort_level}.",
+        f"Dislikes: {', '.join(preferences.dislikes or []) or 'none'}.",
+        f"Preferred meal types: {', '.join(preferences.preferred_meal_types or []) or 'any'}.",
+        "Recipes (JSON): " + json.dumps(recipes, separators=(",", ":")),
+        "Output JSON: " + OUTPUT_SCHEMA,
+    ]
+    return "\n".join(lines)
+
+
+def build_meal_plan_messages(preferences, recipes: List[dict], model: str = "gpt-3.5-turbo",
+                             token_budget: int = MEAL_PLAN_PROMPT_TOKEN_BUDGET) -> List["ChatMessage"]:
+    """Compact meal planning prompt that fits ``token_budget`` input tokens.
+
+    ``recipes`` are the suggested recipes in score order. When the prompt is over
+    budget, ingredient lists are trimmed first, then the lowest-scored recipes are
+    dropped (keeping at least one).
+    """
+    from llama_index.core.llms import ChatMessage  # deferred: importing llama_index.core takes about a second
+
+    system = ChatMessage(role="system", content=SYSTEM_PROMPT)
+    candidates = list(recipes)
+    max_ingredients = None
+    while True:
+        messages = [system, ChatMessage(role="user", content=_user_prompt(preferences, compact_recipes(candidates, max_ingredients)))]
+        fully_trimmed = len(candidates) <= 1 and max_ingredients == 3
+        if count_message_tokens(messages, model) <= token_budget or fully_trimmed:
+            return messages
+        if max_ingredients is None or max_ingredients > 3:
+            max_ingredients = 8 if max_ingredients is None else max_ingredients - 1
+        elif len(candidates) > 1:
+            candidates.pop()
+
+
+NOTES_SYSTEM_PROMPT = "You are a nutritionist. Reply in plain text, at most three sentences."
+
+
+def build_meal_plan_notes_messages(days: List[dict]) -> List["ChatMessage"]:
+    """Prompt asking for prep and shopping tips on an already chosen plan (names only)."""
+    from llama_index.core.llms import ChatMessage
+
+    lines = [
+        f"Day {day['day']}: " + "; ".join(f"{slot} {meal['name']}" for slot, meal in day["meals"].items())
+        for day in days
+    ]
+    prompt = "Give short prep and shopping tips for this meal plan:\n" + "\n".join(lines)
+    return [ChatMessage(role="system", content=NOTES_SYSTEM_PROMPT), ChatMessage(role="user", content=prompt)]
+
+
+def rehydrate_meal_plan(plan: dict, recipes: List[dict], user_id: str) -> dict:
+    """Fill each meal's name, ingredients, instructions and image_url from its recipe_id."""
+    by_id = {recipe["recipe_id"]: recipe for recipe in recipes}
+    by_name = {recipe["recipe_name"].casefold(): recipe for recipe in recipes}
+    plan["user_id"] = user_id
+    for day in plan.get("days", []):
+        rehydrate_meal_plan_day(day, by_id, by_name)
+    return plan
+
+
+def rehydrate_meal_plan_day(day: dict, by_id: dict, by_name: dict) -> dict:
+    for slot, meal in list(day.get("meals", {}).items()):
+        if isinstance(meal, str):
+            meal = {"recipe_id": meal}
+        recipe = by_id.get(str(meal.get("recipe_id"))) or by_name.get(str(meal.get("name", "")).casefold())
+        if recipe is not None:
+            meal = {
+                "recipe_id": recipe["recipe_id"],
+                "name": recipe["recipe_name"],
+                "ingredients": recipe["ingredients"],
+                "instructions": recipe["instructions"],
+                "image_url": recipe["image_url"],
+            }
+        day["meals"][slot] = meal
+    return day
@@ -0,0 +1,159 @@
+import asyncio
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from app.config import (
+    RECEIPT_JOB_TTL,
+    RECEIPT_PARSER_RETRIES,
+    RECEIPT_PARSER_TIMEOUT,
+    RECEIPT_PARSER_URL,
+    RECEIPT_QUEUE_SIZE,
+    RECEIPT_WORKERS,
+)
+from app.services.llama_index_service import receipt_pantry_items, write_behind
+from app.services.write_behind import validate_user_id
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled (with jitter) after each one
+
+
+class ReceiptJob(BaseModel):
+    """Status of one receipt upload: queued → processing → saving → done | failed.
+
+    ``saving`` means the pantry rows are waiting in the write-behind buffer.
+    """
+    job_id: str
+    user_id: str
+    status: str = "queued"
+    store_name: Optional[str] = None
+    pantry_items: List[dict] = []
+    error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
+
+
+class ReceiptParserError(Exception):
+    pass
+
+
+class ReceiptJobQueue:
+    """Bounded queue of receipt uploads, parsed by a fixed pool of workers.
+
+    The workers share one pooled ``httpx.AsyncClient`` for the external parser.
+    Jobs live in memory for ``RECEIPT_JOB_TTL`` seconds after they finish.
+    """
+
+    def __init__(self, parser_url: str = RECEIPT_PARSER_URL, workers: int = RECEIPT_WORKERS,
+                 max_pending: int = RECEIPT_QUEUE_SIZE, retries: int = RECEIPT_PARSER_RETRIES):
+        self.parser_url = parser_url
+        self.worker_count = workers
+        self.retries = retries
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.jobs: Dict[str, ReceiptJob] = {}
+        self.client: Optional[httpx.AsyncClient] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        if self._workers:
+            return
+        # RECEIPT_PARSER_URL=fake answers in-process instead of calling the parser service
+        transport = None
+        if self.parser_url == "fake":
+            from app.services.fakes import FAKE_RECEIPT_PARSER_URL, fake_receipt_transport
+            self.parser_url, transport = FAKE_RECEIPT_PARSER_URL, fake_receipt_transport()
+        self.client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(RECEIPT_PARSER_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=self.worker_count, max_keepalive_connections=self.worker_count),
+        )
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def submit(self, user_id: str, filename: str, content: bytes, content_type: str) -> ReceiptJob:
+        """Queue an upload and return its job.
+
+        Raises ValueError for a user_id the pantry can't store and asyncio.QueueFull when the queue is full.
+        """
+        validate_user_id(user_id)
+        self._evict_finished()
+        job = ReceiptJob(job_id=uuid.uuid4().hex, user_id=user_id, created_at=time.time())
+        self.queue.put_nowait((job, (filename, content, content_type)))
+        self.jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ReceiptJob]:
+        return self.jobs.get(job_id)
+
+    def _evict_finished(self):
+        cutoff = time.time() - RECEIPT_JOB_TTL
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def _work(self):
+        while True:
+            job, upload = await self.queue.get()
+            job.status = "processing"
+            try:
+                await self._process(job, upload)
+            except Exception as e:
+                _finish(job, "failed", str(e))
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, job: ReceiptJob, upload):
+        result = await self._parse(upload)
+        receipt_data = result.get("receipt_data", {})
+        job.store_name = receipt_data.get("store_name", "Unknown Store")
+        job.pantry_items = await asyncio.to_thread(receipt_pantry_items, receipt_data, job.user_id)
+
+        # Merged with other buffered purchases and upserted in the next bulk flush,
+        # which also queues the pantry embedding refresh; the job is done once the rows are written
+        job.status = "saving"
+        saved = write_behind.add_pantry_items(job.pantry_items)
+        saved.add_done_callback(lambda future: _saved(job, future))
+
+    async def _parse(self, upload) -> dict:
+        """POST the image to the parser, retrying timeouts, 429 and 5xx with jittered exponential backoff."""
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = await self.client.post(self.parser_url, files={"file": upload})
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if last_attempt:
+                    raise ReceiptParserError(f"Receipt parser unreachable: {e!r}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    if response.is_error:
+                        raise ReceiptParserError(f"HTTP error: {response.status_code} - {response.text}")
+                    return response.json()
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def _saved(job: ReceiptJob, future: asyncio.Future):
+    error = future.exception()
+    if error is not None:
+        _finish(job, "failed", str(error))
+    else:
+        _finish(job, "done")
+
+
+def _finish(job: ReceiptJob, status: str, error: Optional[str] = None):
+    job.status = status
+    job.error = error
+    job.finished_at = time.time()
+
+
+receipt_job_queue = ReceiptJobQueue()
@@ -0,0 +1,153 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from app.config import RECIPE_DETAIL_CACHE_SIZE, RECIPE_DETAIL_PATH
+
+# ✅ Recipe details live in a local id-keyed SQLite file filled at ingest time, so
+# vector queries only return ids and scores and the vector metadata carries just
+# what metadata filters need
+
+DETAIL_FIELDS = ("name", "category", "cuisine", "ingredients", "instructions", "image_url")
+FILTER_FIELDS = ("ingredient_tokens", "category", "cuisine")
+
+SQLITE_MAX_VARIABLES = 500  # ids per ``IN (...)`` lookup
+
+
+def split_recipe_metadata(metadata: dict) -> Tuple[dict, dict]:
+    """Full recipe metadata (insert_pc.transform_recipe shape) → (detail row, slim vector metadata)."""
+    details = {field: metadata[field] for field in DETAIL_FIELDS if metadata.get(field) is not None}
+    slim = {field: metadata[field] for field in FILTER_FIELDS if metadata.get(field) is not None}
+    return details, slim
+
+
+def _decode_row(values, columns: Sequence[str] = DETAIL_FIELDS) -> dict:
+    row = {field: value for field, value in zip(columns, values) if value is not None}
+    if "ingredients" in row:
+        row["ingredients"] = json.loads(row["ingredients"])
+    return row
+
+
+class RecipeDetailStore:
+    """Recipe details by recipe_id in SQLite, behind an in-process LRU of decoded rows.
+
+    ``get_many`` hydrates a whole result page with one ``IN (...)`` query for
+    the ids the LRU doesn't hold. The LRU only holds whole rows: a call
+    asking for some ``fields`` reads just those columns for its misses and
+    doesn't cache them.
+    """
+
+    def __init__(self, path: str, cache_size: int = 2048):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recipe_details ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"  # bumped on every write, so readers can catch up
+            " recipe_id TEXT NOT NULL UNIQUE,"
+            " name TEXT,"
+            " category TEXT,"
+            " cuisine TEXT,"
+            " ingredients TEXT NOT NULL,"
+            " instructions TEXT,"
+            " image_url TEXT)"
+        )
+        self._conn.commit()
+
+    def put_many(self, details: Dict[str, dict]):
+        """Insert or replace the detail rows for ``{recipe_id: details}``."""
+        rows = [
+            (
+                recipe_id, record.get("name"), record.get("category"), record.get("cuisine"),
+                json.dumps(record.get("ingredients") or []), record.get("instructions"), record.get("image_url"),
+            )
+            for recipe_id, record in details.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO recipe_details"
+                " (recipe_id, name, category, cuisine, ingredients, instructions, image_url)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            for recipe_id in details:
+                self._cache.pop(recipe_id, None)
+
+    def get_many(self, recipe_ids: Iterable[str], fields: Optional[Sequence[str]] = None, cache: bool = True) -> Dict[str, dict]:
+        """recipe_id -> details (only ``fields``, if given) for the ids the store holds.
+
+        ``cache=False`` leaves the LRU alone, for one-off scans over the catalog.
+        """
+        columns = DETAIL_FIELDS if fields is None else tuple(field for field in DETAIL_FIELDS if field in fields)
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        found: Dict[str, dict] = {}
+        with self._lock:
+            for recipe_id in recipe_ids:
+                row = self._cache.get(recipe_id)
+                if row is not None:
+                    self._cache.move_to_end(recipe_id)
+                    found[recipe_id] = row
+            missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in found]
+            if cache:
+                self.hits += len(found)
+                self.misses += len(missing)
+
+            for start in range(0, len(missing), SQLITE_MAX_VARIABLES):
+                chunk = missing[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ", ".join("?" * len(chunk))
+                for recipe_id, *values in self._conn.execute(
+                    f"SELECT recipe_id, {', '.join(columns or ('recipe_id',))} FROM recipe_details WHERE recipe_id IN ({placeholders})",
+                    chunk,
+                ):
+                    row = found[recipe_id] = _decode_row(values, columns)
+                    if cache and fields is None:  # partial rows never enter the LRU
+                        self._cache[recipe_id] = row
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        if fields is None:
+            return found
+        return {recipe_id: {field: row[field] for field in columns if field in row} for recipe_id, row in found.items()}
+
+    def changes_since(self, seq: int = 0) -> Tuple[int, Dict[str, dict]]:
+        """(latest seq, recipe_id -> details) for rows written after ``seq``; 0 reads the whole store."""
+        changed: Dict[str, dict] = {}
+        with self._lock:
+            for row_seq, recipe_id, *values in self._conn.execute(
+                f"SELECT seq, recipe_id, {', '.join(DETAIL_FIELDS)} FROM recipe_details WHERE seq > ? ORDER BY seq",
+                (seq,),
+            ):
+                changed[recipe_id] = _decode_row(values)
+                seq = row_seq
+        return seq, changed
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM recipe_details").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_recipe_details() -> RecipeDetailStore:
+    """The recipe detail store at RECIPE_DETAIL_PATH."""
+    return RecipeDetailStore(RECIPE_DETAIL_PATH, RECIPE_DETAIL_CACHE_SIZE)
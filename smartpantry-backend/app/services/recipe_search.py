@@ -0,0 +1,259 @@
+import asyncio
+import bisect
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import RECIPE_SEARCH_REFRESH_INTERVAL
+from app.services.recipe_details import get_recipe_details
+
+logger = logging.getLogger(__name__)
+
+# ✅ In-process keyword search: BM25 over the recipe detail store, no embedding call
+
+# Term-frequency weight of each recipe field (a name match counts double)
+FIELD_WEIGHTS = {"name": 2.0, "cuisine": 1.0, "category": 1.0, "ingredients": 1.0}
+
+# Share of dead (re-indexed) documents that triggers a postings compaction on refresh
+COMPACT_DEAD_RATIO = 0.25
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of ``text``."""
+    return _TOKEN.findall(text.casefold())
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: each id scores ``sum(1 / (k + rank))`` over the lists it appears in."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, recipe_id in enumerate(ranking, start=1):
+            scores[recipe_id] = scores.get(recipe_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class RecipeSearchIndex:
+    """BM25 inverted index over recipe name, cuisine, category and ingredients.
+
+    Each term's postings are two compact arrays (int32 document numbers and
+    float32 weighted term frequencies) that only ever grow, so adding recipes
+    is incremental. Re-adding a recipe appends a new document and marks the old
+    one dead; IDF uses per-term counts of live documents, and ``compact``
+    drops dead documents from the postings. With ``prefix=True`` the last
+    query term also matches every vocabulary term it prefixes (best match per
+    recipe), for type-ahead.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_expansions: int = 64):
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        self.seq = 0  # detail store position this index has caught up to
+        self.refreshed_at = 0.0
+        self._doc_ids: List[str] = []  # document number -> recipe_id
+        self._docs: Dict[str, int] = {}  # recipe_id -> live document number
+        self._lengths = array("f")
+        self._live = bytearray()
+        self._total_length = 0.0
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_freqs: Dict[str, int] = {}  # term -> live documents containing it
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}  # recipe_id -> terms of its live document
+        self._terms: List[str] = []  # sorted vocabulary for prefix lookups, rebuilt after new terms
+        self._terms_stale = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ✅ Writes --------------------------------------------------------------
+
+    def add(self, recipe_id: str, recipe: dict):
+        """Index (or re-index) one recipe's details."""
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            value = recipe.get(field)
+            for text in value if isinstance(value, list) else [value] if value else []:
+                for token in tokenize(text):
+                    weights[token] += weight
+        length = sum(weights.values())
+
+        with self._lock:
+            previous = self._docs.get(recipe_id)
+            if previous is not None:
+                self._live[previous] = 0
+                self._total_length -= self._lengths[previous]
+                for term in self._doc_terms[recipe_id]:
+                    self._doc_freqs[term] -= 1
+                    if not self._doc_freqs[term]:
+                        del self._doc_freqs[term]
+            doc = len(self._doc_ids)
+            self._doc_ids.append(recipe_id)
+            self._docs[recipe_id] = doc
+            self._lengths.append(length)
+            self._live.append(1)
+            self._total_length += length
+            self._doc_terms[recipe_id] = tuple(weights)
+            for term, frequency in weights.items():
+                self._doc_freqs[term] = self._doc_freqs.get(term, 0) + 1
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("i"), array("f"))
+                    self._terms_stale = True
+                postings[0].append(doc)
+                postings[1].append(frequency)
+
+    def add_many(self, recipes: Dict[str, dict]):
+        for recipe_id, recipe in recipes.items():
+            self.add(recipe_id, recipe)
+
+    def refresh(self, details) -> int:
+        """Index rows written to the detail store since the last refresh; returns how many."""
+        seq, changed = details.changes_since(self.seq)
+        self.add_many(changed)
+        self.seq = seq
+        self.refreshed_at = time.monotonic()
+        if len(self._doc_ids) - len(self._docs) > COMPACT_DEAD_RATIO * len(self._doc_ids):
+            self.compact()
+        return len(changed)
+
+    def compact(self):
+        """Drop dead documents from the postings and renumber the live ones."""
+        with self._lock:
+            live = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+            renumbered = (np.cumsum(live) - 1).astype(np.int32)
+            postings = {}
+            for term, (docs, frequencies) in self._postings.items():
+                docs = np.frombuffer(docs, dtype=np.int32)
+                kept = live[docs]
+                if kept.any():
+                    postings[term] = (
+                        array("i", renumbered[docs[kept]].tobytes()),
+                        array("f", np.frombuffer(frequencies, dtype=np.float32)[kept].tobytes()),
+                    )
+            self._postings = postings
+            self._terms_stale = True
+            self._doc_ids = [recipe_id for recipe_id, alive in zip(self._doc_ids, live) if alive]
+            self._docs = {recipe_id: doc for doc, recipe_id in enumerate(self._doc_ids)}
+            self._lengths = array("f", np.frombuffer(self._lengths, dtype=np.float32)[live].tobytes())
+            self._live = bytearray(b"\x01" * len(self._doc_ids))
+
+    # ✅ Reads ---------------------------------------------------------------
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Vocabulary terms starting with ``prefix`` (at most ``max_expansions``)."""
+        if self._terms_stale:
+            self._terms = sorted(self._postings)
+            self._terms_stale = False
+        start = bisect.bisect_left(self._terms, prefix)
+        expansions = []
+        for term in self._terms[start:]:
+            if not term.startswith(prefix) or len(expansions) == self.max_expansions:
+                break
+            if term in self._doc_freqs:  # skip terms only dead documents still hold
+                expansions.append(term)
+        return expansions
+
+    def search(self, query: str, k: int = 10, prefix: bool = True) -> List[Tuple[str, float]]:
+        """Top ``k`` (recipe_id, BM25 score) for ``query``; any query term may match."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k < 1:
+            return []
+
+        with self._lock:
+            if not self._docs:
+                return []
+            scores = self._scores(terms, prefix)
+            matched = np.flatnonzero(scores > 0)
+            if len(matched) > k:
+                matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            order = matched[np.argsort(-scores[matched], kind="stable")]
+            return [(self._doc_ids[doc], float(scores[doc])) for doc in order]
+
+    def _scores(self, terms: List[str], prefix: bool) -> np.ndarray:
+        # Runs under the lock: the buffer views below must be gone before an append resizes the arrays
+        doc_count = len(self._docs)
+        lengths = np.frombuffer(self._lengths, dtype=np.float32)
+        norms = self.k1 * (1 - self.b + self.b * lengths / (self._total_length / doc_count))
+        scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+
+        groups = [[term] for term in terms[:-1]]
+        groups.append(self._expand(terms[-1]) if prefix else [terms[-1]])
+        for group in groups:
+            best = np.zeros_like(scores)
+            for term in group:
+                postings = self._postings.get(term)
+                doc_freq = self._doc_freqs.get(term)
+                if postings is None or not doc_freq:
+                    continue
+                docs = np.frombuffer(postings[0], dtype=np.int32)
+                frequencies = np.frombuffer(postings[1], dtype=np.float32)
+                idf = math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+                contribution = idf * frequencies * (self.k1 + 1) / (frequencies + norms[docs])
+                best[docs] = np.maximum(best[docs], contribution)
+            scores += best
+        return scores * np.frombuffer(self._live, dtype=np.uint8)
+
+    def stats(self) -> dict:
+        return {"recipes": len(self._docs), "documents": len(self._doc_ids), "terms": len(self._doc_freqs), "seq": self.seq}
+
+
+_search_index: Optional[RecipeSearchIndex] = None
+_search_index_lock = threading.Lock()
+
+
+def get_recipe_search_index() -> RecipeSearchIndex:
+    """The process-wide search index, built from the recipe detail store on first use.
+
+    The app builds it at startup, off the event loop, and ``search_index_refresher``
+    picks up recipes ingested later (insert_pc writes the detail store). If the
+    store can't be read, the index starts empty and the refresher retries.
+    """
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                index = RecipeSearchIndex()
+                try:
+                    index.refresh(get_recipe_details())
+                except Exception as e:
+                    logger.error("Could not build the recipe search index: %s", e)
+                _search_index = index
+    return _search_index
+
+
+class SearchIndexRefresher:
+    """Background task that catches the search index up with the detail store every ``interval`` seconds."""
+
+    def __init__(self, interval: float = RECIPE_SEARCH_REFRESH_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(lambda: get_recipe_search_index().refresh(get_recipe_details()))
+            except Exception as e:
+                logger.warning("Could not refresh the recipe search index: %s", e)
+
+
+search_index_refresher = SearchIndexRefresher()
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from typing import Any, Callable, Hashable
+
+
+class RequestContext:
+    """Memoizing loader shared by the service functions handling one request.
+
+    Each ``(kind, key)`` pair is loaded at most once, so composite endpoints
+    (grocery list, meal plan) reuse the pantry, preferences, embedding and
+    vector query that an earlier step already fetched.
+
+    ``cacheable`` turns False once a step used an input older than the
+    user's pantry revision (a stale pantry embedding); results derived in
+    this request are then not stored in ``derived_cache``.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+        self.cacheable = True
+
+    def load(self, key: Hashable, loader: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+        value = loader(*args)
+        with self._lock:
+            return self._values.setdefault(key, value)
+
+    async def load_async(self, key: Hashable, loader: Callable[..., Any], *args) -> Any:
+        """Async variant: concurrent awaiters of the same key share one task."""
+        task = self._values.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader(*args))
+            self._values[key] = task
+        return await task
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._values
+
+
+def get_request_context() -> RequestContext:
+    """FastAPI dependency: a fresh context per HTTP request."""
+    return RequestContext()
@@ -0,0 +1,91 @@
+from typing import Any, Iterable, List, Optional, TypedDict
+
+import orjson
+from starlette.responses import JSONResponse
+
+# ✅ Shapes of the service-layer results. They stay plain dicts (orjson serializes
+# them directly, with no pydantic pass); these TypedDicts document and type-check them.
+
+
+class PantryEntry(TypedDict):
+    ingredient: str
+    quantity: float
+    unit: str
+
+
+class PantryResponse(TypedDict):
+    user_id: str
+    pantry: List[PantryEntry]
+
+
+class _SuggestedRecipeBase(TypedDict):
+    recipe_id: str
+    recipe_name: str
+    score: float
+    ingredients: List[str]
+    instructions: Optional[str]
+    image_url: Optional[str]
+
+
+class SuggestedRecipe(_SuggestedRecipeBase, total=False):
+    coverage: float  # ranking=coverage|hybrid
+    missing_count: int
+
+
+class RecipesResponse(TypedDict):
+    user_id: str
+    suggested_recipes: List[SuggestedRecipe]
+
+
+class RecipeSearchResponse(TypedDict):
+    query: str
+    mode: str
+    recipes: List[SuggestedRecipe]
+
+
+class RecipeMissingIngredients(TypedDict):
+    recipe_name: str
+    missing_ingredients: List[str]
+
+
+class GroceryItem(TypedDict):
+    ingredient: str
+    count: int
+
+
+class GroceryListResponse(TypedDict):
+    user_id: str
+    fully_makable_recipes: List[str]
+    recipes_with_missing_ingredients: List[RecipeMissingIngredients]
+    consolidated_grocery_list: List[GroceryItem]
+
+
+class OrjsonResponse(JSONResponse):
+    """JSON response rendered by orjson straight from dicts/lists (numpy scalars included)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+RECIPE_FIELDS = frozenset(SuggestedRecipe.__annotations__)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """``?fields=recipe_name,score,image_url`` -> the known recipe fields requested (None = all)."""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",")]
+    unknown = [field for field in requested if field not in RECIPE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown recipe fields: {', '.join(unknown)}")
+    return requested
+
+
+def project_recipes(response: RecipesResponse, fields: Optional[Iterable[str]], key: str = "suggested_recipes") -> dict:
+    """Copy of a recipes response keeping only ``fields`` of each recipe in ``response[key]`` (the cached result is shared)."""
+    if fields is None or key not in response:
+        return response
+    return {
+        **response,
+        key: [{field: recipe[field] for field in fields if field in recipe} for recipe in response[key]],
+    }
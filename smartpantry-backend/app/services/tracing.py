@@ -0,0 +1,233 @@
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app.config import TRACING_ENABLED
+
+# ✅ Per-stage latency: every stage feeds an in-process histogram (exported at /metrics),
+# the current request's Server-Timing header, and an OpenTelemetry span when the
+# opentelemetry package is installed. With TRACING_ENABLED=false, `traced` returns the
+# function unchanged and `stage` is a shared no-op context manager.
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class StageHistogram:
+    """Cumulative-bucket latency histogram per stage name."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self._counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            counts = self._counts.get(name)
+            if counts is None:
+                counts = self._counts[name] = [0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[name] += seconds
+
+    def snapshot(self) -> Dict[str, Tuple[List[int], float]]:
+        """stage -> (per-bucket counts incl. +Inf, sum of seconds)."""
+        with self._lock:
+            return {name: (list(counts), self._sums[name]) for name, counts in self._counts.items()}
+
+
+class TokenCounter:
+    """Running totals of tokens sent to / received from OpenAI, by stage, model and kind."""
+
+    def __init__(self):
+        self._totals: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, model: str, kind: str, tokens: Optional[int]):
+        if tokens:
+            with self._lock:
+                self._totals[(stage, model, kind)] += int(tokens)
+
+    def snapshot(self) -> Dict[Tuple[str, str, str], int]:
+        with self._lock:
+            return dict(self._totals)
+
+
+stage_histogram = StageHistogram()
+token_counter = TokenCounter()
+
+# Stage timings of the request being handled, for its Server-Timing header
+_request_timings: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def _get_tracer():
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    return trace.get_tracer("smartpantry")
+
+
+_tracer = _get_tracer() if TRACING_ENABLED else None
+
+
+def _record(name: str, seconds: float):
+    stage_histogram.observe(name, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def _stage(name: str):
+    started = time.perf_counter()
+    if _tracer is None:
+        try:
+            yield
+        finally:
+            _record(name, time.perf_counter() - started)
+        return
+    with _tracer.start_as_current_span(name):
+        try:
+            yield
+        finally:
+            _record(name, time.perf_counter() - started)
+
+
+class _NoopStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage (``with stage("vector_query"): ...``)."""
+    return _stage(name) if TRACING_ENABLED else _NOOP_STAGE
+
+
+def traced(name: str):
+    """Decorator form of ``stage`` for sync and async functions."""
+    def decorate(func):
+        if not TRACING_ENABLED:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_tokens(stage_name: str, model: str, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+    """Add a call's token usage to the /metrics counters."""
+    if TRACING_ENABLED:
+        token_counter.add(stage_name, model, "prompt", prompt_tokens)
+        token_counter.add(stage_name, model, "completion", completion_tokens)
+
+
+def record_embedding_usage(response, model: str):
+    """Token usage of an ``embeddings.create`` response, if it reports one."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record_tokens("embedding", model, prompt_tokens=getattr(usage, "prompt_tokens", None))
+
+
+def record_chat_usage(response, model: str):
+    """Token usage of a LlamaIndex ChatResponse (the OpenAI LLM puts the counts in additional_kwargs)."""
+    counts = getattr(response, "additional_kwargs", None) or {}
+    record_tokens("llm", model, counts.get("prompt_tokens"), counts.get("completion_tokens"))
+
+
+# ✅ Exposition -------------------------------------------------------------
+
+def _format_le(bound: float) -> str:
+    return f"{bound:g}"
+
+
+def prometheus_metrics() -> str:
+    """Stage histograms and token counters in the Prometheus text format."""
+    lines = [
+        "# HELP smartpantry_stage_duration_seconds Time spent in each pipeline stage.",
+        "# TYPE smartpantry_stage_duration_seconds histogram",
+    ]
+    for name, (counts, total) in sorted(stage_histogram.snapshot().items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, counts):
+            cumulative += count
+            lines.append(f'smartpantry_stage_duration_seconds_bucket{{stage="{name}",le="{_format_le(bound)}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'smartpantry_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {cumulative}')
+        lines.append(f'smartpantry_stage_duration_seconds_sum{{stage="{name}"}} {total:.6f}')
+        lines.append(f'smartpantry_stage_duration_seconds_count{{stage="{name}"}} {cumulative}')
+
+    lines += [
+        "# HELP smartpantry_openai_tokens_total Tokens sent to (prompt) and received from (completion) OpenAI.",
+        "# TYPE smartpantry_openai_tokens_total counter",
+    ]
+    for (name, model, kind), tokens in sorted(token_counter.snapshot().items()):
+        lines.append(f'smartpantry_openai_tokens_total{{stage="{name}",model="{model}",kind="{kind}"}} {tokens}')
+    return "\n".join(lines) + "\n"
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    """``Server-Timing`` value: each stage's summed duration (ms) and call count, plus the total."""
+    durations: Dict[str, float] = defaultdict(float)
+    calls: Dict[str, int] = defaultdict(int)
+    for name, seconds in timings:
+        durations[name] += seconds
+        calls[name] += 1
+    parts = [f'{name};dur={durations[name] * 1000:.1f};desc="x{calls[name]}"' for name in durations]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware collecting the stages run for each request into a Server-Timing header.
+
+    The header goes out with the response start, so streamed responses only
+    report the stages that finished before their first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = []
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = server_timing_header(timings, time.perf_counter() - started)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
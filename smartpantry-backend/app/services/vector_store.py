@@ -0,0 +1,421 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+class RecipeVectorStore(ABC):
+    """Recipe vector index with the subset of Pinecone's Index API the app uses.
+
+    ``query`` returns ``{"matches": [{"id", "score", "metadata"}, ...]}`` so
+    ``get_user_recipes_service`` works unchanged against any backend.
+    """
+
+    @abstractmethod
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = True, filter: Optional[dict] = None, **kwargs):
+        ...
+
+    @abstractmethod
+    def upsert(self, vectors: List[dict], **kwargs):
+        ...
+
+    @abstractmethod
+    def fetch(self, ids: List[str], **kwargs):
+        ...
+
+    @abstractmethod
+    def list(self, limit: int = 100, **kwargs) -> Iterator[List[str]]:
+        """Yield pages of stored vector ids."""
+
+    def build_index(self):
+        """Bring search structures up to date after a run of upserts (no-op for remote stores)."""
+
+    def save(self, path: Optional[str] = None):
+        """Persist upserts made since the last save (no-op for stores that persist on write)."""
+
+
+class PineconeRecipeStore(RecipeVectorStore):
+    """Thin pass-through to a remote Pinecone index."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def query(self, vector, top_k=10, include_metadata=True, filter=None, **kwargs):
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, filter=filter, **kwargs)
+
+    def upsert(self, vectors, **kwargs):
+        return self.index.upsert(vectors=vectors, **kwargs)
+
+    def fetch(self, ids, **kwargs):
+        return self.index.fetch(ids=ids, **kwargs)
+
+    def list(self, limit=100, **kwargs):
+        return self.index.list(limit=limit, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+class LocalRecipeStore(RecipeVectorStore):
+    """In-process cosine index over a NumPy matrix, persisted as memory-mapped files.
+
+    Vectors are L2-normalized on insert so cosine similarity is a dot product.
+    ``dtype`` picks the storage precision: float32, float16 (half the memory)
+    or int8 (a quarter, with one float32 scale per row). Metadata is kept
+    column-wise (one list per field) next to the matrix. Metadata filters are
+    answered from per-field inverted indexes of packed bitsets (value -> rows
+    holding it), built on first use and dropped on every write.
+
+    ``upsert`` only changes memory: rows go into buffers that grow
+    geometrically, so chunked ingest stays linear. The approximate index is
+    rebuilt by ``build_index`` (or lazily by the next query) and nothing
+    reaches disk until ``save``.
+
+    ``index_type="exact"`` scans every row; ``"ivf"`` clusters rows with
+    k-means and only scans the ``nprobe`` nearest clusters; ``"hnsw"`` uses
+    hnswlib when it is installed.
+    """
+
+    SCAN_BLOCK = 8192  # rows up-cast to float32 at a time for float16/int8 storage
+
+    def __init__(self, dimension: int = 1536, dtype: str = "float32", path: Optional[str] = None,
+                 index_type: str = "exact", nlist: int = 64, nprobe: int = 8):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        if index_type not in ("exact", "ivf", "hnsw"):
+            raise ValueError(f"Unsupported index type: {index_type}")
+        self.dimension = dimension
+        self.dtype = dtype
+        self.path = path
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._vectors = np.zeros((0, dimension), dtype=np.dtype(dtype))  # rows past len(self._ids) are spare capacity
+        self._scale_buffer = np.ones(0, dtype=np.float32)  # only used for int8
+        self._columns: Dict[str, list] = {}
+        self._ann = None
+        self._ann_stale = False
+        self._bitsets: Dict[str, Dict[object, np.ndarray]] = {}
+        self._lock = threading.RLock()
+
+    # ✅ Persistence ---------------------------------------------------------
+
+    @classmethod
+    def open(cls, path: str, **kwargs) -> "LocalRecipeStore":
+        """Load a store saved under ``path`` (matrix memory-mapped read-only), or start an empty one."""
+        store = cls(path=path, **kwargs)
+        manifest_path = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return store
+
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        store.dimension = manifest["dimension"]
+        store.dtype = manifest["dtype"]
+        store._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        store._scale_buffer = np.load(os.path.join(path, "scales.npy"))
+        with open(os.path.join(path, "ids.json")) as f:
+            store._ids = json.load(f)
+        with open(os.path.join(path, "metadata.json")) as f:
+            store._columns = json.load(f)
+        store._positions = {recipe_id: i for i, recipe_id in enumerate(store._ids)}
+        store.build_index()
+        return store
+
+    def save(self, path: Optional[str] = None):
+        """Write the store to ``path`` (default: where it was opened); each file is swapped in atomically.
+
+        A store with neither is in-memory only, and saving it does nothing.
+        """
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self._write_atomic(path, "vectors.npy", lambda f: np.save(f, np.ascontiguousarray(self._matrix)))
+            self._write_atomic(path, "scales.npy", lambda f: np.save(f, self._scales))
+            self._write_atomic(path, "ids.json", lambda f: f.write(json.dumps(self._ids).encode()))
+            self._write_atomic(path, "metadata.json", lambda f: f.write(json.dumps(self._columns).encode()))
+            manifest = {"dimension": self.dimension, "dtype": self.dtype, "count": len(self._ids)}
+            self._write_atomic(path, "manifest.json", lambda f: f.write(json.dumps(manifest).encode()))
+
+    @property
+    def _matrix(self) -> np.ndarray:
+        return self._vectors[:len(self._ids)]
+
+    @property
+    def _scales(self) -> np.ndarray:
+        return self._scale_buffer[:len(self._ids)]
+
+    @staticmethod
+    def _write_atomic(path: str, name: str, write):
+        tmp_path = os.path.join(path, f".{name}.tmp")
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, os.path.join(path, name))
+
+    # ✅ Writes --------------------------------------------------------------
+
+    def upsert(self, vectors: List[dict], **kwargs):
+        """Insert or replace ``{"id", "values", "metadata"}`` records (Pinecone's upsert shape)."""
+        vectors = list({record["id"]: record for record in vectors}.values())  # last write wins
+        if not vectors:
+            return {"upserted_count": 0}
+
+        with self._lock:
+            values = np.asarray([record["values"] for record in vectors], dtype=np.float32)
+            if values.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-d vectors, got {values.shape[1]}-d")
+            encoded, scales = self._encode(values)
+
+            new = sum(record["id"] not in self._positions for record in vectors)
+            self._reserve(new)
+            for record, row, scale in zip(vectors, encoded, scales):
+                position = self._positions.get(record["id"])
+                if position is None:
+                    position = len(self._ids)
+                    self._positions[record["id"]] = position
+                    self._ids.append(record["id"])
+                    for column in self._columns.values():
+                        column.append(None)
+                self._vectors[position] = row
+                self._scale_buffer[position] = scale
+                self._set_metadata(position, record.get("metadata") or {})
+
+            self._bitsets = {}
+            self._ann_stale = self.index_type != "exact"
+        return {"upserted_count": len(vectors)}
+
+    def _reserve(self, rows: int):
+        """Room for ``rows`` more vectors: buffers double when full (and leave a read-only memory map on first write)."""
+        count = len(self._ids)
+        if count + rows <= len(self._vectors) and self._vectors.flags.writeable:
+            return
+        capacity = max(count + rows, 2 * count, 64)
+        vectors = np.empty((capacity, self.dimension), dtype=self._vectors.dtype)
+        vectors[:count] = self._vectors[:count]
+        scales = np.ones(capacity, dtype=np.float32)
+        scales[:count] = self._scale_buffer[:count]
+        self._vectors = vectors
+        self._scale_buffer = scales
+
+    def build_index(self):
+        """Rebuild the approximate index over the current rows (queries do this lazily after upserts)."""
+        with self._lock:
+            self._build_ann()
+            self._ann_stale = False
+
+    def _set_metadata(self, position: int, metadata: dict):
+        for field, value in metadata.items():
+            column = self._columns.setdefault(field, [None] * len(self._ids))
+            column[position] = value
+        for field, column in self._columns.items():
+            if field not in metadata:
+                column[position] = None
+
+    def _encode(self, values: np.ndarray):
+        """Normalize rows and convert them to the storage dtype."""
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        values = values / norms
+        if self.dtype == "int8":
+            scales = np.abs(values).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(values / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return values.astype(self.dtype), np.ones(len(values), dtype=np.float32)
+
+    # ✅ Reads ---------------------------------------------------------------
+
+    def fetch(self, ids: List[str], **kwargs):
+        """Return stored records for ``ids`` that exist (Pinecone's fetch shape)."""
+        vectors = {}
+        with self._lock:
+            for recipe_id in ids:
+                position = self._positions.get(recipe_id)
+                if position is not None:
+                    vectors[recipe_id] = {
+                        "id": recipe_id,
+                        "values": self._decode_rows(np.asarray([position]))[0].tolist(),
+                        "metadata": self._metadata(position),
+                    }
+        return {"vectors": vectors}
+
+    def list(self, limit=100, **kwargs):
+        """Pages of ids, from a snapshot taken when called (upserts meanwhile don't shift the pages)."""
+        with self._lock:
+            ids = self._ids[:]
+        return (ids[start:start + limit] for start in range(0, len(ids), limit))
+
+    def query(self, vector, top_k=10, include_metadata=True, filter=None, **kwargs):
+        """Cosine top-k for one query vector."""
+        return self.query_many([vector], top_k=top_k, include_metadata=include_metadata, filter=filter)[0]
+
+    def query_many(self, vectors, top_k=10, include_metadata=True, filter=None):
+        """Cosine top-k for a batch of query vectors in one matrix product."""
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        with self._lock:
+            if not self._ids:
+                return [{"matches": []} for _ in range(len(queries))]
+            allowed = self._filter_mask(filter) if filter else None
+
+            if top_k < 1:
+                return [{"matches": []} for _ in range(len(queries))]
+            if self._ann_stale and allowed is None:
+                self.build_index()
+            if self._ann is not None and allowed is None:
+                return [
+                    self._matches(positions, scores, include_metadata)
+                    for positions, scores in self._ann_search(queries, top_k)
+                ]
+
+            results = []
+            scores = self._scores(queries)
+            if allowed is not None:
+                scores[:, ~allowed] = -np.inf
+            k = min(top_k, scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for row_scores, candidates in zip(scores, top):
+                order = candidates[np.argsort(-row_scores[candidates])]
+                order = order[np.isfinite(row_scores[order])]
+                results.append(self._matches(order, row_scores[order], include_metadata))
+            return results
+
+    def _scores(self, queries: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine scores of ``queries`` against all rows (or just ``positions``)."""
+        if self.dtype == "float32" and positions is None:
+            return queries @ np.asarray(self._matrix).T
+        rows = np.arange(len(self._ids)) if positions is None else positions
+        scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+        for start in range(0, len(rows), self.SCAN_BLOCK):
+            block = rows[start:start + self.SCAN_BLOCK]
+            scores[:, start:start + len(block)] = queries @ self._decode_rows(block).T
+        return scores
+
+    def _decode_rows(self, positions: np.ndarray) -> np.ndarray:
+        rows = np.asarray(self._vectors[positions], dtype=np.float32)
+        if self.dtype == "int8":
+            rows *= self._scale_buffer[positions][:, None]
+        return rows
+
+    def _matches(self, positions, scores, include_metadata: bool) -> dict:
+        matches = []
+        for position, score in zip(positions, scores):
+            match = {"id": self._ids[position], "score": float(score)}
+            if include_metadata:
+                match["metadata"] = self._metadata(position)
+            matches.append(match)
+        return {"matches": matches}
+
+    def _metadata(self, position: int) -> dict:
+        return {field: column[position] for field, column in self._columns.items() if column[position] is not None}
+
+    def _filter_mask(self, filter: dict) -> np.ndarray:
+        """Evaluate a Pinecone-style metadata filter ($eq/$ne/$in/$nin) into a boolean row mask.
+
+        List-valued fields match element-wise, so ``{"ingredient_tokens": {"$nin": [...]}}``
+        drops every recipe containing any of the listed ingredients.
+        """
+        count = len(self._ids)
+        mask = np.full((count + 7) // 8, 0xFF, dtype=np.uint8)
+        for field, condition in filter.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            bitsets = self._field_bitsets(field)
+            for operator, operand in condition.items():
+                if operator not in ("$eq", "$ne", "$in", "$nin"):
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                operands = operand if operator in ("$in", "$nin") else [operand]
+                rows = np.zeros_like(mask)
+                for value in operands:
+                    bits = bitsets.get(value)
+                    if bits is not None:
+                        rows |= bits
+                mask &= rows if operator in ("$eq", "$in") else ~rows
+        return np.unpackbits(mask, count=count).astype(bool)
+
+    def _field_bitsets(self, field: str) -> Dict[object, np.ndarray]:
+        """Inverted index for one metadata field: value -> packed bitset of row positions."""
+        bitsets = self._bitsets.get(field)
+        if bitsets is None:
+            postings = defaultdict(list)
+            for position, value in enumerate(self._columns.get(field, [])):
+                for item in value if isinstance(value, list) else [value]:
+                    if item is not None:
+                        postings[item].append(position)
+            bitsets = {}
+            for item, positions in postings.items():
+                rows = np.zeros(len(self._ids), dtype=bool)
+                rows[positions] = True
+                bitsets[item] = np.packbits(rows)
+            self._bitsets[field] = bitsets
+        return bitsets
+
+    # ✅ Approximate indexes -------------------------------------------------
+
+    def _build_ann(self):
+        self._ann = None
+        if self.index_type == "exact" or len(self._ids) == 0:
+            return
+        if self.index_type == "hnsw":
+            try:
+                import hnswlib
+            except ImportError as e:
+                raise ImportError("index_type='hnsw' requires the hnswlib package") from e
+            index = hnswlib.Index(space="ip", dim=self.dimension)
+            index.init_index(max_elements=len(self._ids), ef_construction=200, M=16)
+            index.add_items(self._decode_rows(np.arange(len(self._ids))), np.arange(len(self._ids)))
+            index.set_ef(max(64, self.nprobe * 8))
+            self._ann = ("hnsw", index)
+        else:
+            self._ann = ("ivf", _build_ivf(self._decode_rows(np.arange(len(self._ids))), self.nlist))
+
+    def _ann_search(self, queries: np.ndarray, top_k: int):
+        kind, index = self._ann
+        k = min(top_k, len(self._ids))
+        if kind == "hnsw":
+            labels, distances = index.knn_query(queries, k=k)
+            return [(row_labels, 1.0 - row_distances) for row_labels, row_distances in zip(labels, distances)]
+
+        centroids, members = index
+        nearest_lists = np.argsort(-(queries @ centroids.T), axis=1)[:, :self.nprobe]
+        results = []
+        for query, lists in zip(queries, nearest_lists):
+            candidates = np.concatenate([members[i] for i in lists])
+            if len(candidates) < k:
+                # The probed clusters can't fill top_k: fall back to scanning every row
+                candidates = np.arange(len(self._ids))
+            scores = self._scores(query[None, :], candidates)[0]
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results.append((candidates[top], scores[top]))
+        return results
+
+    def __len__(self):
+        return len(self._ids)
+
+
+def _build_ivf(rows: np.ndarray, nlist: int, iterations: int = 10):
+    """Coarse k-means quantizer: returns (centroids, row positions per centroid)."""
+    nlist = max(1, min(nlist, len(rows)))
+    rng = np.random.default_rng(0)
+    centroids = rows[rng.choice(len(rows), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(rows @ centroids.T, axis=1)
+        for i in range(nlist):
+            members = rows[assignment == i]
+            if len(members):
+                centroid = members.mean(axis=0)
+                centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+    assignment = np.argmax(rows @ centroids.T, axis=1)
+    return centroids, [np.flatnonzero(assignment == i) for i in range(nlist)]
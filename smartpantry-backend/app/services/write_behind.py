@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.config import WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_ATTEMPTS, WRITE_BEHIND_MAX_ROWS
+from app.services.database import StoredMealPlan, decode_meal_plan, upsert_meal_history_async, upsert_pantry_items_async
+
+logger = logging.getLogger(__name__)
+
+
+def validate_user_id(user_id: str) -> str:
+    """``user_id`` if it is a UUID (the database's user_id type); ValueError otherwise."""
+    try:
+        uuid.UUID(str(user_id))
+    except ValueError:
+        raise ValueError(f"Invalid user_id {user_id!r}: expected a UUID") from None
+    return user_id
+
+
+def _connection_error(error: Exception) -> bool:
+    """True if the database couldn't be reached, as opposed to rejecting the rows."""
+    if isinstance(error, (OperationalError, InterfaceError, OSError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class WriteBehindBuffer:
+    """Pantry and meal-history writes collected in memory and flushed in bulk.
+
+    Pantry rows are merged per (user_id, ingredient_name): quantities of
+    repeat purchases are summed, and the flush adds them to the stored
+    quantity. Meal history keeps the latest plan per user. A flush runs every
+    ``interval`` seconds, as soon as ``max_rows`` rows are buffered, and on
+    ``stop`` (app shutdown).
+
+    When the database is unreachable the whole batch waits for the next
+    flush. When it rejects a batch, the batch is split in halves until the
+    offending rows are isolated; the rest is written, and a rejected row is
+    retried on later flushes and dropped (and logged) after ``max_attempts``.
+
+    ``on_pantry_flushed`` is called with each user whose pantry rows were
+    written (e.g. to queue an embedding refresh). ``add_pantry_items``
+    returns a future that resolves once all of its rows are written, or
+    fails if one of them is dropped.
+    """
+
+    def __init__(self, interval: float = WRITE_BEHIND_INTERVAL, max_rows: int = WRITE_BEHIND_MAX_ROWS,
+                 on_pantry_flushed: Optional[Callable[[str], object]] = None,
+                 max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS):
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_attempts = max_attempts
+        self.on_pantry_flushed = on_pantry_flushed
+        self._pantry: Dict[Tuple[str, str], dict] = {}
+        self._meal_history: Dict[str, dict] = {}
+        self._attempts: Dict[tuple, int] = {}  # (table, row key) -> rejected flushes so far
+        self._pantry_waiters: Dict[Tuple[str, str], List[Tuple[asyncio.Future, set]]] = {}  # row key -> (future, keys it awaits)
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._pantry) + len(self._meal_history)
+
+    # ✅ Buffering
+    def add_pantry_items(self, rows: List[dict]) -> asyncio.Future:
+        """Buffer pantry rows; raises ValueError (buffering nothing) if any user_id isn't a UUID.
+
+        The returned future resolves when the rows are in the database.
+        """
+        for row in rows:
+            validate_user_id(row["user_id"])
+        self._merge_pantry(rows)
+        saved = asyncio.get_running_loop().create_future()
+        keys = {(row["user_id"], row["ingredient_name"]) for row in rows}
+        for key in keys:
+            self._pantry_waiters.setdefault(key, []).append((saved, keys))
+        if not keys:
+            saved.set_result(None)
+        self._maybe_wake()
+        return saved
+
+    def _merge_pantry(self, rows):
+        for row in rows:
+            key = (row["user_id"], row["ingredient_name"])
+            buffered = self._pantry.get(key)
+            if buffered is None:
+                self._pantry[key] = dict(row)
+            else:
+                quantity = (buffered.get("quantity") or 0) + (row.get("quantity") or 0)
+                buffered.update(row, quantity=quantity)
+
+    def add_meal_history(self, user_id: str, meal_plan, fingerprint: Optional[str] = None):
+        validate_user_id(user_id)
+        self._meal_history[user_id] = {"user_id": user_id, "meal_plan": meal_plan, "fingerprint": fingerprint}
+        self._maybe_wake()
+
+    def pending_meal_plan(self, user_id: str) -> Optional[StoredMealPlan]:
+        """A buffered plan not flushed yet, so reads right after a write see it."""
+        row = self._meal_history.get(user_id)
+        return StoredMealPlan(decode_meal_plan(row["meal_plan"]), row["fingerprint"]) if row is not None else None
+
+    def _maybe_wake(self):
+        if self._wake is not None and len(self) >= self.max_rows:
+            self._wake.set()
+
+    # ✅ Flushing
+    def start(self):
+        if self._flusher is None:
+            self._wake = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the timer and flush whatever is left."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write the buffered rows: one bulk upsert per table (more only to isolate rejected rows)."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            pantry, self._pantry = self._pantry, {}
+            waiters, self._pantry_waiters = self._pantry_waiters, {}  # rows added during the write wait for the next flush
+            meal_history, self._meal_history = self._meal_history, {}
+            if pantry:
+                written, retry, dropped = await self._write("pantry", pantry, upsert_pantry_items_async)
+                self._written(len(written))
+                self._settle_pantry(waiters, written, dropped)
+                if self.on_pantry_flushed is not None:
+                    for user_id in {user_id for user_id, _ in written}:
+                        self.on_pantry_flushed(user_id)
+                # Purchases buffered meanwhile are added on top of the retried rows
+                newer, self._pantry = self._pantry, retry
+                self._merge_pantry(newer.values())
+            if meal_history:
+                written, retry, _ = await self._write("meal_history", meal_history, upsert_meal_history_async)
+                self._written(len(written))
+                # Newer plans buffered meanwhile win
+                self._meal_history = {**retry, **self._meal_history}
+
+    async def _write(self, table: str, rows: Dict[Hashable, dict],
+                     upsert: Callable[[List[dict]], Awaitable[None]]) -> Tuple[List[Hashable], Dict[Hashable, dict], Dict[Hashable, Exception]]:
+        """Upsert ``rows``; returns (keys written, rows to retry next flush, dropped keys -> error)."""
+        try:
+            await upsert(list(rows.values()))
+        except Exception as e:
+            self.failures += 1
+            if _connection_error(e):
+                logger.warning("%s flush failed (%d rows), retrying next flush: %s", table, len(rows), e)
+                return [], rows, {}
+            if len(rows) > 1:
+                keys = list(rows)
+                half = len(keys) // 2
+                written, retry, dropped = await self._write(table, {key: rows[key] for key in keys[:half]}, upsert)
+                more_written, more_retry, more_dropped = await self._write(table, {key: rows[key] for key in keys[half:]}, upsert)
+                return written + more_written, {**retry, **more_retry}, {**dropped, **more_dropped}
+            return self._rejected(table, rows, e)
+
+        for key in rows:
+            self._attempts.pop((table, key), None)
+        return list(rows), {}, {}
+
+    def _rejected(self, table: str, rows: Dict[Hashable, dict], error: Exception):
+        """Count a rejection against the single row in ``rows``: retry it, or drop it after max_attempts."""
+        (key, row), = rows.items()
+        attempts = self._attempts[(table, key)] = self._attempts.get((table, key), 0) + 1
+        if attempts < self.max_attempts:
+            logger.warning("%s row %s rejected (attempt %d/%d), retrying next flush: %s", table, key, attempts, self.max_attempts, error)
+            return [], rows, {}
+        del self._attempts[(table, key)]
+        self.dropped += 1
+        logger.error("Dropping %s row %s after %d rejected flushes: %s; row: %s", table, key, attempts, error, row)
+        return [], {}, {key: error}
+
+    def _settle_pantry(self, waiters, written, dropped: Dict[Hashable, Exception]):
+        """Resolve the futures of add_pantry_items calls whose rows were all written; fail those with a dropped row."""
+        for key in written:
+            for saved, keys in waiters.pop(key, ()):
+                keys.discard(key)
+                if not keys and not saved.done():
+                    saved.set_result(None)
+        for key, error in dropped.items():
+            for saved, _ in waiters.pop(key, ()):
+                if not saved.done():
+                    saved.set_exception(RuntimeError(f"Pantry row {key[1]!r} could not be saved: {error}"))
+        # The rest wait on retried rows
+        for key, pending in waiters.items():
+            self._pantry_waiters.setdefault(key, [])[:0] = pending
+
+    def _written(self, rows: int):
+        if rows:
+            self.flushes += 1
+            self.rows_written += rows
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
@@ -1,17 +1,85 @@
+import os
+from functools import lru_cache
 from sqlalchemy import make_url, create_engine
-from supabase import create_client
-from app.config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_DB_URL
-from llama_index.core import SQLDatabase
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_DB_URL, DATABASE_BACKEND, SQLITE_PATH, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_STATEMENT_CACHE_SIZE
 
-# Initialize Supabase Client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# ✅ Explicitly sized pool shared by both engines; pre-ping drops dead connections,
+# recycle replaces them before Supabase's idle timeout does
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": True,
+}
 
-# ✅ Create SQLAlchemy engine (FOR STRUCTURED QUERIES)
-sql_engine = create_engine(SUPABASE_DB_URL)  # Uses Supabase DB connection string
 
-# ✅ Create SQLDatabase (FOR STRUCTURED QUERIES)
-sql_database = SQLDatabase(sql_engine)  # 🔥 FIX: Now it's an actual database connection
+# ✅ Clients and engines are created on first use, not at import
+@lru_cache(maxsize=None)
+def get_supabase():
+    """Supabase client (PostgREST), used for writes."""
+    if DATABASE_BACKEND == "sqlite":
+        from app.services.fakes import FakeSupabase
+        return FakeSupabase(get_sql_engine())
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
+
+@lru_cache(maxsize=None)
+def get_sql_engine():
+    """SQLAlchemy engine (FOR STRUCTURED QUERIES), on the Supabase DB connection string."""
+    if DATABASE_BACKEND == "sqlite":
+        # ✅ Local database file with the same tables (created on first use)
+        from app.services.fakes import create_fake_schema
+        os.makedirs(os.path.dirname(SQLITE_PATH) or ".", exist_ok=True)
+        engine = create_engine(f"sqlite:///{SQLITE_PATH}", connect_args={"check_same_thread": False})
+        create_fake_schema(engine)
+        return engine
+    return create_engine(SUPABASE_DB_URL, **POOL_OPTIONS)
+
+
+@lru_cache(maxsize=None)
+def get_async_sql_engine():
+    """Async engine (asyncpg) for the async service layer, same database."""
+    if DATABASE_BACKEND == "sqlite":
+        get_sql_engine()  # creates the schema
+        return create_async_engine(f"sqlite+aiosqlite:///{SQLITE_PATH}")
+    return create_async_engine(
+        make_url(SUPABASE_DB_URL).set(drivername="postgresql+asyncpg"),
+        connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+        **POOL_OPTIONS
+    )
+
+
+@lru_cache(maxsize=None)
+def get_sql_database():
+    """LlamaIndex SQLDatabase over the sync engine (used by scripts)."""
+    from llama_index.core import SQLDatabase
+    return SQLDatabase(get_sql_engine())
+
+
+async def dispose_engines():
+    """Close pooled connections of whichever engines were created (app shutdown)."""
+    if get_async_sql_engine.cache_info().currsize:
+        await get_async_sql_engine().dispose()
+    if get_sql_engine.cache_info().currsize:
+        get_sql_engine().dispose()
+
+
+_LAZY_ATTRIBUTES = {
+    "supabase": get_supabase,
+    "sql_engine": get_sql_engine,
+    "async_sql_engine": get_async_sql_engine,
+    "sql_database": get_sql_database,
+}
+
+
+def __getattr__(name):
+    # `from app.supabase_client import supabase` etc. keep working for scripts
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 # # Ensure the connection string is correctly formatted
 # url = make_url(SUPABASE_DB_URL)
 # # Initialize PGVectorStore for LlamaIndex
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from app.services.coverage import RecipeCoverageIndex
+from app.services.database import UserPreferences
+from app.services.ingredients import (
+    IngredientIndex, allergen_filter, contains_allergen, ingredient_terms, ingredient_tokens,
+)
+from app.services.llama_index_service import _filter_recipe_matches
+from app.services.meal_planner import allowed_recipe
+from app.services.vector_store import LocalRecipeStore
+
+CATALOG = {
+    "satay": ["Chicken Thighs", "Peanut Butter", "Soy Sauce"],
+    "pesto": ["Basil", "Toasted Pine Nuts", "Parmesan"],
+    "curry": ["Chicken Breast", "Coconut Milk", "Rice"],
+    "omelette": ["Eggs", "Milk", "Butter"],
+    "ratatouille": ["Eggplant", "Courgette", "Tomatoes"],
+    "peanut brittle": ["Peanuts", "Sugar"],
+    "prawn toast": ["Shrimp", "Bread", "Sesame Seeds"],
+}
+
+ALLERGY_LISTS = [["Peanuts"], ["pine nuts"], ["milk"], ["egg"], ["prawns"], ["Coconut"], ["sesame", "soy"], ["  "], []]
+
+
+def test_rule_examples():
+    assert contains_allergen(["Peanut Butter"], ingredient_terms(["peanuts"]))
+    assert contains_allergen(["Toasted Pine Nuts"], ingredient_terms(["Pine Nut"]))
+    assert contains_allergen(["Shrimp"], ingredient_terms(["prawn"]))  # alias to the same canonical name
+    assert not contains_allergen(["Eggplant"], ingredient_terms(["egg"]))
+    assert not contains_allergen(["Peas"], ingredient_terms(["pears"]))  # never fuzzy
+    assert not contains_allergen(["Pine Nuts"], ingredient_terms(["  "]))
+    assert allergen_filter([]) is None and allergen_filter(["", " "]) is None
+
+
+@pytest.mark.parametrize("allergies", ALLERGY_LISTS)
+def test_every_path_applies_the_same_rule(allergies):
+    excluded = {name for name, ingredients in CATALOG.items() if contains_allergen(ingredients, ingredient_terms(allergies))}
+
+    # Coverage ranking
+    index = IngredientIndex()
+    for name, ingredients in CATALOG.items():
+        index.add_recipe(name, ingredients)
+    coverage = RecipeCoverageIndex(index.recipe_ingredient_sets())
+    _, _, allowed = coverage.score([], index.allergen_ids(allergies))
+    assert {coverage.recipe_ids[r] for r in np.flatnonzero(~allowed)} == excluded
+
+    # Hydrated recipe check
+    matches = [{"id": name, "score": 1.0, "metadata": {"name": name, "ingredients": ingredients}} for name, ingredients in CATALOG.items()]
+    assert {recipe["recipe_id"] for recipe in _filter_recipe_matches(matches, allergies)} == set(CATALOG) - excluded
+
+    # Meal planner
+    preferences = UserPreferences("u", allergies, [], None, [], [], None)
+    assert {name for name, ingredients in CATALOG.items() if not allowed_recipe({"ingredients": ingredients}, preferences)} == excluded
+
+    # Vector filter: drops nothing the rule allows (the hydrated check removes the rest)
+    store = LocalRecipeStore(dimension=4)
+    store.upsert([
+        {"id": name, "values": [1.0, 0.0, 0.0, float(i)], "metadata": {"ingredient_tokens": ingredient_tokens(ingredients)}}
+        for i, (name, ingredients) in enumerate(CATALOG.items())
+    ])
+    returned = {match["id"] for match in store.query([1.0, 0.0, 0.0, 1.0], top_k=len(CATALOG), filter=allergen_filter(allergies))["matches"]}
+    assert returned >= set(CATALOG) - excluded
+    if all(len(term) == 1 for term in ingredient_terms(allergies)):
+        assert returned == set(CATALOG) - excluded  # single-word allergens are fully handled by the filter
+
+
+def test_recipes_without_ingredients_are_unknown_not_allergen_free():
+    matches = [{"id": "x", "score": 1.0, "metadata": {"name": "Mystery", "ingredients": []}}]
+    assert _filter_recipe_matches(matches, ["peanut"]) == []
+    assert [recipe["recipe_id"] for recipe in _filter_recipe_matches(matches, [])] == ["x"]
+    preferences = UserPreferences("u", ["peanut"], [], None, [], [], None)
+    assert not allowed_recipe({"ingredients": []}, preferences)
@@ -0,0 +1,45 @@
+import statistics
+import time
+
+import numpy as np
+
+from app.services import coverage
+from app.services.coverage import RecipeCoverageIndex, get_coverage_index
+from app.services.ingredients import IngredientIndex
+
+
+def test_top_ranks_by_coverage_and_skips_allergens():
+    index = RecipeCoverageIndex([("a", frozenset({0, 1})), ("b", frozenset({0, 1, 2, 3})), ("c", frozenset({0, 4})), ("d", frozenset({5}))])
+    top = index.top(pantry_ids=[0, 1, 2], allergen_ids=[4], k=10)
+    assert [entry["recipe_id"] for entry in top] == ["a", "b"]  # c has the allergen, d no pantry ingredient
+    assert top[1] == {"recipe_id": "b", "coverage": 0.75, "missing_count": 1}
+    assert index.lookup(["b", "x"], [0, 3]) == {"b": (0.5, 2)}
+
+
+def test_requests_never_wait_for_a_rebuild(monkeypatch):
+    ingredients = IngredientIndex()
+    ingredients.add_recipe("1", ["Eggs", "Milk"])
+    monkeypatch.setattr(coverage, "_coverage_index", None)
+    first = get_coverage_index(ingredients)
+    assert len(first) == 1
+
+    ingredients.add_recipe("2", ["Rice"])
+    assert get_coverage_index(ingredients) is first  # stale snapshot served while a thread rebuilds
+    coverage._rebuild_thread.join()
+    rebuilt = get_coverage_index(ingredients)
+    assert len(rebuilt) == 2 and rebuilt is not first
+
+
+def test_top_at_100k_recipes_is_under_10ms():
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 2000, size=(100_000, 9)).tolist()
+    index = RecipeCoverageIndex((str(r), frozenset(row)) for r, row in enumerate(rows))
+    pantry, allergens = rng.integers(0, 2000, size=40).tolist(), [5, 6]
+
+    index.top(pantry, allergens, 18)  # warm-up
+    timings = []
+    for _ in range(20):
+        start = time.perf_counter()
+        index.top(pantry, allergens, 18)
+        timings.append(time.perf_counter() - start)
+    assert statistics.median(timings) < 0.010
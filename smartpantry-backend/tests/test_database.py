@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import database
+from app.services.database import decode_meal_plan, encode_meal_plan
+from app.services.write_behind import WriteBehindBuffer
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+PLAN = {"days": [{"day": "Monday", "meals": [{"recipe_name": "Chicken Curry"}]}], "notes": None}
+
+
+def _postgres_round_trip(parameter: str, driver_decodes_jsonb: bool):
+    """What reading the row back returns after ``CAST(:meal_plan AS JSONB)`` stored ``parameter``."""
+    stored = json.loads(parameter)  # the JSONB value
+    return stored if driver_decodes_jsonb else json.dumps(stored)
+
+
+@pytest.mark.parametrize("plan", [PLAN, json.dumps(PLAN)])
+@pytest.mark.parametrize("driver_decodes_jsonb", [True, False])
+def test_meal_plan_postgres_round_trip(monkeypatch, plan, driver_decodes_jsonb):
+    written = []
+
+    async def bulk_upsert(query, rows):
+        assert query is database.UPSERT_MEAL_HISTORY
+        written.extend(rows)
+
+    monkeypatch.setattr(database, "_bulk_upsert", bulk_upsert)
+    asyncio.run(database.upsert_meal_history_async([{"user_id": USER_ID, "meal_plan": plan, "fingerprint": "f"}]))
+
+    parameter = written[0]["meal_plan"]
+    # Stored as a JSONB object, not a JSON string holding the plan
+    assert json.loads(parameter) == PLAN
+    assert decode_meal_plan(_postgres_round_trip(parameter, driver_decodes_jsonb)) == PLAN
+
+
+def test_meal_plan_postgres_statement_casts_text_to_jsonb():
+    statement = str(database.UPSERT_MEAL_HISTORY.postgresql)
+    assert "CAST(meal_plan AS JSONB)" in statement
+    assert "CAST(:meal_plan AS TEXT[])" in statement
+
+
+def test_decode_meal_plan_reads_double_encoded_rows():
+    assert decode_meal_plan(json.dumps(json.dumps(PLAN))) == PLAN
+    assert decode_meal_plan(PLAN) is PLAN
+    assert encode_meal_plan(json.dumps(PLAN)) == json.dumps(PLAN)
+
+
+def test_pending_meal_plan_has_the_stored_shape():
+    buffer = WriteBehindBuffer()
+    buffer.add_meal_history(USER_ID, json.dumps(PLAN), "f")
+    pending = buffer.pending_meal_plan(USER_ID)
+    assert pending.meal_plan == PLAN
+    assert pending.fingerprint == "f"
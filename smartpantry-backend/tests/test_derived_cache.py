@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.services import llama_index_service
+from app.services.database import UserPreferences
+from app.services.derived_cache import RevisionCache
+from app.services.request_context import RequestContext
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def test_entries_are_only_served_for_their_version():
+    cache = RevisionCache(max_entries=2)
+    cache.set(("recipes", USER_ID), (1, "prefs"), ["a"])
+    assert cache.get(("recipes", USER_ID), (1, "prefs")) == ["a"]
+    assert cache.get(("recipes", USER_ID), (2, "prefs")) is None  # pantry revision bumped
+    assert cache.get(("recipes", USER_ID), (1, "other prefs")) is None
+    cache.set(("grocery", USER_ID), (1, "prefs"), ["b"])
+    cache.set(("recipes", "other"), (1, "prefs"), ["c"])
+    assert cache.get(("recipes", USER_ID), (1, "prefs")) is None  # evicted (LRU)
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """A shared pantry revision, as every worker process reads it from the database."""
+    state = {"revision": 1, "computed": 0}
+
+    async def fetch_revision(user_id):
+        return state["revision"]
+
+    async def fetch_preferences(user_id):
+        return UserPreferences.empty(user_id)
+
+    monkeypatch.setattr(llama_index_service, "fetch_pantry_revision_async", fetch_revision)
+    monkeypatch.setattr(llama_index_service, "fetch_preferences_async", fetch_preferences)
+    return state
+
+
+def _request(cache, state, stale_embedding=False):
+    """One request handled by the worker owning ``cache``."""
+    async def compute():
+        state["computed"] += 1
+        if stale_embedding:
+            ctx.cacheable = False
+        return {"user_id": USER_ID, "suggested_recipes": [state["revision"]]}
+
+    ctx = RequestContext()
+    llama_index_service.derived_cache = cache
+    key = ("recipes", USER_ID)
+    return asyncio.run(llama_index_service._cached_by_revision(key, USER_ID, ctx, compute))
+
+
+def test_each_worker_revalidates_against_the_revision(monkeypatch, database):
+    monkeypatch.setattr(llama_index_service, "derived_cache", RevisionCache())
+    worker_a, worker_b = RevisionCache(), RevisionCache()
+
+    assert _request(worker_a, database)["suggested_recipes"] == [1]
+    assert _request(worker_b, database)["suggested_recipes"] == [1]
+    assert _request(worker_a, database)["suggested_recipes"] == [1]
+    assert database["computed"] == 2
+
+    database["revision"] = 2  # a pantry write flushed by either worker
+    assert _request(worker_a, database)["suggested_recipes"] == [2]
+    assert _request(worker_b, database)["suggested_recipes"] == [2]
+    assert database["computed"] == 4
+
+
+def test_results_from_a_stale_embedding_are_not_cached(monkeypatch, database):
+    monkeypatch.setattr(llama_index_service, "derived_cache", RevisionCache())
+    worker = RevisionCache()
+    _request(worker, database, stale_embedding=True)
+    _request(worker, database)
+    _request(worker, database)
+    assert database["computed"] == 2
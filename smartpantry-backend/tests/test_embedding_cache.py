@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services import llama_index_service
+from app.services.embedding_cache import EmbeddingCache, MemoryEmbeddingTier
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache([MemoryEmbeddingTier(max_entries=2)])
+    cache.set("eggs", "m", [1.0])
+    cache.set("milk", "m", [2.0])
+    assert cache.get("  EGGS ", "m") == [1.0]  # normalized key, and now most recently used
+    cache.set("rice", "m", [3.0])
+    assert cache.get("milk", "m") is None
+    assert cache.get("eggs", "m") == [1.0]
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_prometheus_lines_count_hits_and_misses():
+    cache = EmbeddingCache([MemoryEmbeddingTier()])
+    cache.set("eggs", "m", [1.0])
+    cache.get("eggs", "m")
+    cache.get("milk", "m")
+    lines = cache.prometheus_lines()
+    assert 'smartpantry_embedding_cache_hits_total{tier="memory"} 1' in lines
+    assert "smartpantry_embedding_cache_misses_total 1" in lines
+
+
+def _fake_embeddings(monkeypatch, calls):
+    async def create(batch):
+        calls.append(list(batch))
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(batch)])
+
+    async def call(key, compute, user_id=None):
+        return await compute()
+
+    monkeypatch.setattr(llama_index_service, "_embeddings_create_async", create)
+    monkeypatch.setattr(llama_index_service.embedding_gateway, "call", call)
+    monkeypatch.setattr(llama_index_service, "embedding_cache", EmbeddingCache([MemoryEmbeddingTier()]))
+
+
+def test_bulk_embeddings_bypass_the_cache(monkeypatch):
+    calls = []
+    _fake_embeddings(monkeypatch, calls)
+    cache = llama_index_service.embedding_cache
+
+    vectors = asyncio.run(llama_index_service.generate_embeddings_async(["beef stew", "pad thai"], cache=False))
+    assert vectors == [[9.0], [8.0]]
+    assert len(cache.tiers[0]) == 0
+    assert cache.stats()["hits"] + cache.stats()["misses"] == 0
+
+    asyncio.run(llama_index_service.generate_embeddings_async(["beef stew"]))
+    asyncio.run(llama_index_service.generate_embeddings_async(["beef stew"]))
+    assert calls == [["beef stew", "pad thai"], ["beef stew"]]
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,42 @@
+import pytest
+
+from app.services import llama_index_service
+from app.services.ingredients import IngredientIndex
+
+
+@pytest.fixture(autouse=True)
+def index(monkeypatch):
+    index = IngredientIndex()
+    monkeypatch.setattr(llama_index_service, "get_ingredient_index", lambda: index)
+    return index
+
+
+def _pantry(*names):
+    return [{"ingredient": name, "quantity": 1, "unit": "pc"} for name in names]
+
+
+def test_missing_ingredients_keep_recipe_wording_and_order():
+    recipes = [
+        {"recipe_id": "1", "recipe_name": "Curry", "ingredients": ["Chicken Breasts", "Coconut Milk", "Garam  Masala", "Basmati Rice"]},
+        {"recipe_id": "2", "recipe_name": "Stir Fry", "ingredients": ["Basmati rice", "Soy Sauce", "coconut milk"]},
+        {"recipe_id": "3", "recipe_name": "Rice", "ingredients": ["Basmati Rice"]},
+    ]
+    result = llama_index_service._build_grocery_list("u", _pantry("CHKN BRST 2LB", "Basmati Rice"), recipes)
+
+    assert result["fully_makable_recipes"] == ["Rice"]
+    assert result["recipes_with_missing_ingredients"] == [
+        {"recipe_name": "Curry", "missing_ingredients": ["Coconut Milk", "Garam Masala"]},
+        {"recipe_name": "Stir Fry", "missing_ingredients": ["Soy Sauce", "coconut milk"]},
+    ]
+    assert result["consolidated_grocery_list"] == [
+        {"ingredient": "Coconut Milk", "count": 2},
+        {"ingredient": "Garam Masala", "count": 1},
+        {"ingredient": "Soy Sauce", "count": 1},
+    ]
+
+
+def test_grocery_list_is_deterministic():
+    names = ["Onion", "Garlic", "Ginger", "Cumin", "Paprika", "Lemon", "Butter", "Flour", "Eggs", "Sugar", "Salt", "Pepper"]
+    recipes = [{"recipe_id": str(i), "recipe_name": f"R{i}", "ingredients": names[i:i + 5]} for i in range(8)]
+    results = {repr(llama_index_service._build_grocery_list("u", _pantry("Cumin"), recipes)) for _ in range(3)}
+    assert len(results) == 1
@@ -0,0 +1,66 @@
+import pytest
+
+from app.services.ingredients import IngredientIndex, canonical_ingredient_name
+
+VOCABULARY = [
+    "Chicken Breast", "Chicken Thighs", "Coconut Milk", "Coconut", "Peanut Butter", "Butter", "Milk",
+    "Rice Vinegar", "Wine Vinegar", "Parmesan", "Broccoli", "Spinach", "Pears", "Red Pepper", "Green Pepper",
+]
+
+
+@pytest.fixture
+def index():
+    index = IngredientIndex()
+    index.add_recipe("1", VOCABULARY)
+    return index
+
+
+@pytest.mark.parametrize("raw, canonical", [
+    ("CHKN BRST 2LB", "chicken breast"),
+    ("Organic Grnd Bf 1lb", "beef"),
+    ("Scallions", "spring onion"),
+    ("  Fresh   TOMATOES x3 ", "tomato"),
+    ("#4011", "#4011"),
+])
+def test_canonical_names(raw, canonical):
+    assert canonical_ingredient_name(raw) == canonical
+
+
+@pytest.mark.parametrize("pantry_name, expected", [
+    ("CHKN BRST 2LB", "chicken breast"),
+    ("chiken brest", "chicken breast"),
+    ("Parmesean", "parmesan"),
+    ("brocoli", "broccoli"),
+    ("spinch", "spinach"),
+    ("coconut", "coconut"),
+])
+def test_pantry_names_match(index, pantry_name, expected):
+    assert index.name(index.lookup(pantry_name)) == expected
+
+
+@pytest.mark.parametrize("pantry_name", [
+    "Coconut Cream",  # not coconut milk, nor coconut
+    "Rice Wine",
+    "peas",  # not pear
+    "Peanut",  # not peanut butter
+    "Yellow Pepper",
+    "Salmon",
+])
+def test_known_false_positives_do_not_match(index, pantry_name):
+    assert index.lookup(pantry_name) is None
+
+
+@pytest.mark.parametrize("vocabulary", [["cheddar", "chedder"], ["chedder", "cheddar"]])
+def test_fuzzy_ties_go_to_the_lower_id(vocabulary):
+    index = IngredientIndex()
+    first = index.add(vocabulary[0])
+    index.add(vocabulary[1])
+    assert index.lookup("cheddor") == first
+
+
+def test_recipe_names_extend_the_vocabulary_but_pantry_names_do_not(index):
+    size = len(index)
+    assert index.ids_for(["Saffron"], fuzzy=True) == frozenset()
+    assert len(index) == size
+    index.ids_for(["Saffron"])
+    assert index.ids_for(["saffron"], fuzzy=True) == {index.ids["saffron"]}
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from app.services.json_stream import JsonArrayItemParser, strip_code_fences
+
+PLAN = {
+    "tags": ["quick", {"days": []}],
+    "days": [
+        {"day": 1, "meals": {"lunch": {"name": "Soup {hot} \"spicy\" [v]", "ingredients": ["Leeks", "Stock"]}}},
+        {"day": 2, "meals": {"dinner": {"name": "Stew \\ pie", "ingredients": []}}},
+    ],
+    "notes": "days: [{}]",
+}
+
+
+def _feed(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 10_000])
+def test_items_are_decoded_whatever_the_chunking(size):
+    text = "```json\n" + json.dumps(PLAN, indent=2) + "\n```"
+    assert _feed(JsonArrayItemParser(), text, size) == PLAN["days"]
+
+
+def test_each_item_is_returned_as_soon_as_it_closes():
+    parser = JsonArrayItemParser()
+    text = json.dumps(PLAN)
+    first_end = text.index('}}}, {"day": 2') + 3
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [PLAN["days"][0]]
+    assert parser.feed(text[first_end:]) == [PLAN["days"][1]]
+
+
+def test_only_the_top_level_key_counts():
+    text = json.dumps({"plan": {"days": [{"day": 1}]}, "days": [{"day": 2}]})
+    assert JsonArrayItemParser().feed(text) == [{"day": 2}]
+    assert JsonArrayItemParser("missing").feed(text) == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"days": []}\n```', '{"days": []}'),
+    ('```\n{"a": 1}```', '{"a": 1}'),
+    ('  {"a": 1}\n', '{"a": 1}'),
+    ("```", ""),
+])
+def test_strip_code_fences(text, expected):
+    assert strip_code_fences(text) == expected
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from app.services import llm_gateway
+from app.services.llm_gateway import CallGateway, GatewayRejected, request_key
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"upstream {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "RETRY_BACKOFF", 0.0)
+
+
+def _gateway(**overrides):
+    options = dict(max_concurrency=1, max_queue=1, queue_timeout=1.0, call_timeout=1.0)
+    options.update(overrides)
+    return CallGateway("Test", **options)
+
+
+def test_identical_calls_in_flight_share_one_upstream_call():
+    async def scenario():
+        gateway, calls = _gateway(max_queue=0), []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "plan"
+
+        key = request_key("gpt", [{"role": "user", "content": "hi"}])
+        results = await asyncio.gather(*(gateway.call(key, call) for _ in range(5)))
+        return results, calls, gateway.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ["plan"] * 5 and len(calls) == 1
+    assert stats["coalesced"] == 4 and stats["inflight_keys"] == 0
+
+
+def test_calls_beyond_the_queue_are_shed_with_503():
+    async def scenario():
+        gateway, release = _gateway(), asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "ok"
+
+        running = asyncio.ensure_future(gateway.call(None, call))
+        queued = asyncio.ensure_future(gateway.call(None, call))
+        await asyncio.sleep(0.01)  # one running, one queued
+        with pytest.raises(GatewayRejected) as rejected:
+            await gateway.call(None, call)
+        release.set()
+        return rejected.value, await asyncio.gather(running, queued), gateway.stats()
+
+    rejected, results, stats = asyncio.run(scenario())
+    assert rejected.status_code == 503 and rejected.retry_after == 1.0
+    assert results == ["ok", "ok"] and stats["shed"] == 1 and stats["running"] == 0
+
+
+def test_queued_call_gives_up_after_queue_timeout():
+    async def scenario():
+        gateway = _gateway(queue_timeout=0.01)
+        slow = asyncio.ensure_future(gateway.call(None, lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0.001)
+        with pytest.raises(GatewayRejected) as rejected:
+            await gateway.call(None, lambda: asyncio.sleep(0))
+        await slow
+        return rejected.value
+
+    assert asyncio.run(scenario()).status_code == 503
+
+
+def test_user_over_quota_gets_429():
+    async def scenario():
+        gateway = _gateway(user_rate=0.5, user_burst=2)
+        answers = [await gateway.call(None, lambda: asyncio.sleep(0, "ok"), user_id="alice") for _ in range(2)]
+        with pytest.raises(GatewayRejected) as rejected:
+            await gateway.call(None, lambda: asyncio.sleep(0, "ok"), user_id="alice")
+        answers.append(await gateway.call(None, lambda: asyncio.sleep(0, "ok"), user_id="bob"))
+        return answers, rejected.value
+
+    answers, rejected = asyncio.run(scenario())
+    assert answers == ["ok"] * 3
+    assert rejected.status_code == 429 and rejected.retry_after > 0
+
+
+def test_retryable_errors_are_retried_and_others_are_not():
+    async def scenario(errors, retries):
+        gateway, attempts = _gateway(retries=retries), []
+
+        async def call():
+            attempts.append(1)
+            if len(attempts) <= len(errors):
+                raise errors[len(attempts) - 1]
+            return "ok"
+
+        try:
+            return await gateway.call(None, call), len(attempts)
+        except Exception as e:
+            return e, len(attempts)
+
+    assert asyncio.run(scenario([UpstreamError(503), UpstreamError(429)], retries=2)) == ("ok", 3)
+    error, attempts = asyncio.run(scenario([UpstreamError(400)], retries=2))
+    assert isinstance(error, UpstreamError) and attempts == 1
+    error, attempts = asyncio.run(scenario([UpstreamError(500)] * 3, retries=1))
+    assert isinstance(error, UpstreamError) and attempts == 2
+
+
+def test_attempt_timeout_becomes_504():
+    async def scenario():
+        gateway = _gateway(call_timeout=0.01)
+        with pytest.raises(GatewayRejected) as rejected:
+            await gateway.call(None, lambda: asyncio.sleep(1))
+        return rejected.value, gateway.stats()
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.status_code == 504 and stats["timeouts"] == 1
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import logging
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.services import meal_plan_cache
+from app.services.database import StoredMealPlan
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+PLAN = {"user_id": USER_ID, "days": [{"day": 1, "meals": {}}]}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    state = {"stored": None, "fingerprint": "new", "generated": [], "fail": False}
+
+    async def stored(user_id):
+        return state["stored"]
+
+    async def fingerprint(user_id, ctx):
+        return state["fingerprint"]
+
+    async def generate(user_id, ctx=None):
+        if state["fail"]:
+            raise RuntimeError("no candidates")
+        state["generated"].append(user_id)
+        return json.dumps(PLAN)
+
+    async def store(user_id, meal_plan, fingerprint):
+        state["stored"] = StoredMealPlan(json.loads(meal_plan), fingerprint)
+        return {"status": "success"}
+
+    monkeypatch.setattr(meal_plan_cache, "_stored_meal_plan_async", stored)
+    monkeypatch.setattr(meal_plan_cache, "meal_plan_fingerprint_async", fingerprint)
+    monkeypatch.setattr(meal_plan_cache, "generate_meal_plan_service_async", generate)
+    monkeypatch.setattr(meal_plan_cache, "store_user_meal_history_async", store)
+    return state
+
+
+def _serve():
+    async def scenario():
+        tasks = BackgroundTasks()
+        response = await meal_plan_cache.get_meal_plan_service_async(USER_ID, tasks)
+        await tasks()
+        return response
+
+    return asyncio.run(scenario())
+
+
+def test_generated_then_cached_then_stale(service):
+    assert _serve() == {"status": "success", "source": "generated", "meal_plan": PLAN}
+    assert _serve()["source"] == "cache" and len(service["generated"]) == 1
+
+    service["fingerprint"] = "newer"
+    stale = _serve()
+    assert stale["source"] == "stale" and stale["meal_plan"] == PLAN
+    # The background task regenerated and stored it under the new fingerprint
+    assert len(service["generated"]) == 2 and service["stored"].fingerprint == "newer"
+    assert USER_ID not in meal_plan_cache._regenerating
+
+
+def test_failed_background_regeneration_is_logged(service, caplog):
+    service["stored"] = StoredMealPlan(PLAN, "old")
+    service["fail"] = True
+    with caplog.at_level(logging.ERROR, logger=meal_plan_cache.__name__):
+        assert _serve()["source"] == "stale"
+    assert "Background meal plan regeneration failed" in caplog.text
+    assert USER_ID not in meal_plan_cache._regenerating
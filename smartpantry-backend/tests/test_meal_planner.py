@@ -0,0 +1,88 @@
+import itertools
+import random
+
+import pytest
+
+from app.services.database import UserPreferences
+from app.services.meal_planner import NoFeasibleMealPlan, _objective, _solve, allowed_recipe, plan_meals
+from app.services.prompt_builder import MEAL_SLOTS, PLAN_DAYS
+
+PREFERENCES = UserPreferences("user", ["peanuts"], ["mushrooms"], "vegetarian", ["italian"], ["dinner"], "low")
+
+CANDIDATES = [
+    {"recipe_id": "1", "recipe_name": "Pancakes", "category": "Breakfast", "coverage": 0.8, "ingredients": ["Flour", "Eggs", "Milk"]},
+    {"recipe_id": "2", "recipe_name": "Satay", "category": "Vegetarian", "coverage": 0.9, "ingredients": ["Tofu", "Peanut Butter"]},
+    {"recipe_id": "3", "recipe_name": "Steak", "category": "Beef", "coverage": 0.9, "ingredients": ["Beef", "Salt"]},
+    {"recipe_id": "4", "recipe_name": "Risotto", "category": "Vegetarian", "cuisine": "Italian", "coverage": 0.6, "ingredients": ["Rice", "Mushrooms"]},
+    {"recipe_id": "5", "recipe_name": "Pasta", "category": "Pasta", "cuisine": "Italian", "coverage": 0.7, "ingredients": ["Pasta", "Tomatoes"]},
+    {"recipe_id": "6", "recipe_name": "Salad", "category": "Side", "coverage": 0.5, "ingredients": ["Lettuce", "Cucumber"]},
+]
+
+
+def _brute_force(scores, days, slot_count):
+    recipes = range(len(scores[0]))
+    return max(_objective(list(cells), scores, slot_count) for cells in itertools.product(recipes, repeat=days * slot_count))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_solve_reaches_a_local_optimum_of_the_full_objective(seed):
+    rng = random.Random(seed)
+    days, slot_count, recipe_count = 7, 3, rng.choice([1, 2, 4, 12, 40])
+    scores = [[rng.uniform(-1, 2) for _ in range(recipe_count)] for _ in range(slot_count)]
+    assignment = _solve(scores, days, slot_count)
+    value = _objective(assignment, scores, slot_count)
+
+    # No single replace or swap improves the full objective (the deltas agree with it)
+    for cell, recipe in itertools.product(range(len(assignment)), range(recipe_count)):
+        moved = assignment[:cell] + [recipe] + assignment[cell + 1:]
+        assert _objective(moved, scores, slot_count) <= value + 1e-6
+    for a, b in itertools.combinations(range(len(assignment)), 2):
+        moved = list(assignment)
+        moved[a], moved[b] = moved[b], moved[a]
+        assert _objective(moved, scores, slot_count) <= value + 1e-6
+
+
+def test_solve_is_optimal_on_small_grids():
+    rng = random.Random(7)
+    for _ in range(10):
+        scores = [[rng.uniform(0, 1) for _ in range(3)] for _ in range(2)]
+        assert _objective(_solve(scores, 2, 2), scores, 2) == pytest.approx(_brute_force(scores, 2, 2))
+
+
+def test_plan_respects_hard_constraints_and_is_deterministic():
+    days = plan_meals(CANDIDATES, PREFERENCES)
+    assert len(days) == PLAN_DAYS and all(set(day["meals"]) == set(MEAL_SLOTS) for day in days)
+    planned = {meal["name"] for day in days for meal in day["meals"].values()}
+    assert planned <= {"Pancakes", "Pasta", "Salad"}  # no peanuts, no beef, no mushrooms
+    assert plan_meals(list(reversed(CANDIDATES)), PREFERENCES) == days
+
+
+def test_dislikes_are_relaxed_before_giving_up():
+    risotto_only = [CANDIDATES[3]]
+    days = plan_meals(risotto_only, PREFERENCES)
+    assert {meal["name"] for day in days for meal in day["meals"].values()} == {"Risotto"}
+    assert not allowed_recipe(CANDIDATES[3], PREFERENCES)
+
+
+def test_no_allowed_candidate_raises():
+    with pytest.raises(NoFeasibleMealPlan):
+        plan_meals([CANDIDATES[1], CANDIDATES[2]], PREFERENCES)
+    with pytest.raises(NoFeasibleMealPlan):
+        plan_meals([], PREFERENCES)
+
+
+def test_meal_plan_route_answers_422_when_no_plan_fits(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers import routes
+
+    async def infeasible(*args):
+        raise NoFeasibleMealPlan("No meal plan fits these preferences")
+
+    monkeypatch.setattr(routes, "get_meal_plan_service_async", infeasible)
+    app = FastAPI()
+    app.include_router(routes.router)
+    response = TestClient(app).get("/meal_plans/00000000-0000-0000-0000-000000000000")
+    assert response.status_code == 422
+    assert "No meal plan fits" in response.json()["detail"]
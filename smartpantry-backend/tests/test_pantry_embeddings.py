@@ -0,0 +1,33 @@
+import asyncio
+import logging
+
+from app.services.pantry_embeddings import PantryEmbeddingQueue, pantry_hash
+
+
+def test_pantry_hash_depends_on_text_and_model():
+    assert pantry_hash("eggs, milk", "small") == pantry_hash("eggs, milk", "small")
+    assert pantry_hash("eggs, milk", "small") != pantry_hash("eggs, milk", "large")
+    assert pantry_hash("eggs, milk", "small") != pantry_hash("eggs", "small")
+
+
+def test_a_burst_of_edits_costs_one_refresh_and_failures_are_logged(caplog):
+    async def scenario():
+        refreshed = []
+
+        async def refresh(user_id):
+            refreshed.append(user_id)
+            if user_id == "broken":
+                raise RuntimeError("embedding call failed")
+
+        queue = PantryEmbeddingQueue(refresh, workers=1, max_pending=3)
+        queued = [queue.enqueue(user_id) for user_id in ["alice", "alice", "bob", "broken", "carol"]]
+        queue.start()
+        await queue.stop()
+        return queued, refreshed, queue.stats()
+
+    with caplog.at_level(logging.WARNING, logger="app.services.pantry_embeddings"):
+        queued, refreshed, stats = asyncio.run(scenario())
+    assert queued == [True, False, True, True, False]  # duplicate, then queue full
+    assert refreshed == ["alice", "bob", "broken"]
+    assert stats == {"pending": 0, "processed": 2, "failed": 1, "workers": 0}
+    assert "Pantry embedding refresh failed for broken" in caplog.text
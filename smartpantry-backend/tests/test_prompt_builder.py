@@ -0,0 +1,69 @@
+import logging
+
+import pytest
+
+from app.services import prompt_builder
+from app.services.database import UserPreferences
+from app.services.prompt_builder import build_meal_plan_messages, count_message_tokens, rehydrate_meal_plan
+
+PREFERENCES = UserPreferences("u", ["peanut"], ["olives"], "none", ["Italian"], ["dinner"], "moderate")
+
+
+def _recipes(count: int, ingredients: int = 12):
+    return [
+        {
+            "recipe_id": str(i),
+            "recipe_name": f"Recipe {i}",
+            "ingredients": [f"ingredient {i}-{j}" for j in range(ingredients)],
+            "instructions": "Cook.",
+            "image_url": f"http://img/{i}",
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def no_tiktoken(monkeypatch):
+    """Token counts from the len // 4 estimate, as on a host without tiktoken's BPE files."""
+    monkeypatch.setattr(prompt_builder, "_encoding", lambda model: None)
+
+
+def test_prompt_fits_the_budget_trimming_ingredients_then_recipes(no_tiktoken):
+    recipes = _recipes(30)
+    generous = build_meal_plan_messages(PREFERENCES, recipes, token_budget=100_000)
+    assert "ingredient 0-11" in generous[1].content
+
+    messages = build_meal_plan_messages(PREFERENCES, recipes, token_budget=600)
+    assert count_message_tokens(messages) <= 600
+    assert "ingredient 0-11" not in messages[1].content  # trimmed ingredient lists
+    assert '"id":"0"' in messages[1].content  # best-scored recipes kept
+    assert '"id":"29"' not in messages[1].content
+
+
+def test_prompt_keeps_one_recipe_when_the_budget_is_too_small(no_tiktoken):
+    messages = build_meal_plan_messages(PREFERENCES, _recipes(5), token_budget=1)
+    assert '"id":"0"' in messages[1].content and '"id":"1"' not in messages[1].content
+
+
+def test_tiktoken_fallback_is_logged_once(monkeypatch, caplog):
+    import tiktoken
+
+    def unavailable(*args):
+        raise ConnectionError("offline")
+
+    prompt_builder._encoding.cache_clear()
+    monkeypatch.setattr(tiktoken, "encoding_for_model", unavailable)
+    with caplog.at_level(logging.WARNING, logger=prompt_builder.__name__):
+        assert prompt_builder.count_tokens("a" * 40, "test-model") == 11
+        assert prompt_builder.count_tokens("a" * 80, "test-model") == 21
+    prompt_builder._encoding.cache_clear()
+    assert len([record for record in caplog.records if "len(text) // 4" in record.getMessage()]) == 1
+
+
+def test_rehydrate_fills_meals_from_recipe_ids():
+    recipes = _recipes(2)
+    plan = {"days": [{"day": 1, "meals": {"breakfast": {"recipe_id": "1"}, "lunch": "0", "dinner": {"name": "recipe 0"}}}]}
+    meals = rehydrate_meal_plan(plan, recipes, "u")["days"][0]["meals"]
+    assert meals["breakfast"]["name"] == "Recipe 1"
+    assert meals["lunch"]["image_url"] == "http://img/0"
+    assert meals["dinner"]["recipe_id"] == "0"
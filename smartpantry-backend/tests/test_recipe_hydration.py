@@ -0,0 +1,40 @@
+import logging
+
+import pytest
+
+from app.services import llama_index_service
+from app.services.ingredients import build_ingredient_index
+from app.services.recipe_details import RecipeDetailStore
+from app.services.vector_store import LocalRecipeStore
+
+
+@pytest.fixture
+def stores(monkeypatch):
+    details = RecipeDetailStore(":memory:")
+    details.put_many({"detailed": {"name": "Curry", "ingredients": ["Rice", "Chicken"]}})
+    store = LocalRecipeStore(dimension=2)
+    store.upsert([
+        {"id": "detailed", "values": [1.0, 0.0], "metadata": {"ingredient_tokens": ["chicken", "rice"]}},
+        {"id": "legacy", "values": [0.0, 1.0], "metadata": {"name": "Soup", "ingredients": ["Leek"]}},
+        {"id": "slim", "values": [1.0, 1.0], "metadata": {"ingredient_tokens": ["egg"]}},
+    ])
+    monkeypatch.setattr(llama_index_service, "get_recipe_details", lambda: details)
+    monkeypatch.setattr(llama_index_service, "get_recipe_store", lambda: store)
+    return store, details
+
+
+def test_hydration_drops_recipes_without_details_loudly(stores, caplog):
+    matches = [{"id": recipe_id, "score": 0.5} for recipe_id in ("detailed", "legacy", "slim")]
+    with caplog.at_level(logging.ERROR):
+        hydrated = llama_index_service._hydrate_matches(matches)
+    assert [match["id"] for match in hydrated] == ["detailed", "legacy"]
+    assert hydrated[1]["metadata"]["ingredients"] == ["Leek"]
+    assert "slim" in caplog.text and "backfill_recipe_details" in caplog.text
+
+
+def test_startup_index_build_reports_recipes_without_details(stores, caplog):
+    store, details = stores
+    with caplog.at_level(logging.ERROR):
+        index = build_ingredient_index(store, details=details)
+    assert sorted(recipe_id for recipe_id, _ in index.recipe_ingredient_sets()) == ["detailed", "legacy"]
+    assert "1 recipes have no details" in caplog.text
@@ -0,0 +1,71 @@
+import logging
+
+import pytest
+
+from app.services import recipe_search
+from app.services.recipe_details import RecipeDetailStore
+from app.services.recipe_search import RecipeSearchIndex, reciprocal_rank_fusion, tokenize
+
+RECIPES = {
+    "1": {"name": "Chicken Curry", "cuisine": "Indian", "category": "Chicken", "ingredients": ["Chicken Breast", "Coconut Milk"]},
+    "2": {"name": "Beef Stew", "cuisine": "British", "category": "Beef", "ingredients": ["Beef", "Carrots", "Potatoes"]},
+    "3": {"name": "Pad Thai", "cuisine": "Thai", "category": "Chicken", "ingredients": ["Rice Noodles", "Chicken", "Peanuts"]},
+    "4": {"name": "Carrot Cake", "cuisine": "American", "category": "Dessert", "ingredients": ["Carrots", "Flour", "Sugar"]},
+}
+
+
+@pytest.fixture
+def index():
+    index = RecipeSearchIndex()
+    index.add_many(RECIPES)
+    return index
+
+
+def test_tokenize():
+    assert tokenize("Pad-Thai_noodles, 2 Eggs") == ["pad", "thai", "noodles", "2", "eggs"]
+
+
+def test_name_matches_outrank_ingredient_matches(index):
+    ids = [recipe_id for recipe_id, _ in index.search("curry chicken", prefix=False)]
+    assert ids[0] == "1" and set(ids) == {"1", "3"}
+    assert index.search("", k=5) == [] and index.search("chicken", k=0) == []
+
+
+def test_last_term_matches_as_a_prefix(index):
+    assert {recipe_id for recipe_id, _ in index.search("carr")} == {"2", "4"}
+    assert index.search("carr", prefix=False) == []
+
+
+def test_reindexing_and_compaction_keep_scores(index):
+    index.add("4", dict(RECIPES["4"], name="Lemon Cake", ingredients=["Lemons", "Flour"]))
+    assert {recipe_id for recipe_id, _ in index.search("carrot")} == {"2"}
+    before = index.search("cake flour lemon")
+    index.compact()
+    assert index.stats()["documents"] == len(index) == 4
+    assert index.search("cake flour lemon") == pytest.approx(before)
+
+
+def test_refresh_indexes_only_new_rows(tmp_path):
+    store = RecipeDetailStore(str(tmp_path / "details.db"))
+    store.put_many({"1": RECIPES["1"]})
+    index = RecipeSearchIndex()
+    assert index.refresh(store) == 1
+    store.put_many({"2": RECIPES["2"]})
+    assert index.refresh(store) == 1 and index.refresh(store) == 0
+    assert [recipe_id for recipe_id, _ in index.search("stew")] == ["2"]
+
+
+def test_unreadable_store_starts_an_empty_index(monkeypatch, caplog):
+    def unreadable():
+        raise OSError("no such file")
+
+    monkeypatch.setattr(recipe_search, "_search_index", None)
+    monkeypatch.setattr(recipe_search, "get_recipe_details", unreadable)
+    with caplog.at_level(logging.ERROR, logger=recipe_search.__name__):
+        assert len(recipe_search.get_recipe_search_index()) == 0
+    assert "Could not build the recipe search index" in caplog.text
+
+
+def test_reciprocal_rank_fusion():
+    fused = [recipe_id for recipe_id, _ in reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"], ["b"]])]
+    assert fused == ["b", "a", "c"]
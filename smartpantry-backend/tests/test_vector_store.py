@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from app.services.vector_store import LocalRecipeStore
+
+DIMENSION = 32
+
+
+def _vectors(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(count, DIMENSION)).astype(np.float32)
+
+
+def _store(count: int = 500, **kwargs) -> LocalRecipeStore:
+    store = LocalRecipeStore(dimension=DIMENSION, **kwargs)
+    store.upsert([
+        {"id": f"r{i}", "values": vector.tolist(), "metadata": {"recipe_name": f"Recipe {i}", "ingredient_tokens": ["egg"] if i % 2 else ["milk"]}}
+        for i, vector in enumerate(_vectors(count))
+    ])
+    store.build_index()
+    return store
+
+
+def _ids(result):
+    return [match["id"] for match in result["matches"]]
+
+
+@pytest.mark.parametrize("nprobe, min_recall", [(16, 1.0), (8, 0.8)])
+def test_ivf_recall_against_exact(nprobe, min_recall):
+    exact, ivf = _store(), _store(index_type="ivf", nlist=16, nprobe=nprobe)
+    queries = _vectors(20, seed=1)
+    recall = np.mean([
+        len(set(_ids(a)) & set(_ids(b))) / 10
+        for a, b in zip(exact.query_many(queries, top_k=10), ivf.query_many(queries, top_k=10))
+    ])
+    assert recall >= min_recall
+
+
+def test_ivf_falls_back_to_exact_when_probed_clusters_are_short():
+    exact, ivf = _store(100), _store(100, index_type="ivf", nlist=16, nprobe=1)
+    query = _vectors(1, seed=2)[0]
+    assert _ids(ivf.query(query, top_k=50)) == _ids(exact.query(query, top_k=50))
+
+
+def test_filter_excludes_rows():
+    store = _store(100)
+    result = store.query(_vectors(1, seed=3)[0], top_k=100, filter={"ingredient_tokens": {"$nin": ["egg"]}})
+    assert len(result["matches"]) == 50
+    assert all("egg" not in match["metadata"]["ingredient_tokens"] for match in result["matches"])
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_save_and_mmap_reload(tmp_path, dtype):
+    store = _store(200, dtype=dtype, index_type="ivf", nlist=8, nprobe=8)
+    store.save(str(tmp_path))
+    reloaded = LocalRecipeStore.open(str(tmp_path), index_type="ivf", nlist=8, nprobe=8)
+
+    assert isinstance(reloaded._vectors, np.memmap)
+    assert len(reloaded) == 200 and reloaded.dtype == dtype
+    query = _vectors(1, seed=4)[0]
+    assert _ids(reloaded.query(query, top_k=10)) == _ids(store.query(query, top_k=10))
+    assert reloaded.fetch(["r7"])["vectors"]["r7"]["metadata"]["recipe_name"] == "Recipe 7"
+
+    # Writes after a reload land in memory and survive the next save
+    reloaded.upsert([{"id": "new", "values": _vectors(1, seed=5)[0].tolist(), "metadata": {"recipe_name": "New"}}])
+    reloaded.save()
+    assert len(LocalRecipeStore.open(str(tmp_path))) == 201
+
+
+def test_list_pages_are_a_snapshot():
+    store = _store(250)
+    pages = store.list(limit=100)
+    store.upsert([{"id": "late", "values": _vectors(1, seed=6)[0].tolist(), "metadata": {}}])
+    assert [len(page) for page in pages] == [100, 100, 50]
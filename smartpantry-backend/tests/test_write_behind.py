@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.services import write_behind
+from app.services.write_behind import WriteBehindBuffer
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+BAD = "Bad Row"
+
+
+class FakeTable:
+    """Upserts that reject any batch containing a BAD ingredient, or every batch while ``down``."""
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = 0
+        self.down = False
+
+    async def upsert(self, rows):
+        self.calls += 1
+        if self.down:
+            raise OperationalError("upsert", {}, ConnectionRefusedError("database is down"))
+        if any(row["ingredient_name"] == BAD for row in rows):
+            raise IntegrityError("upsert", {}, ValueError("rejected row"))
+        for row in rows:
+            key = (row["user_id"], row["ingredient_name"])
+            self.rows[key] = self.rows.get(key, 0) + row["quantity"]
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(write_behind, "upsert_pantry_items_async", table.upsert)
+    return table
+
+
+def _row(name, quantity=1):
+    return {"user_id": USER_ID, "ingredient_name": name, "quantity": quantity, "unit": "pcs"}
+
+
+def test_repeat_purchases_merge_into_one_row(table):
+    async def scenario():
+        buffer = WriteBehindBuffer(max_attempts=3)
+        saved = buffer.add_pantry_items([_row("Eggs", 6), _row("Eggs", 6), _row("Milk")])
+        await buffer.flush()
+        return saved, buffer
+
+    saved, buffer = asyncio.run(scenario())
+    assert saved.result() is None
+    assert table.rows == {(USER_ID, "Eggs"): 12, (USER_ID, "Milk"): 1}
+    assert table.calls == 1 and buffer.stats()["rows_written"] == 2
+
+
+def test_rejected_row_is_isolated_retried_then_dropped(table):
+    async def scenario():
+        flushed = []
+        buffer = WriteBehindBuffer(max_attempts=2, on_pantry_flushed=flushed.append)
+        good = buffer.add_pantry_items([_row(f"Item {name}") for name in "abcdefg"])
+        bad = buffer.add_pantry_items([_row("Salt"), _row(BAD)])
+        await buffer.flush()
+        after_first = (good.done(), bad.done(), len(buffer))
+        await buffer.flush()
+        return good, bad, after_first, buffer, flushed
+
+    good, bad, after_first, buffer, flushed = asyncio.run(scenario())
+    # The batch is split until the bad row is alone; everything else is written on the first flush
+    assert len(table.rows) == 8 and (USER_ID, BAD) not in table.rows
+    assert after_first == (True, False, 1)
+    assert good.result() is None
+    with pytest.raises(RuntimeError, match=BAD):
+        bad.result()
+    assert len(buffer) == 0 and buffer.stats()["dropped"] == 1
+    assert flushed == [USER_ID]
+
+
+def test_unreachable_database_keeps_the_batch_and_merges_newer_rows(table):
+    async def scenario():
+        buffer = WriteBehindBuffer(max_attempts=1)
+        saved = buffer.add_pantry_items([_row("Eggs", 6)])
+        table.down = True
+        await buffer.flush()
+        pending = saved.done()
+        buffer.add_pantry_items([_row("Eggs", 6)])
+        table.down = False
+        await buffer.flush()
+        return saved, pending, buffer
+
+    saved, pending, buffer = asyncio.run(scenario())
+    # Connection errors never count as rejections, even with max_attempts=1
+    assert not pending and saved.result() is None
+    assert table.rows == {(USER_ID, "Eggs"): 12}
+    assert buffer.stats()["dropped"] == 0 and buffer.stats()["failures"] == 1
+
+
+def test_invalid_user_id_buffers_nothing(table):
+    async def scenario():
+        buffer = WriteBehindBuffer()
+        with pytest.raises(ValueError):
+            buffer.add_pantry_items([_row("Eggs"), dict(_row("Milk"), user_id="not-a-uuid")])
+        return len(buffer)
+
+    assert asyncio.run(scenario()) == 0